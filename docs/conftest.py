@@ -0,0 +1,11 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def doctest_tmpdir(tmpdir):
+    """Run documentation examples in a temporary directory, so that files
+    written by the examples do not end up in the source tree."""
+    with tmpdir.as_cwd():
+        yield
@@ -13,10 +13,9 @@ import tempfile
 import numpy as np
 import astropy.constants as con
 import astropy.units as u
-from astroquery.jplspec import JPLSpec
 from astroquery.lamda import Lamda
 from ...bib import register
-from ...data import Phys
+from ...data import Phys, JPLSpecCatalog
 
 __all__ = ['LTE', 'NonLTE', 'einstein_coeff',
            'intensity_conversion', 'beta_factor', 'total_number',
@@ -238,7 +237,7 @@ def beta_factor(mol_data, ephemobj):
     r = (orb['r'])
 
     if not isinstance(mol_data['mol_tag'][0], str):
-        cat = JPLSpec.get_species_table()
+        cat = JPLSpecCatalog.species_table()
         mol = cat[cat['TAG'] == mol_data['mol_tag'][0]]
         name = mol['NAME'].data[0]
 
@@ -780,7 +779,7 @@ class NonLTE():
             name = name.lower()
         except KeyError:
             if not isinstance(mol_data['mol_tag'][0], str):
-                cat = JPLSpec.get_species_table()
+                cat = JPLSpecCatalog.species_table()
                 mol = cat[cat['TAG'] == mol_data['mol_tag'][0]]
                 name = mol['NAME'].data[0]
                 name = name.lower()
@@ -645,6 +645,46 @@ class Conf():
                 'd': {'R': lambda d: d*2}
                 }
 
+    # batching of epochs in remote ephemeris queries: maximum number
+    # of epochs per Horizons epoch list (limited by URL lengths) and
+    # per MPC and Miriade ranged query; maximum deviation of epoch
+    # steps (in seconds) for epochs to be considered a regular grid
+    horizons_max_epoch_list = 50
+    mpc_max_epochs = 1441
+    miriade_max_epochs = 5000
+    epoch_grid_tolerance = 0.001
+
+    # initial grid step size (in seconds) for interpolated MPC
+    # ephemerides
+    mpc_interpolation_step = 86400
+
+    # maximum number of memoized results of Names.parse_comet and
+    # Names.parse_asteroid; memoized results are discarded when changed
+    names_cache_size = 100000
+
+    # mean J2000 ecliptic orbital elements of the planets (Standish,
+    # Keplerian Elements for Approximate Positions of the Major
+    # Planets, 1800-2050; Earth: Earth-Moon barycenter) as used by
+    # Orbit.moid and Orbit.tisserand: a (au), e, i, Omega, w (deg)
+    planet_elements = {
+        'mercury': [0.38709927, 0.20563593, 7.00497902, 48.33076593,
+                    29.12703035],
+        'venus': [0.72333566, 0.00677672, 3.39467605, 76.67984255,
+                  54.92262463],
+        'earth': [1.00000261, 0.01671123, -0.00001531, 0.0,
+                  102.93768193],
+        'mars': [1.52371034, 0.09339410, 1.84969142, 49.55953891,
+                 286.49683150],
+        'jupiter': [5.20288700, 0.04838624, 1.30439695, 100.47390909,
+                    274.25457074],
+        'saturn': [9.53667594, 0.05386179, 2.48599187, 113.66242448,
+                   338.93645383],
+        'uranus': [19.18916464, 0.04725744, 0.77263783, 74.01692503,
+                   96.93735127],
+        'neptune': [30.06992276, 0.00859048, 1.77004347, 131.78422574,
+                    273.18053653]
+    }
+
     # definitions for use of pyoorb in Orbits
     oorb_timeScales = {'UTC': 1, 'UT1': 2, 'TT': 3, 'TAI': 4}
     oorb_elemType = {'CART': 1, 'COM': 2, 'KEP': 3, 'DEL': 4, 'EQX': 5}
@@ -731,10 +771,15 @@ from .core import DataClass, DataClassError, QueryError, TimeScaleWarning
 from .decorators import *
 from .ephem import Ephem
 from .orbit import Orbit
-from .phys import Phys
+from .phys import Phys, JPLSpecCatalog
 from .obs import Obs
 from .names import Names, natural_sort_key
+from .querycache import QueryCache, query_cache, QueryCacheWarning
+from .interpolator import EphemerisInterpolator, EphemerisInterpolatorWarning
+from .orbitindex import OrbitIndex
 
 __all__ = ['DataClass', 'Ephem', 'Obs', 'Orbit', 'Phys', 'Names',
            'conf', 'Conf', 'DataClassError', 'quantity_to_dataclass',
-           'QueryError', 'TimeScaleWarning']
+           'QueryError', 'TimeScaleWarning', 'QueryCache', 'query_cache',
+           'QueryCacheWarning', 'JPLSpecCatalog', 'EphemerisInterpolator',
+           'EphemerisInterpolatorWarning', 'OrbitIndex']
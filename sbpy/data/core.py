@@ -7,9 +7,13 @@ sbpy.data core module
 created on June 22, 2017
 """
 
+import os
+import json
 from copy import deepcopy
-from numpy import ndarray, array, hstack, iterable
-from astropy.table import QTable, Column
+from numpy import (ndarray, array, hstack, iterable, integer, save, load,
+                   full, nan)
+from numpy.ma import getdata, getmaskarray
+from astropy.table import Table, QTable, Column, MaskedColumn, vstack
 from astropy.time import Time
 import astropy.units as u
 
@@ -36,6 +40,185 @@ class TimeScaleWarning(SbpyWarning):
     pass
 
 
+# name of the index file in columnar data directories
+COLUMNAR_INDEX = 'columns.json'
+
+
+def _is_columnar(path):
+    """Check whether ``path`` is a columnar data directory."""
+    return os.path.isfile(os.path.join(path, COLUMNAR_INDEX))
+
+
+def _write_columnar(table, path, overwrite=False):
+    """Write ``table`` into directory ``path``: one ``.npy`` file per
+    column (two for `~astropy.time.Time` columns, an additional one for
+    masks) and a JSON index file holding column names, units, time
+    scales, and meta data."""
+
+    if os.path.exists(path):
+        if not overwrite:
+            raise OSError('{} already exists'.format(path))
+        if _is_columnar(path):
+            # only remove files that belong to the existing data set
+            with open(os.path.join(path, COLUMNAR_INDEX)) as f:
+                old = json.load(f)
+            for col in old['columns']:
+                for filename in col['files']:
+                    if os.path.isfile(os.path.join(path, filename)):
+                        os.remove(os.path.join(path, filename))
+        elif not os.path.isdir(path) or len(os.listdir(path)) > 0:
+            raise OSError(('{} exists and is not a columnar data '
+                           'directory').format(path))
+    else:
+        os.makedirs(path)
+
+    columns = []
+    for i, name in enumerate(table.colnames):
+        col = table[name]
+        stem = 'col{:04d}'.format(i)
+        desc = {'name': name}
+        if isinstance(col, Time):
+            if col.location is not None:
+                raise DataClassError(
+                    ('cannot write column {}: Time objects with locations '
+                     'are not supported').format(name))
+            desc.update({'kind': 'time', 'scale': col.scale,
+                         'format': col.format,
+                         'files': [stem + '.jd1.npy', stem + '.jd2.npy']})
+            data = [col.jd1, col.jd2]
+        elif isinstance(col, u.Quantity):
+            desc.update({'kind': 'quantity', 'unit': col.unit.to_string(),
+                         'files': [stem + '.npy']})
+            data = [col.value]
+        elif isinstance(col, Column):
+            desc.update({'kind': 'column',
+                         'unit': (None if col.unit is None
+                                  else col.unit.to_string()),
+                         'files': [stem + '.npy']})
+            data = [getdata(col.data)]
+            if isinstance(col, MaskedColumn):
+                desc['files'].append(stem + '.mask.npy')
+                data.append(getmaskarray(col))
+        else:
+            raise DataClassError(
+                'cannot write column {} of type {}'.format(
+                    name, type(col).__name__))
+
+        for filename, dat in zip(desc['files'], data):
+            try:
+                save(os.path.join(path, filename), dat,
+                     allow_pickle=False)
+            except ValueError:
+                raise DataClassError(
+                    ('cannot write column {} with data type {} in '
+                     'columnar format').format(name, dat.dtype))
+        columns.append(desc)
+
+    try:
+        index = json.dumps({'length': len(table),
+                            'qtable': isinstance(table, QTable),
+                            'columns': columns,
+                            'meta': table.meta}, indent=1)
+    except TypeError:
+        raise DataClassError('meta data must be JSON serializable to be '
+                             'written in columnar format')
+
+    with open(os.path.join(path, COLUMNAR_INDEX), 'w') as f:
+        f.write(index)
+
+
+def _load_columnar(path, mmap_mode='c'):
+    """Load the index of columnar data directory ``path`` and
+    memory-map its column data files using ``mmap_mode`` (see
+    `numpy.load`)."""
+
+    with open(os.path.join(path, COLUMNAR_INDEX)) as f:
+        index = json.load(f)
+
+    data = [[load(os.path.join(path, filename), mmap_mode=mmap_mode,
+                  allow_pickle=False) for filename in desc['files']]
+            for desc in index['columns']]
+
+    return index, data
+
+
+def _columnar_table(index, data, rows=slice(None)):
+    """Build a `~astropy.table.QTable` (or `~astropy.table.Table`, if
+    the data were written from one) from ``rows`` of columnar data
+    provided by `_load_columnar` without copying column data;
+    `~astropy.time.Time` columns are read into memory."""
+
+    columns = []
+    for desc, dat in zip(index['columns'], data):
+        dat = [d[rows] for d in dat]
+        if desc['kind'] == 'time':
+            col = Time(dat[0], dat[1], format='jd', scale=desc['scale'])
+            col.format = desc['format']
+        elif desc['kind'] == 'quantity':
+            col = u.Quantity(dat[0], desc['unit'], copy=False)
+        elif len(dat) > 1:
+            col = MaskedColumn(dat[0], mask=dat[1], unit=desc['unit'],
+                               copy=False)
+        else:
+            col = Column(dat[0], unit=desc['unit'], copy=False)
+        columns.append(col)
+
+    table_class = QTable if index.get('qtable', True) else Table
+    return table_class(columns,
+                       names=[desc['name'] for desc in index['columns']],
+                       meta=deepcopy(index['meta']), copy=False)
+
+
+def _read_columnar(path, mmap_mode='c'):
+    """Read columnar data directory ``path`` into a
+    `~astropy.table.QTable`. Column data are memory-mapped using
+    ``mmap_mode`` (see `numpy.load`) and read from disk only when
+    accessed; `~astropy.time.Time` columns are read upon loading."""
+
+    return _columnar_table(*_load_columnar(path, mmap_mode=mmap_mode))
+
+
+def _iter_columnar(path, chunksize, mmap_mode='c'):
+    """Iterate over columnar data directory ``path`` in tables of
+    ``chunksize`` rows."""
+
+    index, data = _load_columnar(path, mmap_mode=mmap_mode)
+    for i in range(0, index['length'], chunksize):
+        yield _columnar_table(index, data, slice(i, i + chunksize))
+
+
+# ASCII formats with a known header layout (comment lines followed by
+# a single line of column names), which can be read line by line
+_STREAMED_ASCII_FORMATS = ('ascii.basic', 'ascii.csv', 'csv', 'ascii.tab',
+                           'ascii.ecsv')
+
+
+def _iter_ascii(filename, chunksize, **kwargs):
+    """Iterate over ASCII table ``filename`` in tables of ``chunksize``
+    rows. Comment lines and the first non-comment line are considered
+    the table header and parsed along with each chunk of data lines
+    using `~astropy.table.QTable.read`; only valid for
+    `_STREAMED_ASCII_FORMATS`."""
+
+    with open(filename) as f:
+        header = []
+        for line in f:
+            header.append(line)
+            if line.strip() != '' and not line.startswith('#'):
+                break
+
+        chunk = []
+        for line in f:
+            if line.strip() == '':
+                continue
+            chunk.append(line)
+            if len(chunk) == chunksize:
+                yield QTable.read(header + chunk, **kwargs)
+                chunk = []
+        if len(chunk) > 0:
+            yield QTable.read(header + chunk, **kwargs)
+
+
 class DataClass():
     """`~sbpy.data.DataClass` serves as the base class for all data
     container classes in `sbpy` in order to provide consistent
@@ -68,6 +251,8 @@ class DataClass():
 
     def __init__(self):
         self._table = QTable()
+        # alternative field name -> column name resolved for this object
+        self._translations = {}
 
     @staticmethod
     def _unit_apply(val, unit):
@@ -542,6 +727,14 @@ class DataClass():
         information. However, ``fits``, ``cds``, ``daophot``,
         ``ecsv``, and ``ipac`` do support units and meta data.
 
+        Directories written with ``format='columnar'`` (see
+        `~sbpy.data.DataClass.to_file`) are identified automatically.
+        Their columns are memory-mapped and only read from disk when
+        they are accessed; the optional parameter ``mmap_mode`` is
+        passed on to `numpy.load` (default: ``'c'``, copy-on-write, use
+        ``None`` to read all data into memory).
+        `~astropy.time.Time` columns are always read into memory.
+
         Examples
         --------
         >>> from sbpy.data import DataClass
@@ -551,7 +744,14 @@ class DataClass():
 
         """
 
-        data = QTable.read(filename, **kwargs)
+        if (kwargs.get('format') == 'columnar' or
+                (kwargs.get('format') is None and
+                 isinstance(filename, (str, os.PathLike)) and
+                 _is_columnar(filename))):
+            data = _read_columnar(filename,
+                                  mmap_mode=kwargs.get('mmap_mode', 'c'))
+        else:
+            data = QTable.read(filename, **kwargs)
 
         self = cls()
         self._table = data
@@ -559,6 +759,86 @@ class DataClass():
 
         return self
 
+    @classmethod
+    def iter_file(cls, filename, chunksize=100000, meta={}, **kwargs):
+        """Iterate over a file in chunks of rows, each of which is
+        provided as a `DataClass` object.
+
+        Parameters
+        ----------
+        filename : str, path-like, or file-like object
+             Name of the file that will be read and parsed.
+        chunksize : int, optional
+             Maximum number of rows per chunk. Default: 100000
+        meta : dictionary, optional
+             Meta data that will be stored in the data table of each
+             chunk. If the data to be read already holds meta data,
+             ``meta`` will be added. Default: empty dictionary
+        kwargs : additional parameters
+             Optional parameters that will be passed on to
+             `~sbpy.data.DataClass.from_file`.
+
+        Returns
+        -------
+        generator of `DataClass` objects
+
+        Notes
+        -----
+        Only one chunk at a time is held in memory for files in the
+        columnar format (see `~sbpy.data.DataClass.to_file`), FITS
+        files (which are memory-mapped), and ASCII files in the formats
+        ``'ascii.basic'``, ``'ascii.csv'`` (``'csv'``), ``'ascii.tab'``,
+        and ``'ascii.ecsv'`` (also files with an ``.ecsv`` extension).
+        These ASCII files are read line-by-line: all comment lines
+        (starting with ``#``) and the first non-comment line (column
+        names) are considered the file header, each following line has
+        to hold exactly one row. Other file formats, including other
+        ASCII formats and ASCII files read with ``header_start`` or
+        ``data_start``, are read into memory as a whole and provided in
+        chunks.
+
+        Units and `~astropy.time.Time` columns are preserved to the same
+        extent as in `~sbpy.data.DataClass.from_file`; note that the
+        data types of columns in ASCII files without data type
+        information (all formats but ``ecsv``) are determined
+        separately for each chunk.
+
+        Examples
+        --------
+        >>> from sbpy.data import Ephem
+        >>> for eph in Ephem.iter_file('ephem.ecsv',
+        ...                            chunksize=10000):  # doctest: +SKIP
+        ...     print(len(eph))
+        """
+
+        fmt = kwargs.get('format')
+        path = isinstance(filename, (str, os.PathLike))
+        if path:
+            filename = os.fspath(filename)
+        if fmt is None and path and filename.endswith('.ecsv'):
+            fmt = kwargs['format'] = 'ascii.ecsv'
+
+        if fmt == 'columnar' or (fmt is None and path and
+                                 _is_columnar(filename)):
+            chunks = _iter_columnar(filename, chunksize,
+                                    mmap_mode=kwargs.get('mmap_mode', 'c'))
+        elif (path and fmt in _STREAMED_ASCII_FORMATS and
+              'header_start' not in kwargs and 'data_start' not in kwargs):
+            chunks = _iter_ascii(filename, chunksize, **kwargs)
+        else:
+            if (fmt == 'fits' or (fmt is None and path and os.path.splitext(
+                    filename)[1].lower() in ('.fits', '.fit', '.fts'))):
+                kwargs.setdefault('memmap', True)
+            data = QTable.read(filename, **kwargs)
+            chunks = (data[i:i + chunksize]
+                      for i in range(0, len(data), chunksize))
+
+        for chunk in chunks:
+            self = cls()
+            self._table = chunk
+            self._table.meta = {**self._table.meta, **meta}
+            yield self
+
     def to_file(self, filename, format='ascii', **kwargs):
         """Write object to a file using
         `~astropy.table.Table.write`.
@@ -590,6 +870,15 @@ class DataClass():
         information. However, ``fits``, ``cds``, ``daophot``,
         ``ecsv``, and ``ipac`` do support units and meta data.
 
+        In addition, ``format='columnar'`` writes a binary columnar
+        format that is suited for large data sets: ``filename`` is
+        created as a directory that holds one `numpy` ``.npy`` file per
+        column and a JSON index file with column names, units,
+        `~astropy.time.Time` scales, and meta data (which must be JSON
+        serializable). Such directories can be read using
+        `~sbpy.data.DataClass.from_file`, which memory-maps the column
+        data. The only supported keyword argument is ``overwrite``.
+
         Examples
         --------
         >>> from sbpy.data import DataClass
@@ -599,9 +888,13 @@ class DataClass():
         ...                               ['a', 'b', 'c']],
         ...                              names=('a', 'b', 'c'))
         >>> dat.to_file('test.txt')  # doctest: +SKIP
+        >>> dat.to_file('test', format='columnar')  # doctest: +SKIP
         """
 
-        self._table.write(filename, format=format, **kwargs)
+        if format == 'columnar':
+            _write_columnar(self._table, filename, **kwargs)
+        else:
+            self._table.write(filename, format=format, **kwargs)
 
     def __len__(self):
         """Get number of data elements in _table"""
@@ -617,7 +910,11 @@ class DataClass():
         for and may use alternative field names. This method will always return
         an instance of __class__, except in the case when a field name is
         requested (then return an `astropy.table.Column` if no units are
-        provided or a `astropy.units.Quantity` if units are provided)."""
+        provided or a `astropy.units.Quantity` if units are provided).
+
+        Objects returned for integer indices and slices share their data
+        with this object; use `~sbpy.data.DataClass.copy` to obtain an
+        independent object."""
 
         # slices, iterables consisting of booleans and integers, and integer
         # indices are all treated in the same way and are required to return
@@ -625,6 +922,11 @@ class DataClass():
         # separately in that those have to be checked for conversions
         # and translations
 
+        # individual field names that are present in the data table
+        # require neither conversion nor translation
+        if isinstance(ident, str) and ident in self._table.columns:
+            return self._table[ident]
+
         # list of field names
         if (isinstance(ident, (list, tuple, ndarray)) and
             all([isinstance(i, str) for i in ident])):
@@ -637,11 +939,21 @@ class DataClass():
             ident = self._translate_columns(ident)[0]
             return self._table[ident]
 
-        # return as new instance of this class for all other identifiers
-        return self.from_table(self._table[ident])
+        # integer indices are treated as slices of length one, which
+        # enables the new object to share its data with this object
+        elif isinstance(ident, (int, integer)) and not isinstance(ident, bool):
+            if not -len(self) <= ident < len(self):
+                raise IndexError('index {} is out of bounds for length '
+                                 '{}'.format(ident, len(self)))
+            ident = slice(ident, (ident + 1) or None)
+
+        # return as new instance of this class for all other identifiers;
+        # columns are not copied again in the creation of the new object
+        return self.from_table(self._table[ident], copy=False)
 
     def __setitem__(self, *args):
         """Refer cls.__setitem__ to self._table"""
+        self._translations.clear()
         self._table.__setitem__(*args)
 
     def _translate_columns(self, target_colnames):
@@ -655,17 +967,23 @@ class DataClass():
         if not isinstance(target_colnames, (list, ndarray, tuple)):
             target_colnames = [target_colnames]
 
-        translated_colnames = deepcopy(target_colnames)
+        translated_colnames = list(target_colnames)
         for idx, colname in enumerate(target_colnames):
             # colname is already a column name in self.table
-            if colname in self.field_names:
+            if colname in self._table.columns:
                 continue
+            # colname has been translated before and the translation is
+            # still present in self.table
+            alt = self._translations.get(colname)
+            if alt is not None and alt in self._table.columns:
+                translated_colnames[idx] = alt
             # colname is an alternative column name
-            elif colname in sum(conf.fieldnames, []):
+            elif colname in conf.fieldname_idx:
                 for alt in conf.fieldnames[conf.fieldname_idx[colname]]:
                     # translation available for colname
-                    if alt in self.field_names:
+                    if alt in self._table.columns:
                         translated_colnames[idx] = alt
+                        self._translations[colname] = alt
                         break
             # colname is unknown, raise a KeyError
             else:
@@ -685,28 +1003,53 @@ class DataClass():
             target_colnames = [target_colnames]
 
         for colname in target_colnames:
-            # ignore, if colname is unknown (KeyError)
-            try:
-                # ignore if colname has already been converted
-                if any([alt in self.field_names for alt
-                        in conf.fieldnames[conf.fieldname_idx[colname]]]):
-                    continue
-                # consider alternative names for colname -> alt
-                for alt in conf.fieldnames[conf.fieldname_idx[colname]]:
-                    if alt in list(conf.field_eq.keys()):
-                        # conversion identified
-                        convname = self._translate_columns(
-                            list(conf.field_eq[alt].keys())[0])[0]
-                        convfunc = list(conf.field_eq[alt].values())[0]
-                        if convname in self.field_names:
-                            # create new column for the converted field
-                            self[colname] = convfunc(self.table[convname])
-                            break
-            except KeyError:
+            # ignore if colname is present or unknown
+            if (colname in self._table.columns or
+                    colname not in conf.fieldname_idx):
+                continue
+            alternatives = conf.fieldnames[conf.fieldname_idx[colname]]
+            # ignore if colname has already been converted
+            if any([alt in self._table.columns for alt in alternatives]):
                 continue
+            # consider alternative names for colname -> alt
+            for alt in alternatives:
+                if alt in conf.field_eq:
+                    # conversion identified
+                    srcname, convfunc = list(conf.field_eq[alt].items())[0]
+                    try:
+                        convname = self._translate_columns(srcname)[0]
+                    except KeyError:
+                        continue
+                    if convname in self._table.columns:
+                        # create new column for the converted field
+                        self[colname] = convfunc(self.table[convname])
+                        break
 
         return self
 
+    def copy(self):
+        """Return a copy of this object that does not share any data with
+        this object.
+
+        Returns
+        -------
+        `DataClass` object
+
+        Examples
+        --------
+        >>> from sbpy.data import DataClass
+        >>> import astropy.units as u
+        >>> dat = DataClass.from_columns([[1, 2, 3]*u.km,
+        ...                               [4, 5, 6]*u.s],
+        ...                              names=('a', 'b'))
+        >>> sub = dat[:2]  # shares data with dat
+        >>> sub = dat[:2].copy()  # independent of dat
+        >>> sub['a'][0] = 10*u.km
+        >>> dat['a'][0]
+        <Quantity 1. km>
+        """
+        return self.from_table(self._table.copy(copy_data=True), copy=False)
+
     @property
     def table(self):
         """Return `~astropy.table.QTable` object containing all data."""
@@ -852,3 +1195,110 @@ class DataClass():
         _newtable.meta = self.meta
 
         self._table = _newtable
+
+
+class TableAccumulator():
+    """Gather tables, e.g., remote query results for individual targets,
+    and concatenate them once.
+
+    Units of columns that appear with different, but convertible,
+    units in different tables are converted to the unit used in the
+    first table; columns missing from some of the tables are masked
+    in the combined table, or filled with NaN in the case of
+    `~astropy.units.Quantity` columns.
+
+    Examples
+    --------
+    >>> from astropy.table import QTable
+    >>> import astropy.units as u
+    >>> from sbpy.data.core import TableAccumulator
+    >>> acc = TableAccumulator()
+    >>> acc.append(QTable({'r': [1, 2] * u.au}))
+    >>> acc.append(QTable({'r': [3e8] * u.km}))
+    >>> print(acc.to_table())  # doctest: +FLOAT_CMP
+            r
+            AU
+    ------------------
+                   1.0
+                   2.0
+    2.0053761366805336
+    """
+
+    def __init__(self):
+        self._tables = []
+
+    def __len__(self):
+        """Total number of rows gathered."""
+        return sum([len(table) for table in self._tables])
+
+    def append(self, table):
+        """Add a table.
+
+        Parameters
+        ----------
+        table : `~astropy.table.Table`, `~astropy.table.QTable`, or `~sbpy.data.DataClass`
+        """
+        if isinstance(table, DataClass):
+            table = table.table
+        self._tables.append(table)
+
+    def _reconcile(self):
+        """Convert columns to the unit first used for them, where
+        necessary and possible, and fill missing
+        `~astropy.units.Quantity` columns, which cannot be masked, with
+        NaN; tables are not modified in place."""
+
+        units = {}
+        quantities = {}
+        for table in self._tables:
+            for name in table.colnames:
+                col = table[name]
+                unit = getattr(col, 'unit', None)
+                if unit is not None and not isinstance(col, Time):
+                    units.setdefault(name, unit)
+                if isinstance(col, u.Quantity):
+                    quantities.setdefault(name, units[name])
+
+        tables = []
+        for table in self._tables:
+            converted = table.copy(copy_data=False)
+            for name in table.colnames:
+                col = table[name]
+                unit = getattr(col, 'unit', None)
+                if (unit is None or isinstance(col, Time) or
+                        unit == units[name]):
+                    continue
+                try:
+                    factor = u.Unit(unit).to(units[name])
+                except (u.UnitsError, ValueError):
+                    # not convertible; vstack will report the conflict
+                    continue
+
+                if isinstance(col, u.Quantity):
+                    converted[name] = col.to(units[name])
+                else:
+                    converted[name] = col.__class__(
+                        col.data * factor, name=name, unit=units[name],
+                        description=col.description, format=col.format,
+                        meta=col.meta)
+
+            for name, unit in quantities.items():
+                if name not in table.colnames:
+                    converted[name] = u.Quantity(full(len(table), nan), unit)
+
+            tables.append(converted)
+        return tables
+
+    def to_table(self):
+        """Concatenate all gathered tables.
+
+        Returns
+        -------
+        table : `~astropy.table.QTable` or `~astropy.table.Table`
+            Of the same class as the first gathered table.
+        """
+        if len(self._tables) == 0:
+            return QTable()
+        if len(self._tables) == 1:
+            return self._tables[0]
+        return vstack(self._reconcile(), join_type='outer')
@@ -8,12 +8,17 @@ Class for storing and querying ephemerides
 
 created on June 04, 2017
 """
-import os
 from warnings import warn
-
-from numpy import ndarray, hstack, iterable
+from concurrent.futures import ProcessPoolExecutor
+
+from numpy import (ndarray, iterable, atleast_1d, diff, around,
+                   argsort, empty, arange, floor, ceil, clip, unwrap,
+                   deg2rad, rad2deg, cos, hypot, flatnonzero, issubdtype,
+                   floating, array_split, asfortranarray, array, repeat,
+                   sin, sqrt, arctan2, arcsin, arccos, pi, log10, tile,
+                   broadcast_to)
 from astropy.time import Time
-from astropy.table import vstack, Column
+from astropy.table import vstack, Column, MaskedColumn, QTable
 import astropy.units as u
 from astroquery.jplhorizons import Horizons
 from astroquery.mpc import MPC
@@ -27,13 +32,277 @@ except ImportError:
     pyoorb = None
 
 from ..bib import cite
-from .core import DataClass, conf, QueryError, TimeScaleWarning
+from .core import (DataClass, conf, QueryError, TimeScaleWarning,
+                   TableAccumulator)
 from ..exceptions import SbpyException, RequiredPackageUnavailable
-from .orbit import Orbit, OpenOrbError
+from .orbit import Orbit, OpenOrbError, OpenOrbSession
+from .querycache import cached_query, fetch_all
+from . import twobody
 
 __all__ = ['Ephem']
 
 
+def _epoch_batches(t, tol, min_run=2, max_run=None, max_list=1):
+    """Split epochs ``t`` into batches for remote queries.
+
+    Runs of at least ``min_run`` (and at most ``max_run``) consecutive
+    epochs on a regular grid, with step sizes agreeing within ``tol``,
+    form range batches; all other epochs are grouped into list batches
+    of up to ``max_list`` consecutive epochs. The order of ``t`` is
+    preserved.
+
+    Returns
+    -------
+    batches : list of tuples
+        ``(is_range, i0, i1)`` for each batch covering epochs
+        ``t[i0:i1]``.
+    """
+
+    t = atleast_1d(t)
+    dt = diff(t)
+    batches = []
+    pending = None  # first epoch of the current list batch
+    i = 0
+    while i < len(t):
+        # extent of the regular run starting at epoch i
+        j = i + 1
+        if j < len(t) and dt[i] > tol:
+            while (j < len(t) and abs(dt[j - 1] - dt[i]) <= tol and
+                   (max_run is None or j - i < max_run)):
+                j += 1
+
+        if j - i >= min_run:
+            if pending is not None:
+                batches.append((False, pending, i))
+                pending = None
+            batches.append((True, i, j))
+            i = j
+        else:
+            if pending is None:
+                pending = i
+            i += 1
+            if i - pending == max_list:
+                batches.append((False, pending, i))
+                pending = None
+
+    if pending is not None:
+        batches.append((False, pending, len(t)))
+
+    return batches
+
+
+def _mpc_step(dt):
+    """Express step size ``dt`` (integer seconds) in the largest unit
+    accepted by the MPC that results in an integer value."""
+    for unit in (u.d, u.h, u.min, u.s):
+        if dt % int(unit.to(u.s)) == 0:
+            return dt // int(unit.to(u.s)) * unit
+
+
+def _miriade_step(dt):
+    """Express step size ``dt`` (integer seconds) as a Miriade step
+    string with an integer value in the largest possible unit."""
+    step = _mpc_step(dt)
+    return '{:d}{:s}'.format(int(step.value), {
+        u.d: 'd', u.h: 'h', u.min: 'm', u.s: 's'}[step.unit])
+
+
+def _cubic_interp(y, s):
+    """Cubic Lagrange interpolation of ``y``, sampled on a regular
+    grid, at positions ``s`` given in units of the grid step."""
+    k = clip(floor(s).astype(int), 1, len(y) - 3)
+    f = s - k
+    return (-f * (f - 1) * (f - 2) / 6 * y[k - 1] +
+            (f + 1) * (f - 1) * (f - 2) / 2 * y[k] -
+            (f + 1) * f * (f - 2) / 2 * y[k + 1] +
+            (f + 1) * f * (f - 1) / 6 * y[k + 2])
+
+
+def _interp_table(grid, s, epochs):
+    """Interpolate table ``grid``, sampled on a regular grid of
+    epochs, to positions ``s`` (in units of the grid step) and set
+    the epoch column to ``epochs``.
+
+    Unmasked floating-point columns are interpolated, angles after
+    unwrapping; the values of all other columns are taken from the
+    closest grid point.
+    """
+
+    nearest = clip(around(s).astype(int), 0, len(grid) - 1)
+    out = grid.__class__(meta=grid.meta)
+    for name in grid.colnames:
+        col = grid[name]
+        if isinstance(col, Time):
+            out[name] = epochs
+        elif (isinstance(col, MaskedColumn) or
+              not issubdtype(col.dtype, floating)):
+            out[name] = col[nearest]
+        else:
+            unit = getattr(col, 'unit', None)
+            y = u.Quantity(col).value
+            try:
+                angle = u.Unit(unit).physical_type == 'angle'
+            except (TypeError, ValueError):
+                angle = False
+            if angle:
+                # interpolate in degrees, avoiding the 360 deg jump
+                y = u.Quantity(col).to_value('deg')
+                y_unwrapped = rad2deg(unwrap(deg2rad(y)))
+                v = _cubic_interp(y_unwrapped, s)
+                if (y_unwrapped != y).any():
+                    v = v % 360
+                v = (v * u.deg).to_value(unit)
+            else:
+                v = _cubic_interp(y, s)
+            out[name] = v if unit is None else v * unit
+
+    return out
+
+
+def _interp_error(grid):
+    """Estimate the error of interpolated positions from table
+    ``grid`` by interpolating every other grid point from the
+    remaining ones; this overestimates the actual error."""
+
+    ra = rad2deg(unwrap(deg2rad(u.Quantity(grid['RA']).to_value('deg'))))
+    dec = u.Quantity(grid['Dec']).to_value('deg')
+    odd = arange(3, len(grid) - 3, 2)
+    dra = _cubic_interp(ra[::2], odd / 2) - ra[odd]
+    ddec = _cubic_interp(dec[::2], odd / 2) - dec[odd]
+    return hypot(dra * cos(deg2rad(dec[odd])), ddec).max() * u.deg
+
+
+def _query_mpc_interpolated(targetid, epochs, max_error, location, **kwargs):
+    """Query ephemerides of ``targetid`` from the MPC on regular grids
+    around clusters of ``epochs`` and interpolate them to ``epochs``.
+
+    The grid step starts at ``conf.mpc_interpolation_step`` and is
+    halved until the estimated position error is below ``max_error``.
+    """
+
+    # epochs in seconds; the MPC uses a grid of full seconds
+    t = ((epochs.jd1 - 2451545) + epochs.jd2) * 86400
+    order = argsort(t, kind='mergesort')
+    t = t[order]
+    h0 = int(conf.mpc_interpolation_step)
+
+    # clusters of epochs covered by a common grid
+    bounds = [0] + list(flatnonzero(diff(t) > 8 * h0) + 1) + [len(t)]
+
+    eph = TableAccumulator()
+    for i0, i1 in zip(bounds[:-1], bounds[1:]):
+        h = h0
+        while True:
+            # pad grid for cubic interpolation and error estimate
+            start = floor(t[i0]) - h
+            n = max(int(ceil((t[i1 - 1] - start) / h)) + 3, 8)
+            grid = TableAccumulator()
+            for j in range(0, n, conf.mpc_max_epochs):
+                grid.append(MPC.get_ephemeris(
+                    targetid, location=location,
+                    start=Time(2451545, (start + j * h) / 86400,
+                               format='jd', scale='utc'),
+                    step=_mpc_step(h), number=min(conf.mpc_max_epochs, n - j),
+                    **kwargs))
+            grid = grid.to_table()
+            if len(grid) != n:
+                raise QueryError(
+                    ('incomplete ephemeris grid for {}, cannot '
+                     'interpolate').format(targetid))
+
+            if h == 1 or _interp_error(grid) <= max_error:
+                break
+            h = max(h // 2, 1)
+
+        eph.append(_interp_table(grid, (t[i0:i1] - start) / h,
+                                 epochs[order[i0:i1]]))
+
+    # restore original order of epochs
+    inverse = empty(len(order), int)
+    inverse[order] = arange(len(order))
+    return eph.to_table()[inverse]
+
+
+# obliquity of the ecliptic at J2000 (IAU 1976), rad
+OBLIQUITY_J2000 = deg2rad(84381.448 / 3600)
+
+# speed of light in au/d
+C_AU_D = 173.1446326846693
+
+
+def _ecliptic_to_equatorial(x):
+    """Rotate J2000 ecliptic vectors, shape (3, ...), to equatorial."""
+    c, s = cos(OBLIQUITY_J2000), sin(OBLIQUITY_J2000)
+    return array([x[0], c * x[1] - s * x[2], s * x[1] + c * x[2]])
+
+
+def _observer_state(epochs, location):
+    """Heliocentric J2000 ecliptic position (au) and velocity (au/d) of
+    geocentric (``'500'``) or `~astropy.coordinates.EarthLocation`
+    observers at ``epochs``, shape (3, epochs), based on the built-in
+    solar system ephemeris of `astropy`."""
+    from astropy.coordinates import get_body_barycentric_posvel
+
+    earth = get_body_barycentric_posvel('earth', epochs,
+                                        ephemeris='builtin')
+    sun = get_body_barycentric_posvel('sun', epochs, ephemeris='builtin')
+    r = (earth[0] - sun[0]).xyz.to_value('au')
+    v = (earth[1] - sun[1]).xyz.to_value('au/d')
+
+    if isinstance(location, EarthLocation):
+        pos, vel = location.get_gcrs_posvel(epochs)
+        r = r + pos.xyz.to_value('au')
+        v = v + vel.xyz.to_value('au/d')
+    elif location != '500':
+        raise ValueError('Invalid `location` parameter')
+
+    # equatorial (ICRS) to ecliptic; the frame bias is neglected
+    c, s = cos(OBLIQUITY_J2000), sin(OBLIQUITY_J2000)
+    rot = array([[1, 0, 0], [0, c, s], [0, -s, c]])
+    return rot.dot(r.reshape(3, -1)), rot.dot(v.reshape(3, -1))
+
+
+def _oo_ephemeris(orbits, location, epochs, dynmodel, scope):
+    """Derive pyoorb ephemerides for ``orbits`` (see
+    `~sbpy.data.Orbit._to_oo`); returns the ephemeris array with shape
+    (orbits, epochs, fields) and the pyoorb error code."""
+    if scope == 'full':
+        return pyoorb.pyoorb.oorb_ephemeris_full(
+            orbits, location, epochs, dynmodel)
+    elif scope == 'basic':
+        return pyoorb.pyoorb.oorb_ephemeris_basic(
+            orbits, location, epochs, dynmodel)
+
+
+def _oo_ephemeris_sharded(orbits, location, epochs, dynmodel, scope,
+                          ephfile, workers):
+    """`_oo_ephemeris` for shards of ``orbits`` in a pool of ``workers``
+    processes, each of which initializes pyoorb once.
+
+    Shards are contiguous blocks of orbits; results are collected in
+    the order of ``orbits`` as they arrive.
+    """
+    shards = array_split(arange(len(orbits)),
+                         min(len(orbits), workers * 4))
+    oo_eph = None
+    err = 0
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=OpenOrbSession.init,
+                             initargs=(ephfile,)) as executor:
+        results = executor.map(
+            _oo_ephemeris,
+            [asfortranarray(orbits[shard]) for shard in shards],
+            [location] * len(shards), [epochs] * len(shards),
+            [dynmodel] * len(shards), [scope] * len(shards))
+        for shard, (eph, shard_err) in zip(shards, results):
+            if oo_eph is None:
+                oo_eph = empty((len(orbits),) + eph.shape[1:],
+                               dtype=eph.dtype)
+            oo_eph[shard[0]:shard[-1] + 1] = eph
+            err = err or shard_err
+    return oo_eph, err
+
+
 class Ephem(DataClass):
     """Class for querying, manipulating, and calculating ephemerides"""
 
@@ -41,7 +310,8 @@ class Ephem(DataClass):
     @cite({'data source': '1996DPS....28.2504G'})
     @cite({'software: astroquery': '2019AJ....157...98G'})
     def from_horizons(cls, targetids, id_type='smallbody',
-                      epochs=None, location='500', **kwargs):
+                      epochs=None, location='500', max_workers=1,
+                      retries=0, retry_delay=1, **kwargs):
         """Load target ephemerides from
         `JPL Horizons <https://ssd.jpl.nasa.gov/horizons.cgi>`_ using
         `astroquery.jplhorizons.HorizonsClass.ephemerides`
@@ -84,6 +354,17 @@ class Ephem(DataClass):
             <https://www.minorplanetcenter.net/iau/lists/ObsCodesF.html>`__)
             or as `~astropy.coordinates.EarthLocation`.
             Default: ``'500'`` (geocentric)
+        max_workers : int, optional
+            Maximum number of targets queried concurrently. Please be
+            considerate of the Horizons service when using large values.
+            Default: ``1``
+        retries : int, optional
+            Number of times a target query is repeated in case of a
+            network error. Default: ``0``
+        retry_delay : float, optional
+            Delay in seconds before the first repetition of a failed
+            query; the delay is doubled for each further repetition.
+            Default: ``1``
         **kwargs : optional
             Arguments that will be provided to
             `astroquery.jplhorizons.HorizonsClass.ephemerides`.
@@ -147,6 +428,25 @@ class Ephem(DataClass):
         else:
             raise ValueError('Invalid `epochs` parameter')
 
+        # split epoch lists into batches that are queried separately:
+        # regular grids are queried as ranges, all other epochs as lists
+        # of limited length to comply with URL length limits
+        if isinstance(_epochs, ndarray) and _epochs.size > 1:
+            epoch_batches = []
+            for is_range, i0, i1 in _epoch_batches(
+                    _epochs, conf.epoch_grid_tolerance / 86400,
+                    min_run=conf.horizons_max_epoch_list,
+                    max_list=conf.horizons_max_epoch_list):
+                if is_range:
+                    start, stop = Time(_epochs[[i0, i1 - 1]], format='jd',
+                                       scale='utc').iso
+                    epoch_batches.append({'start': start, 'stop': stop,
+                                          'step': '{:d}'.format(i1 - i0 - 1)})
+                else:
+                    epoch_batches.append(_epochs[i0:i1])
+        else:
+            epoch_batches = [_epochs]
+
         # if targetids is a list, run separate Horizons queries and append
         if not isinstance(targetids, (list, ndarray, tuple)):
             targetids = [targetids]
@@ -158,39 +458,50 @@ class Ephem(DataClass):
                         'lat': location.lat.deg,
                         'elevation': location.height.to('km')}
 
-        # append ephemerides table for each targetid
-        all_eph = None
-        for targetid in targetids:
+        def fetch(item):
+            targetid, _epochs = item
 
-            # load ephemerides using astroquery.jplhorizons
-            obj = Horizons(id=targetid, id_type=id_type,
-                           location=location, epochs=_epochs)
-            try:
-                eph = obj.ephemerides(**kwargs)
-            except ValueError as e:
-                raise QueryError(
-                    ('Error raised by astroquery.jplhorizons: {:s}\n'
-                     'The following query was attempted: {:s}').format(
-                         str(e), obj.uri))
-
-            # workaround for current version of astroquery to make
-            # column units compatible with astropy.table.QTable
-            # should really change '---' units to None in
-            # astroquery.jplhorizons.__init__.py
-            for column_name in eph.columns:
-                if eph[column_name].unit == '---':
-                    eph[column_name].unit = None
-
-            # workaround for astroquery 0.3.9.dev5056 and earlier,
-            # Horizons column named RA_rate always includes the
-            # cos(Dec) term:
-            if 'RA_rate' in eph.colnames:
-                eph['RA_rate'].name = 'RA*cos(Dec)_rate'
-
-            if all_eph is None:
-                all_eph = eph
-            else:
-                all_eph = vstack([all_eph, eph])
+            def query():
+                # load ephemerides using astroquery.jplhorizons
+                obj = Horizons(id=targetid, id_type=id_type,
+                               location=location, epochs=_epochs)
+                try:
+                    eph = obj.ephemerides(**kwargs)
+                except ValueError as e:
+                    raise QueryError(
+                        ('Error raised by astroquery.jplhorizons: {:s}\n'
+                         'The following query was attempted: {:s}').format(
+                             str(e), obj.uri))
+
+                # workaround for current version of astroquery to make
+                # column units compatible with astropy.table.QTable
+                # should really change '---' units to None in
+                # astroquery.jplhorizons.__init__.py
+                for column_name in eph.columns:
+                    if eph[column_name].unit == '---':
+                        eph[column_name].unit = None
+
+                # workaround for astroquery 0.3.9.dev5056 and earlier,
+                # Horizons column named RA_rate always includes the
+                # cos(Dec) term:
+                if 'RA_rate' in eph.colnames:
+                    eph['RA_rate'].name = 'RA*cos(Dec)_rate'
+
+                return eph
+
+            return cached_query('jplhorizons', query, targetid=targetid,
+                                id_type=id_type, location=location,
+                                epochs=_epochs, kwargs=kwargs)
+
+        # query targets and epoch batches, possibly concurrently, and
+        # combine all ephemerides tables in the original order
+        items = [(targetid, batch) for targetid in targetids
+                 for batch in epoch_batches]
+        all_eph = TableAccumulator()
+        for eph in fetch_all(fetch, items, max_workers=max_workers,
+                             retries=retries, retry_delay=retry_delay):
+            all_eph.append(eph)
+        all_eph = all_eph.to_table()
 
         # turn epochs into astropy.time.Time and apply timescale
         # convert ut1 epochs to utc
@@ -215,7 +526,8 @@ class Ephem(DataClass):
     @cite({'data source':
            'https://minorplanetcenter.net/iau/MPEph/MPEph.html'})
     @cite({'software: astroquery': '2019AJ....157...98G'})
-    def from_mpc(cls, targetids, epochs=None, location='500', **kwargs):
+    def from_mpc(cls, targetids, epochs=None, location='500',
+                 interpolate=None, **kwargs):
         """Load ephemerides from the
         `Minor Planet Center <https://minorplanetcenter.net>`_.
 
@@ -263,6 +575,19 @@ class Ephem(DataClass):
             length).  If ``None``, then the geocenter (code 500) is
             used.
 
+        interpolate : `~astropy.units.Quantity`, optional
+            If provided, ephemerides for a list of epochs (a
+            `~astropy.time.Time` object; not available for epoch
+            ranges provided as a dictionary) are not queried
+            individually but on regular grids covering the epochs and
+            interpolated to the requested epochs. The grid
+            step size is reduced from
+            ``sbpy.data.conf.mpc_interpolation_step`` until the
+            estimated interpolation error in position is smaller than
+            ``interpolate`` (angle). Floating-point fields are
+            interpolated, all other fields are taken from the closest
+            grid point. Default: ``None``
+
         **kwargs
             Additional keyword arguments are passed to
             `~astroquery.mpc.MPC.get_ephemerides`: ``eph_type``,
@@ -314,13 +639,23 @@ class Ephem(DataClass):
         """
 
         # parameter check
+        if interpolate is not None:
+            interpolate = u.Quantity(interpolate, u.arcsec)
+            if 'ra_format' in kwargs or 'dec_format' in kwargs:
+                raise ValueError('interpolation requires RA and Dec in '
+                                 'degrees; do not use ra_format or '
+                                 'dec_format')
+            if isinstance(epochs, dict):
+                raise ValueError('interpolate requires epochs as an '
+                                 'astropy.time.Time object; epoch '
+                                 'ranges are queried on their grid')
 
         # if targetids is a list, run separate Horizons queries and append
         if not isinstance(targetids, (list, ndarray, tuple)):
             targetids = [targetids]
 
         _epochs = None  # avoid modifying epochs in-place
-        start = None
+        start, step, number = None, None, None
         if epochs is None:
             _epochs = Time([Time.now()])
         elif isinstance(epochs, Time):
@@ -371,38 +706,56 @@ class Ephem(DataClass):
         else:
             raise ValueError('Invalid `epochs` parameter')
 
-        # append ephemerides table for each targetid
-        all_eph = None
+        # split epoch lists into batches: regular grids are queried as
+        # ranges, all other epochs individually; the MPC rounds epochs
+        # to full seconds
+        epoch_batches = []
+        if start is None and interpolate is None:
+            t = around(((_epochs.jd1 - 2451545) + _epochs.jd2) * 86400)
+            for is_range, i0, i1 in _epoch_batches(
+                    t, conf.epoch_grid_tolerance,
+                    max_run=conf.mpc_max_epochs):
+                batch = {'start': _epochs[i0], 'number': i1 - i0}
+                if is_range:
+                    batch['step'] = _mpc_step(int(t[i0 + 1] - t[i0]))
+                epoch_batches.append(batch)
+
+        # gather ephemerides table for each targetid
+        all_eph = TableAccumulator()
         for targetid in targetids:
-            try:
-                # get ephemeris
-                if start is None:
-                    eph = []
-                    for i in range(len(_epochs)):
-                        e = MPC.get_ephemeris(targetid, location=location,
-                                              start=Time(_epochs[i],
-                                                         scale='utc'),
-                                              number=1, **kwargs)
-                        e['Date'] = e['Date'].iso  # for vstack to work
-                        eph.append(e)
-                    eph = vstack(eph)
-                    eph['Date'] = Time(eph['Date'], scale='utc')
-                else:
-                    eph = MPC.get_ephemeris(targetid, location=location,
-                                            start=start, step=step,
-                                            number=number, **kwargs)
-            except InvalidQueryError as e:
-                raise QueryError(
-                    'Error raised by astroquery.mpc: {:s}'.format(str(e)))
+            def fetch():
+                try:
+                    # get ephemeris
+                    if start is None and interpolate is not None:
+                        eph = _query_mpc_interpolated(
+                            targetid, _epochs, interpolate, location,
+                            **kwargs)
+                    elif start is None:
+                        eph = TableAccumulator()
+                        for batch in epoch_batches:
+                            eph.append(MPC.get_ephemeris(
+                                targetid, location=location, **batch,
+                                **kwargs))
+                        eph = eph.to_table()
+                    else:
+                        eph = MPC.get_ephemeris(targetid, location=location,
+                                                start=start, step=step,
+                                                number=number, **kwargs)
+                except InvalidQueryError as e:
+                    raise QueryError(
+                        'Error raised by astroquery.mpc: {:s}'.format(str(e)))
 
-            # add targetname column
-            eph.add_column(Column([targetid]*len(eph),
-                                  name='Targetname'), index=0)
+                # add targetname column
+                eph.add_column(Column([targetid]*len(eph),
+                                      name='Targetname'), index=0)
 
-            if all_eph is None:
-                all_eph = eph
-            else:
-                all_eph = vstack([all_eph, eph])
+                return eph
+
+            all_eph.append(cached_query(
+                'mpc', fetch, targetid=targetid, location=location,
+                epochs=_epochs, start=start, step=step, number=number,
+                interpolate=interpolate, kwargs=kwargs))
+        all_eph = all_eph.to_table()
 
         # if ra_format or dec_format is defined, then units must be
         # dropped or else QTable will raise an exception because
@@ -543,54 +896,76 @@ class Ephem(DataClass):
                 location.lat.deg,
                 location.height.to('m').value)
 
-        # append ephemerides table for each targetid
-        all_eph = None
+        # split epoch lists into batches: regular grids with steps of
+        # full seconds are queried as ranges, all other epochs
+        # individually
+        epoch_batches = []
+        if ('step' not in _epochs and 'number' not in _epochs and
+                iterable(_epochs['start'])):
+            jd1, jd2 = _epochs['start'].jd1, _epochs['start'].jd2
+            t = ((jd1 - jd1[0]) + (jd2 - jd2[0])) * 86400
+            for is_range, i0, i1 in _epoch_batches(
+                    t, conf.epoch_grid_tolerance,
+                    max_run=conf.miriade_max_epochs):
+                if is_range:
+                    dt = (t[i1 - 1] - t[i0]) / (i1 - i0 - 1)
+                    if abs(dt - around(dt)) <= conf.epoch_grid_tolerance:
+                        epoch_batches.append({
+                            'epoch': _epochs['start'][i0],
+                            'epoch_step': _miriade_step(int(around(dt))),
+                            'epoch_nsteps': i1 - i0})
+                        continue
+                epoch_batches.extend([{'epoch': _epochs['start'][i]}
+                                      for i in range(i0, i1)])
+
+        # gather ephemerides table for each targetid
+        all_eph = TableAccumulator()
         for targetid in targetids:
-            query = Miriade()
-            try:
-                if 'step' not in _epochs and 'number' not in _epochs:
-                    if not iterable(_epochs['start']):
-                        # single epoch
-                        eph = query.get_ephemerides(targetname=targetid,
-                                                    objtype=objtype,
-                                                    location=location,
-                                                    epoch=_epochs['start'],
-                                                    **kwargs)
+            def fetch():
+                query = Miriade()
+                try:
+                    if 'step' not in _epochs and 'number' not in _epochs:
+                        if not iterable(_epochs['start']):
+                            # single epoch
+                            eph = query.get_ephemerides(targetname=targetid,
+                                                        objtype=objtype,
+                                                        location=location,
+                                                        epoch=_epochs['start'],
+                                                        **kwargs)
+                        else:
+                            # multiple epochs
+                            eph = []
+                            for batch in epoch_batches:
+                                e = query.get_ephemerides(
+                                    targetname=targetid, objtype=objtype,
+                                    location=location, **batch, **kwargs)
+                                e['epoch'] = Time(e['epoch'], format='jd',
+                                                  scale='utc').iso
+                                eph.append(e)
+                            eph = vstack(eph)
+                            eph['epoch'] = Time(eph['epoch'], scale='utc',
+                                                format='iso')
                     else:
-                        # multiple epochs
-                        eph = []
-                        for i in range(len(_epochs['start'])):
-                            e = query.get_ephemerides(targetname=targetid,
-                                                      objtype=objtype,
-                                                      location=location,
-                                                      epoch=_epochs['start'][i],
-                                                      **kwargs)
-                            e['epoch'] = Time(e['epoch'], format='jd',
-                                              scale='utc').iso
-                            eph.append(e)
-                        eph = vstack(eph)
-                        eph['epoch'] = Time(eph['epoch'], scale='utc',
-                                            format='iso')
-                else:
-                    # dictionary
-                    eph = query.get_ephemerides(
-                        targetname=targetid, objtype=objtype,
-                        location=location, epoch=_epochs['start'],
-                        epoch_step=_epochs['step'],
-                        epoch_nsteps=_epochs['number'],
-                        **kwargs)
-            except RuntimeError as e:
-                raise QueryError(
-                    ('Error raised by astroquery.imcce: {:s}\n'
-                     'The following query was attempted: {:s}').format(
-                         str(e), query.uri))
+                        # dictionary
+                        eph = query.get_ephemerides(
+                            targetname=targetid, objtype=objtype,
+                            location=location, epoch=_epochs['start'],
+                            epoch_step=_epochs['step'],
+                            epoch_nsteps=_epochs['number'],
+                            **kwargs)
+                except RuntimeError as e:
+                    raise QueryError(
+                        ('Error raised by astroquery.imcce: {:s}\n'
+                         'The following query was attempted: {:s}').format(
+                             str(e), query.uri))
 
-            if all_eph is None:
-                all_eph = eph
-            else:
-                all_eph = vstack([all_eph, eph])
+                return eph
 
-        self = cls.from_table(all_eph)
+            all_eph.append(cached_query(
+                'miriade', fetch, targetid=targetid, objtype=objtype,
+                location=location, epochs=_epochs, kwargs=kwargs))
+
+        self = cls.from_table(all_eph.to_table())
 
         # turn epochs into astropy.time.Time and apply timescale
         self.table['epoch'] = Time(self.table['epoch'],
@@ -602,7 +977,7 @@ class Ephem(DataClass):
     @cite({'method': '2009M&PS...44.1853G',
            'software': 'https://github.com/oorb/oorb'})
     def from_oo(cls, orbit, epochs=None, location='500', scope='full',
-                dynmodel='N', ephfile='de430'):
+                dynmodel='N', ephfile='de430', workers=1):
         """Uses pyoorb to derive ephemerides from an `~Orbit` object. For a
         list of output parameters, please read the `pyoorb documentation
         <https://github.com/oorb/oorb/tree/master/python>`_.
@@ -658,6 +1033,11 @@ class Ephem(DataClass):
         ephfile : str, optional
             Planet and Lunar ephemeris file version as provided by JPL
             to be used in the propagation. Default: ``'de430'``
+        workers : int, optional
+            Number of processes used to derive ephemerides. If larger
+            than 1, orbits are split into shards that are processed in
+            parallel; the results are identical to and in the same
+            order as those of a single process. Default: 1
 
         Returns
         -------
@@ -706,14 +1086,6 @@ class Ephem(DataClass):
         # extract time scale
         timescale = epochs.scale.upper()
 
-        # initialize pyoorb
-        if os.getenv('OORB_DATA') is None:
-            # oorb installed using conda
-            pyoorb.pyoorb.oorb_init()
-        else:
-            ephfile = os.path.join(os.getenv('OORB_DATA'), ephfile+'.dat')
-            pyoorb.pyoorb.oorb_init(ephfile)
-
         # identify orbit type based on available table columns
         orbittype = None
         for testtype in ['KEP', 'COM', 'CART']:
@@ -756,46 +1128,45 @@ class Ephem(DataClass):
         except TypeError:
             epochs = [(epochs.mjd, conf.oorb_timeScales['TT'])]
 
-        if scope == 'full':
-            oo_eph, err = pyoorb.pyoorb.oorb_ephemeris_full(
-                orb._to_oo(),
-                location,
-                epochs,
-                dynmodel)
-        elif scope == 'basic':
-            oo_eph, err = pyoorb.pyoorb.oorb_ephemeris_basic(
-                orb._to_oo(),
-                location,
-                epochs,
-                dynmodel)
+        if workers > 1 and len(orb) > 1:
+            oo_eph, err = _oo_ephemeris_sharded(
+                orb._to_oo(), location, epochs, dynmodel, scope, ephfile,
+                workers)
+        else:
+            OpenOrbSession.init(ephfile)
+            oo_eph, err = _oo_ephemeris(orb._to_oo(), location, epochs,
+                                        dynmodel, scope)
 
         if err != 0:
-            OpenOrbError('pyoorb failed with error code {:d}'.format(err))
+            raise OpenOrbError(
+                'pyoorb failed with error code {:d}'.format(err))
 
-        # reorder data on per-column basis and apply units
-        oo_eph_col = hstack([oo_eph.transpose()[:, :, i]
-                             for i in range(oo_eph.shape[0])]).tolist()
-        oo_eph_col_u = []
+        # oo_eph has shape (orbits, epochs, fields); rows of the
+        # ephemeris table are ordered by orbit, then epoch. pyoorb
+        # returns Fortran-ordered arrays, so the reshape copies oo_eph
+        # once; columns are views of that copy and units are applied
+        # without further copies
         if scope == 'full':
-            for i, col in enumerate(oo_eph_col):
-                oo_eph_col_u.append(Ephem._unit_apply(
-                    col, conf.oorb_ephem_full_units[i]))
-            ephem = cls.from_columns(oo_eph_col_u,
-                                     names=conf.oorb_ephem_full_fields)
+            fields = conf.oorb_ephem_full_fields
+            units = conf.oorb_ephem_full_units
         elif scope == 'basic':
-            for i, col in enumerate(oo_eph_col):
-                oo_eph_col_u.append(Ephem._unit_apply(
-                    col, conf.oorb_ephem_basic_units[i]))
-            ephem = cls.from_columns(oo_eph_col_u,
-                                     names=conf.oorb_ephem_basic_fields)
+            fields = conf.oorb_ephem_basic_fields
+            units = conf.oorb_ephem_basic_units
+        oo_eph_rows = oo_eph.reshape(-1, oo_eph.shape[2])
+        columns = []
+        for i, unit in enumerate(units):
+            col = oo_eph_rows[:, i]
+            if unit is not None:
+                col = u.Quantity(col, unit, copy=False)
+            columns.append(col)
+        ephem = cls.from_columns(columns, names=fields, copy=False)
 
         # add targetname column
-        ephem.table.add_column(Column(data=sum([[orb['targetname'][i]] *
-                                                len(epochs) for i in
-                                                range(len(orb.table))],
-                                               []),
-                                      name='targetname'),
-                               index=0)
+        ephem.table.add_column(
+            Column(data=repeat(array(orb['targetname']),
+                               oo_eph.shape[1]),
+                   name='targetname'),
+            index=0)
 
         # convert MJD to astropy.time.TimeJulian Date
         ephem.table['epoch'] = Time(ephem['MJD'], format='mjd',
@@ -804,3 +1175,172 @@ class Ephem(DataClass):
         ephem.table.remove_column('MJD')
 
         return ephem
+
+    @classmethod
+    def from_orbit_2body(cls, orbit, epochs=None, location='500',
+                         observer=None, lighttime_tol=1e-10):
+        """Derive ephemerides from an `~Orbit` object on two-body orbits,
+        without remote queries or `pyoorb`.
+
+        Geometries are light-time corrected (astrometric positions;
+        aberration and planetary perturbations are neglected) and
+        computed for all orbits and epochs at once with NumPy, using
+        the two-body propagator `~sbpy.data.twobody`.
+
+        Parameters
+        ----------
+        orbit : `~Orbit` object
+            Heliocentric J2000 ecliptic Keplerian, cometary, or cartesian
+            elements (see `~sbpy.data.Orbit.to_cartesian`) and epochs
+            (``'epoch'``) as `~astropy.time.Time`. If absolute
+            magnitudes (``'H'``) and photometric phase slopes (``'G'``)
+            are provided, ``'V'`` magnitudes are derived with the IAU
+            HG model.
+        epochs : `~astropy.time.Time` object, optional
+            Epochs of the ephemerides. If ``None`` is provided, current
+            date and time are used. The same time scale that is used in
+            ``epochs`` will be applied to the results. Default: ``None``
+        location : str or `~astropy.coordinates.EarthLocation`, optional
+            Location of the observer: ``'500'`` (geocentric) or an
+            `~astropy.coordinates.EarthLocation`. Observer positions are
+            derived from the built-in solar system ephemeris of
+            `astropy`. Ignored if ``observer`` is provided.
+            Default: ``'500'``
+        observer : `~sbpy.data.DataClass`, table, or dict, optional
+            Heliocentric J2000 ecliptic positions of the observer
+            (``'x'``, ``'y'``, ``'z'``, typically in au) at ``epochs``,
+            one row per epoch, e.g., from an external ephemeris. If
+            velocities (``'vx'``, ``'vy'``, ``'vz'``, typically in au/d)
+            are not provided, rates are not derived. Default: ``None``
+        lighttime_tol : float, optional
+            Convergence tolerance of the light-time iteration in days.
+            Default: ``1e-10``
+
+        Returns
+        -------
+        `~Ephem` object
+            Rows are ordered by orbit, then epoch. Fields are named as
+            in `~sbpy.data.Ephem.from_oo`: ``'targetname'``,
+            ``'epoch'``, ``'RA'``, ``'DEC'``, ``'RA*cos(Dec)_rate'``,
+            ``'DEC_rate'``, ``'alpha'``, ``'elong'``, ``'r'``,
+            ``'Delta'``, ``'V'``, ``'trueanom'``, heliocentric target
+            state vectors (``'x'``, ``'y'``, ``'z'``, ``'vx'``,
+            ``'vy'``, ``'vz'``), and observer positions (``'obsx'``,
+            ``'obsy'``, ``'obsz'``).
+
+        Examples
+        --------
+        >>> import numpy as np
+        >>> from sbpy.data import Orbit, Ephem
+        >>> from astropy.time import Time
+        >>> epochs = Time(2458600.5 + np.arange(10), format='jd')
+        >>> ceres = Orbit.from_horizons('1')  # doctest: +REMOTE_DATA
+        >>> eph = Ephem.from_orbit_2body(ceres, epochs)  # doctest: +REMOTE_DATA
+        """
+        if epochs is None:
+            epochs = Time.now()
+        if epochs.isscalar:
+            epochs = epochs.reshape((1,))
+        n, m = len(orbit.table), len(epochs)
+
+        # observer states, shape (3, 1, epochs)
+        if observer is None:
+            obs_r, obs_v = _observer_state(epochs, location)
+        else:
+            if not isinstance(observer, DataClass):
+                observer = DataClass.from_table(QTable(observer))
+            if len(observer.table) != m:
+                raise ValueError(
+                    'observer must provide one position per epoch')
+            obs_r = array([u.Quantity(observer[k], 'au').value
+                           for k in ('x', 'y', 'z')])
+            try:
+                obs_v = array([u.Quantity(observer[k], 'au/d').value
+                               for k in ('vx', 'vy', 'vz')])
+            except KeyError:
+                obs_v = None
+        obs_r = obs_r[:, None, :]
+        if obs_v is not None:
+            obs_v = obs_v[:, None, :]
+
+        # orbital elements referred to the perihelion passage, shape
+        # (orbits, 1)
+        orb = Orbit.from_table(orbit.table)
+        r0, v0, orbittype, colnames = orb._state()
+        q, e, incl, Omega, w, dtp, alpha = [
+            x[:, None] for x in twobody.state_to_elements(r0, v0)]
+        dtp = dtp + (epochs.tdb.jd[None, :] - orb._epoch_jd()[:, None])
+
+        # light-time iteration
+        tau = 0
+        for i in range(10):
+            r, v = twobody.elements_to_state(q, e, incl, Omega, w,
+                                             dtp - tau)
+            rho = r - obs_r
+            delta = sqrt((rho**2).sum(0))
+            tau, last = delta / C_AU_D, tau
+            if abs(tau - last).max() < lighttime_tol:
+                break
+        r, v = twobody.elements_to_state(q, e, incl, Omega, w, dtp - tau)
+        rho = r - obs_r
+        rh = sqrt((r**2).sum(0))
+        robs = sqrt((obs_r**2).sum(0))
+
+        eq = _ecliptic_to_equatorial(rho)
+        ra = arctan2(eq[1], eq[0]) % (2 * pi)
+        dec = arcsin(clip(eq[2] / delta, -1, 1))
+        phase = arccos(clip((r * rho).sum(0) / rh / delta, -1, 1))
+        elong = arccos(clip(-(obs_r * rho).sum(0) / robs / delta, -1, 1))
+        P, Q = twobody._perifocal_axes(incl, Omega, w)
+        trueanom = arctan2((r * Q).sum(0), (r * P).sum(0)) % (2 * pi)
+
+        def rows(x):
+            return broadcast_to(x, (n, m)).ravel()
+
+        columns = [rows(rad2deg(ra)) * u.deg, rows(rad2deg(dec)) * u.deg]
+        names = ['RA', 'DEC']
+        if obs_v is not None:
+            # target velocity at emission, observer velocity at epochs
+            dv = _ecliptic_to_equatorial(v - obs_v)
+            sa, ca = sin(ra), cos(ra)
+            sd, cd = sin(dec), cos(dec)
+            columns += [
+                rows(rad2deg(-sa * dv[0] + ca * dv[1]) / delta) *
+                u.deg / u.d,
+                rows(rad2deg(-sd * ca * dv[0] - sd * sa * dv[1] +
+                             cd * dv[2]) / delta) * u.deg / u.d]
+            names += ['RA*cos(Dec)_rate', 'DEC_rate']
+        columns += [rows(rad2deg(phase)) * u.deg,
+                    rows(rad2deg(elong)) * u.deg,
+                    rows(rh) * u.au, rows(delta) * u.au]
+        names += ['alpha', 'elong', 'r', 'Delta']
+
+        H, G = orb._translate_columns(['H', 'G'])
+        if H in orb.table.colnames and G in orb.table.colnames:
+            from ..photometry import HG
+            H = u.Quantity(orb.table[H], 'mag').value[:, None]
+            G = array(orb.table[G], dtype=float)[:, None]
+            columns.append(rows(HG.evaluate(phase, H, G) +
+                                5 * log10(rh * delta)) * u.mag)
+            names.append('V')
+
+        columns.append(rows(rad2deg(trueanom)) * u.deg)
+        names.append('trueanom')
+        columns += [rows(x) * u.au for x in r]
+        columns += [rows(x) * u.au / u.d for x in v]
+        columns += [rows(x) * u.au for x in obs_r]
+        names += ['x', 'y', 'z', 'vx', 'vy', 'vz', 'obsx', 'obsy', 'obsz']
+
+        ephem = cls.from_columns(columns, names=names, copy=False)
+
+        if 'targetname' in orb.field_names:
+            targetname = array(orb['targetname'])
+        else:
+            targetname = array(['orbit_' + str(i) for i in range(n)])
+        ephem.table.add_column(Column(data=repeat(targetname, m),
+                                      name='targetname'), index=0)
+        ephem.table.add_column(
+            Time(tile(epochs.jd1, n), tile(epochs.jd2, n), format='jd',
+                 scale=epochs.scale), name='epoch', index=1)
+
+        return ephem
@@ -0,0 +1,454 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+======================================
+sbpy data.EphemerisInterpolator Module
+======================================
+
+Compact piecewise Chebyshev representation of ephemerides
+
+created on October 16, 2026
+"""
+
+from warnings import warn
+
+import numpy as np
+from numpy.polynomial.chebyshev import chebfit, chebval
+from astropy.time import Time
+from astropy.table import Column
+import astropy.units as u
+
+from . import conf
+from .ephem import Ephem
+from ..exceptions import SbpyWarning
+
+__all__ = ['EphemerisInterpolator', 'EphemerisInterpolatorWarning']
+
+
+class EphemerisInterpolatorWarning(SbpyWarning):
+    """Ephemeris could not be represented within the requested
+    tolerance."""
+    pass
+
+
+# minimum number of samples per segment
+_MIN_SAMPLES = 8
+
+
+def _days(epochs):
+    """Days since J2000 of `~astropy.time.Time` ``epochs`` in their
+    own time scale."""
+    return (epochs.jd1 - 2451545) + epochs.jd2
+
+
+def _fit_segments(t, y, w, tol, degree):
+    """Fit piecewise Chebyshev series to samples ``y``, shape (epochs,
+    fields), at sorted epochs ``t``.
+
+    Segments are bisected until the largest weighted deviation
+    (deviations times weights ``w``, shape (epochs, fields)) is within
+    ``tol`` (per field) or halves would have fewer than `_MIN_SAMPLES`
+    samples; the degree is reduced for segments with few samples. The
+    deviation is estimated by fitting every other sample and comparing
+    the fit to all samples, which overestimates the deviation of the
+    final fit to all samples, also between the samples. Segments of
+    two samples are fitted with a line and have no estimated
+    deviation.
+
+    Returns
+    -------
+    segments : list of tuples
+        ``(t0, t1, coeffs, error)`` for each segment, in order of
+        time; ``coeffs`` has shape (fields, degree + 1) and ``error``
+        (the estimated largest weighted deviation) shape (fields,).
+    """
+
+    segments = []
+    stack = [(0, len(t) - 1)]
+    while stack:
+        i0, i1 = stack.pop()
+        n = i1 - i0 + 1
+        x = (2 * t[i0:i1 + 1] - (t[i0] + t[i1])) / (t[i1] - t[i0])
+        if n < 3:
+            # too few samples to hold any out: the line through both
+            # samples is taken as exact
+            deg = 1
+            error = np.zeros(y.shape[1])
+        else:
+            # fit to every other sample; the degree is reduced so that
+            # there are at least as many samples as coefficients, as
+            # many for n < 15 (e.g., 7 and 7 for n = 14)
+            deg = min(degree, (n + 1) // 2 - 1)
+            c = chebfit(x[::2], y[i0:i1 + 1:2], deg)
+            error = (np.abs(chebval(x, c).T - y[i0:i1 + 1]) *
+                     w[i0:i1 + 1]).max(0)
+        if (error > tol).any() and n >= 2 * _MIN_SAMPLES - 1:
+            # bisect; halves share the central sample
+            m = (i0 + i1) // 2
+            stack.append((m, i1))
+            stack.append((i0, m))
+            continue
+        coeffs = np.zeros((y.shape[1], degree + 1))
+        coeffs[:, :deg + 1] = chebfit(x, y[i0:i1 + 1], deg).T
+        segments.append((t[i0], t[i1], coeffs, error))
+
+    return segments
+
+
+class EphemerisInterpolator():
+    """Piecewise Chebyshev representation of ephemerides of many
+    targets.
+
+    Ephemeris fields of each target are represented by Chebyshev
+    series of a fixed degree on consecutive time segments, which are
+    fitted to a dense input ephemeris (e.g., from
+    `~sbpy.data.Ephem.from_oo`, `~sbpy.data.Ephem.from_orbit_2body`,
+    or `~sbpy.data.Ephem.from_horizons`); segments are bisected until
+    the series deviate from the input by less than a given tolerance.
+    Evaluation is vectorized over arbitrary pairs of targets and
+    epochs. Use `~sbpy.data.EphemerisInterpolator.from_ephem` or
+    `~sbpy.data.EphemerisInterpolator.from_file` to create objects of
+    this class.
+
+    Parameters
+    ----------
+    targetnames : `~numpy.ndarray`
+        Target names, shape (targets,).
+    fields : list of str
+        Field names.
+    units : list of str
+        Units of the fields; empty strings for fields without units.
+    scale : str
+        Time scale of the segment boundaries.
+    offsets : `~numpy.ndarray`
+        Index of the first segment of each target and total number
+        of segments, shape (targets + 1,).
+    t0, t1 : `~numpy.ndarray`
+        Segment boundaries in days since J2000 (in time scale
+        ``scale``), shape (segments,).
+    coeffs : `~numpy.ndarray`
+        Chebyshev coefficients, shape (segments, fields, degree + 1).
+    error : `~numpy.ndarray`
+        Largest deviation of each segment and field from the input
+        ephemeris, shape (segments, fields); deviations in right
+        ascension are measured along great circles.
+    wrap : `~numpy.ndarray`
+        ``True`` for angular fields that are wrapped into [0, 360)
+        deg, shape (fields,).
+
+    Notes
+    -----
+    Deviations from the input ephemeris are measured at the input
+    epochs, and each segment is fitted to more samples than
+    coefficients where possible. ``error`` is hence a bound of the
+    interpolation error as long as the input ephemeris resolves the
+    motion of the targets, which should be sampled at least a few
+    times per smallest time scale of interest (e.g., close approaches
+    to the observer).
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from astropy.time import Time
+    >>> from sbpy.data import Orbit, Ephem, EphemerisInterpolator
+    >>> epochs = Time(2458600.5 + np.arange(0, 365, 0.5), format='jd')
+    >>> ceres = Orbit.from_horizons('1')  # doctest: +REMOTE_DATA
+    >>> eph = Ephem.from_orbit_2body(ceres, epochs)  # doctest: +REMOTE_DATA
+    >>> interp = EphemerisInterpolator.from_ephem(eph)  # doctest: +REMOTE_DATA
+    >>> t = Time(2458700.5 + np.random.rand(1000000) * 100, format='jd')
+    >>> radec = interp.evaluate(ceres['targetname'][0], t,
+    ...                         fields=['RA', 'DEC'])  # doctest: +REMOTE_DATA
+    """
+
+    #: Default fields and tolerances of
+    #: `~sbpy.data.EphemerisInterpolator.from_ephem`; the tolerance in
+    #: right ascension applies to great circle distances
+    default_tol = {'RA': 0.01 * u.arcsec, 'DEC': 0.01 * u.arcsec,
+                   'r': 1e-8 * u.au, 'Delta': 1e-8 * u.au,
+                   'alpha': 1e-3 * u.deg}
+
+    def __init__(self, targetnames, fields, units, scale, offsets, t0, t1,
+                 coeffs, error, wrap):
+        self.targetnames = np.asarray(targetnames, dtype=str)
+        self.fields = list(fields)
+        self.units = list(units)
+        self.scale = scale
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.t0 = np.asarray(t0, dtype=float)
+        self.t1 = np.asarray(t1, dtype=float)
+        self.coeffs = np.asarray(coeffs, dtype=float)
+        self.error = np.asarray(error, dtype=float)
+        self.wrap = np.asarray(wrap, dtype=bool)
+
+        self._index = {name: i for i, name in
+                       enumerate(self.targetnames.tolist())}
+
+        # composite search keys of segment starts: target index plus
+        # time within the full time span (which is smaller than one)
+        self._tmin = self.t0.min()
+        self._span = self.t1.max() - self._tmin + 1
+        self._segment_target = np.repeat(np.arange(len(self.targetnames)),
+                                         np.diff(self.offsets))
+        self._keys = (self._segment_target +
+                      (self.t0 - self._tmin) / self._span)
+
+    def __len__(self):
+        """Number of targets"""
+        return len(self.targetnames)
+
+    @property
+    def degree(self):
+        """Degree of the Chebyshev series"""
+        return self.coeffs.shape[2] - 1
+
+    @property
+    def max_error(self):
+        """Largest deviation from the input ephemeris for each field as
+        a dictionary of `~astropy.units.Quantity` objects."""
+        return {field: self.error[:, i].max() * u.Unit(unit)
+                for i, (field, unit) in enumerate(zip(self.fields,
+                                                      self.units))}
+
+    @classmethod
+    def from_ephem(cls, eph, fields=None, tol=None, degree=10):
+        """Fit piecewise Chebyshev series to a dense ephemeris.
+
+        Parameters
+        ----------
+        eph : `~sbpy.data.Ephem`
+            Ephemerides with epochs (``'epoch'``) as
+            `~astropy.time.Time` and target names (``'targetname'``;
+            if not provided, all rows refer to a single target with an
+            empty name). At least two distinct epochs are required per
+            target; the epochs of different targets may differ.
+        fields : list of str, optional
+            Fields to represent; angles are unwrapped before fitting.
+            If ``None``, those fields of
+            `~sbpy.data.EphemerisInterpolator.default_tol` that are
+            available in ``eph`` are used. Default: ``None``
+        tol : dict of `~astropy.units.Quantity`, optional
+            Tolerances for fields, updating
+            `~sbpy.data.EphemerisInterpolator.default_tol`; required
+            for all fields that are not listed there. Tolerances in
+            right ascension apply to great circle distances if
+            declinations are available. Default: ``None``
+        degree : int, optional
+            Degree of the Chebyshev series. Default: ``10``
+
+        Returns
+        -------
+        `~sbpy.data.EphemerisInterpolator`
+
+        Warns
+        -----
+        `~sbpy.data.EphemerisInterpolatorWarning`
+            If the tolerance could not be met for some segments, which
+            happens if the input ephemeris is not sampled densely
+            enough.
+        """
+
+        tolerances = dict(cls.default_tol)
+        tolerances.update(tol or {})
+        if fields is None:
+            fields = []
+            for field in cls.default_tol:
+                try:
+                    eph[field]
+                except KeyError:
+                    continue
+                fields.append(field)
+        missing = [field for field in fields if field not in tolerances]
+        if len(missing) > 0:
+            raise ValueError('no tolerance provided for fields {}'.format(
+                ', '.join(missing)))
+
+        epochs = eph['epoch']
+        t = _days(epochs)
+        try:
+            targetnames, target = np.unique(
+                np.asarray(eph['targetname'], dtype=str),
+                return_inverse=True)
+        except KeyError:
+            targetnames = np.array([''])
+            target = np.zeros(len(t), int)
+
+        # samples ordered by target and epoch, shape (rows, fields)
+        units = []
+        wrap = []
+        y = np.empty((len(t), len(fields)))
+        for i, field in enumerate(fields):
+            col = u.Quantity(eph[field])
+            units.append(col.unit.to_string())
+            y[:, i] = col.value
+            wrap.append(False)
+        tol = np.array([u.Quantity(tolerances[field]).to_value(unit)
+                        for field, unit in zip(fields, units)])
+
+        # deviations in RA are weighted to great circle distances
+        w = np.ones_like(y)
+        angle = [u.Unit(unit).physical_type == 'angle' for unit in units]
+        for i, field in enumerate(fields):
+            if (conf.fieldname_idx.get(field) == conf.fieldname_idx['RA']
+                    and angle[i]):
+                try:
+                    w[:, i] = np.abs(np.cos(
+                        u.Quantity(eph['DEC']).to_value('rad')))
+                except KeyError:
+                    pass
+
+        order = np.lexsort((t, target))
+        bounds = np.searchsorted(target[order],
+                                 np.arange(len(targetnames) + 1))
+
+        offsets = [0]
+        segments = []
+        for j in range(len(targetnames)):
+            rows = order[bounds[j]:bounds[j + 1]]
+            tj = t[rows]
+            if len(rows) < 2 or tj[-1] == tj[0]:
+                raise ValueError(
+                    'at least two distinct epochs required for target '
+                    '{}'.format(targetnames[j]))
+            yj = y[rows]
+            for i in range(len(fields)):
+                if angle[i]:
+                    # unwrap in radians, fit in the original unit; fields
+                    # with jumps are wrapped again when evaluated
+                    rad = u.Quantity(yj[:, i], units[i]).to_value('rad')
+                    unwrapped = np.unwrap(rad)
+                    if (np.abs(unwrapped - rad) > np.pi).any():
+                        wrap[i] = True
+                        yj[:, i] = u.Quantity(unwrapped, 'rad').to_value(
+                            units[i])
+            segments.extend(_fit_segments(tj, yj, w[rows], tol, degree))
+            offsets.append(len(segments))
+
+        t0, t1, coeffs, error = [np.array(x) for x in zip(*segments)]
+        interp = cls(targetnames, fields, units, epochs.scale, offsets,
+                     t0, t1, coeffs, error, wrap)
+
+        exceeded = (error > tol).any(0)
+        if exceeded.any():
+            warn(('tolerance not met for field(s) {}; provide a denser '
+                  'input ephemeris').format(', '.join(
+                      np.array(fields)[exceeded])),
+                 EphemerisInterpolatorWarning)
+
+        return interp
+
+    def evaluate(self, targetnames, epochs, fields=None):
+        """Evaluate ephemerides for pairs of targets and epochs.
+
+        Parameters
+        ----------
+        targetnames : str or array-like of str
+            Target names; broadcast against ``epochs``.
+        epochs : `~astropy.time.Time`
+            Epochs, which have to be within the time span of the input
+            ephemeris of the respective target.
+        fields : list of str, optional
+            Fields to evaluate. If ``None``, all fields are evaluated.
+            Default: ``None``
+
+        Returns
+        -------
+        `~sbpy.data.Ephem`
+            Target names (``'targetname'``), epochs (``'epoch'``), and
+            ``fields``, one row per element of the broadcast
+            ``targetnames`` and ``epochs``.
+
+        Raises
+        ------
+        KeyError
+            If targets are not available.
+        ValueError
+            If epochs are outside the time span of a target.
+        """
+
+        if fields is None:
+            fields = self.fields
+        columns = [self.fields.index(field) for field in fields]
+
+        names, inverse = np.unique(np.asarray(targetnames, dtype=str),
+                                   return_inverse=True)
+        try:
+            index = np.array([self._index[name] for name in names.tolist()],
+                             dtype=int)
+        except KeyError as e:
+            raise KeyError('target {} not available'.format(e.args[0]))
+        target = index[inverse].reshape(np.shape(targetnames))
+
+        target, t, jd1, jd2 = [x.ravel() for x in np.broadcast_arrays(
+            target, _days(getattr(epochs, self.scale)), epochs.jd1,
+            epochs.jd2)]
+
+        # segment of each pair from the composite search keys
+        key = target + (t - self._tmin) / self._span
+        seg = np.clip(np.searchsorted(self._keys, key, side='right') - 1,
+                      self.offsets[target], self.offsets[target + 1] - 1)
+        outside = ((t < self.t0[self.offsets[target]]) |
+                   (t > self.t1[self.offsets[target + 1] - 1]))
+        if outside.any():
+            raise ValueError(
+                '{} epochs are outside the time span of their target'.format(
+                    outside.sum()))
+
+        # Clenshaw recurrence for all pairs at once
+        t0 = self.t0[seg]
+        t1 = self.t1[seg]
+        x2 = 2 * (2 * t - (t0 + t1)) / (t1 - t0)
+        values = []
+        for i in columns:
+            c = self.coeffs[:, i, :]
+            b1 = np.zeros(len(t))
+            b2 = np.zeros(len(t))
+            for k in range(self.degree, 0, -1):
+                b1, b2 = c[seg, k] + x2 * b1 - b2, b1
+            v = c[seg, 0] + x2 / 2 * b1 - b2
+            unit = u.Unit(self.units[i])
+            if self.wrap[i]:
+                v %= (360 * u.deg).to_value(unit)
+            values.append(v * unit)
+
+        ephem = Ephem.from_columns(values, names=fields, copy=False)
+        ephem.table.add_column(Column(data=self.targetnames[target],
+                                      name='targetname'), index=0)
+        ephem.table.add_column(Time(jd1, jd2, format='jd',
+                                    scale=epochs.scale),
+                               name='epoch', index=1)
+
+        return ephem
+
+    def to_file(self, filename):
+        """Write this object to a file in NumPy's ``.npz`` format.
+
+        Parameters
+        ----------
+        filename : str
+            File name.
+        """
+        np.savez(filename, targetnames=self.targetnames,
+                 fields=np.array(self.fields, dtype=str),
+                 units=np.array(self.units, dtype=str),
+                 scale=np.array(self.scale), offsets=self.offsets,
+                 t0=self.t0, t1=self.t1, coeffs=self.coeffs,
+                 error=self.error, wrap=self.wrap)
+
+    @classmethod
+    def from_file(cls, filename):
+        """Read an object written with
+        `~sbpy.data.EphemerisInterpolator.to_file`.
+
+        Parameters
+        ----------
+        filename : str
+            File name.
+
+        Returns
+        -------
+        `~sbpy.data.EphemerisInterpolator`
+        """
+        with np.load(filename, allow_pickle=False) as data:
+            return cls(data['targetnames'], data['fields'].tolist(),
+                       data['units'].tolist(), str(data['scale']),
+                       data['offsets'], data['t0'], data['t1'],
+                       data['coeffs'], data['error'], data['wrap'])
@@ -10,13 +10,76 @@ created on August 28, 2017
 
 """
 
+import re
+from functools import lru_cache
+
 from ..exceptions import SbpyException
-from .core import DataClass
-from numpy import ndarray
+from .core import DataClass, conf
+from numpy import (ndarray, asarray, ascontiguousarray, empty, zeros,
+                   full, uint32, int64, flatnonzero, arange, where, unique)
 
 __all__ = ['Names', 'TargetNameParseError', 'natural_sort_key']
 
 
+# comet identifier pattern (see Names.parse_comet)
+_COMET_PATTERN = re.compile(
+    '^(([1-9][0-9]*[PDCX]'
+    '(-[A-Z]{1,2})?)|[PDCX]/)'  # type/number/fragm [0,1,2]
+    '|([-]?[0-9]{3,4}[ _][A-Z]{1,2}[0-9]{0,3}(-[1-9A-Z]{0,2})?)'
+    # designation [3,4]
+    '|(([dvA-Z][a-z\']? ?[A-Z]*[a-z]*[ -]?[A-Z]?[1-9]*[a-z]*)'
+    '( [1-9A-Z]{1,2})*)'  # name [5,6]
+)
+
+# comet identifier patterns that will be rejected
+_COMET_REJECT = re.compile(
+    '(([1-9][0-9]*[pdcxai]\b)'  # small-caps comet number
+    '|([pdcxai]/))'  # small-caps comet type
+)
+
+_COMET_TYPE = re.compile('[PDCXAI]')
+_COMET_NUMBER = re.compile('[0-9]*')
+_COMET_FRAGMENT = re.compile('-[A-Z]{1,2}')
+
+# asteroid identifier pattern (see Names.parse_asteroid)
+_ASTEROID_PATTERN = re.compile(
+    '(([1A][8-9][0-9]{2}[ _][A-Z]{2}[0-9]{0,3}|'
+    '20[0-9]{2}[ _][A-Z]{2}[0-9]{0,3})'
+    # designation [0,1]
+    '|([1-9][0-9]{3}[ _](P-L|T-[1-3])))'
+    # Palomar-Leiden  [0,2,3]
+    '|([IJKL][0-9]{2}[A-Z][0-9a-z][0-9][A-Z]'
+    '|PLS[1-9][0-9]{3}|T1S[1-9][0-9]{3}|T2S[1-9][0-9]{3}'
+    '|T3S[1-9][0-9]{3})'
+    # packed desig [4]
+    '|(^[A-Za-z][0-9]{4}| [A-Za-z][0-9]{4})'
+    # packed number [5]
+    '|([A-Z]{3,} |[A-Z]{3,}$'  # capitalized acronyms
+    '|van de [A-Z][a-z]*[ ^ 0-9]*[-]?[A-Z]?[a-z]*[^0-9] *'
+    '|de [A-Z][a-z]*[ ^ 0-9]*[-]?[A-Z]?[a-z]*[^0-9] *'
+    "|['`]?[A-Z][A-Z]*['`]?[a-z][a-z]*['`]?[^0-9]*"
+    "[ -]?[A-Z]?[a-z]*[^0-9]*)"
+    # name [6]
+    '|((^|\b)[1-9][0-9]*(\b|$| |_))'
+    # number [7,8]
+    '|^(([1-9][0-9]*A))'
+    # comet-style designations: 1A [10]
+)
+
+# asteroid identifier patterns that will be rejected
+_ASTEROID_REJECT = re.compile(
+    '([1-2][0-9]{0,3}[ _][A-Z][0-9]*(\b|$))'
+    # comet desig
+    '|([1-9][0-9]*[PDCXAI]\b)'
+    # comet number
+    '|([PDCXAI]/)'
+    # comet type
+    '|([1-2][0-9]{0,3}[ _][a-z]{2}[0-9]{0,3})'
+)
+
+_NATURAL_SORT_SPLIT = re.compile('([0-9]+)')
+
+
 def natural_sort_key(s):
     """List sort keys considering strings of numbers as integers.
 
@@ -49,17 +112,76 @@ def natural_sort_key(s):
     ['2P/Encke', '9P/Tempel 1', '10P/Tempel 2', '101P/Chernykh']
 
     """
-    import re
     keys = tuple()
-    for k in re.split('([0-9]+)', str(s)):
+    for k in _NATURAL_SORT_SPLIT.split(str(s)):
         keys += (int(k) if k.isdigit() else k,)
     return keys
 
 
+def _char_codes(a, width=0):
+    """Unicode code points of the string array ``a``, shape (strings,
+    characters), with at least ``width`` characters; shorter strings
+    are padded with zeros."""
+    if a.dtype.itemsize // 4 < width:
+        a = a.astype('<U{}'.format(width))
+    a = ascontiguousarray(a)
+    return a.view(uint32).reshape(len(a), a.dtype.itemsize // 4)
+
+
+def _str_len(codes):
+    """Lengths of strings given as code points."""
+    filled = codes != 0
+    return where(filled.any(1),
+                 codes.shape[1] - filled[:, ::-1].argmax(1), 0)
+
+
+def _digits_value(codes, lengths):
+    """Integer values of digit strings given as code points."""
+    value = zeros(len(codes), dtype=int64)
+    for j in range(codes.shape[1]):
+        use = j < lengths
+        value[use] = value[use] * 10 + codes[use, j].astype(int64) - 48
+    return value
+
+
+def _is_alpha(codes):
+    """ASCII letters."""
+    lower = codes | 32
+    return (lower >= 97) & (lower <= 122)
+
+
 class TargetNameParseError(SbpyException):
     pass
 
 
+def _parse(kind, s):
+    """`Names._parse_comet` (``kind='comet'``) or
+    `Names._parse_asteroid` (``kind='asteroid'``); returns the result
+    and ``None``, or ``None`` and the parsing error message."""
+    parse = Names._parse_comet if kind == 'comet' else Names._parse_asteroid
+    try:
+        return parse(s), None
+    except TargetNameParseError as e:
+        return None, str(e)
+
+
+# cache size and memoized _parse; rebuilt when conf.names_cache_size
+# changes
+_memoized = (None, None)
+
+
+def _parse_memoized(kind, s):
+    """Memoized `_parse`, for up to ``conf.names_cache_size``
+    identifiers."""
+    global _memoized
+    size, parse = _memoized
+    if size != conf.names_cache_size:
+        size = conf.names_cache_size
+        parse = lru_cache(maxsize=size)(_parse)
+        _memoized = size, parse
+    return parse(kind, s)
+
+
 class Names():
     """Class for parsing target identifiers. The functions in this class will
     identify designation, name strings, and number for both comets and
@@ -70,27 +192,47 @@ class Names():
     pkd = ('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
            'abcdefghifklmnopqrstuvwxyz')
 
+    # code points of pkd and lookup table equivalent to pkd.find for
+    # ASCII characters, used for arrays of identifiers
+    _pkd_codes = asarray([ord(c) for c in pkd], dtype=uint32)
+    _pkd_find = full(128, -1, dtype=int64)
+    for _i, _c in reversed(list(enumerate(pkd))):
+        _pkd_find[ord(_c)] = _i
+    del _i, _c
+
     @staticmethod
     def to_packed(s):
         """Convert asteroid designation/number to packed identifier.
 
         Parameters
         ----------
-        s : str
-           Target identifier.
+        s : str or array-like of str
+           Target identifier(s).
 
         Returns
         -------
-        p : str
-           Packed designation/number.
+        p : str or `~numpy.ndarray` of str
+           Packed designation(s)/number(s).
+
+        Notes
+        -----
+        Arrays of identifiers are processed in vectorized form; numbers
+        and designations of the form ``'1995 AA1'`` are packed using
+        lookup tables, other identifiers one by one. Results are
+        identical to those for individual identifiers.
 
         Examples
         --------
         >>> from sbpy.data import Names
         >>> Names.to_packed('1995 AA1')
         'J95A01A'
+        >>> Names.to_packed(['1995 AA1', '163693'])
+        array(['J95A01A', 'G3693'], dtype='<U7')
         """
 
+        if not isinstance(s, str):
+            return Names._to_packed_array(s)
+
         if s.isdigit() and not s.isalpha():
             # number
             s = int(s)
@@ -129,26 +271,100 @@ class Names():
                 ('{} cannot be turned into a '
                  'packed number or designation').format(s))
 
+    @staticmethod
+    def _to_packed_array(s):
+        """Vectorized `~sbpy.data.Names.to_packed`."""
+        s = asarray(s, dtype=str)
+        shape = s.shape
+        s = s.ravel()
+        codes = _char_codes(s, 10)
+        lengths = _str_len(codes)
+        inside = arange(codes.shape[1]) < lengths[:, None]
+        digit = (codes >= 48) & (codes <= 57)
+        out = zeros((len(s), 7), dtype=uint32)
+        done = zeros(len(s), dtype=bool)
+
+        # numbers
+        rows = flatnonzero((digit | ~inside).all(1) & (lengths > 0) &
+                           (lengths <= 18))
+        value = _digits_value(codes[rows], lengths[rows])
+        if (value > 619999).any():
+            raise TargetNameParseError(
+                ('{} cannot be turned into a '
+                 'packed number').format(value[value > 619999][0]))
+        out[rows, 0] = Names._pkd_codes[value // 10000]
+        for j in range(4):
+            out[rows, 4 - j] = 48 + value // 10**j % 10
+        done[rows] = True
+
+        # designations: 4-digit year, blank, 2 capital letters, up to 3
+        # digits, e.g., 1995 XA, 2007 TA418
+        capital = (codes >= 65) & (codes <= 90)
+        k = lengths - 7
+        desig = ((k >= 0) & (k <= 3) & digit[:, :4].all(1) &
+                 (codes[:, 4] == 32) & capital[:, 5:7].all(1) &
+                 (digit[:, 7:] | ~inside[:, 7:]).all(1))
+        head = (codes[:, 7].astype(int64) - 48) * 10 + codes[:, 8] - 48
+        desig &= (k < 3) | (head <= 61)
+        rows = flatnonzero(desig)
+        c = codes[rows]
+        out[rows, 0] = Names._pkd_codes[(c[:, 0] - 48) * 10 + c[:, 1] - 48]
+        out[rows, 1:3] = c[:, 2:4]
+        out[rows, 3] = c[:, 5]
+        out[rows, 6] = c[:, 6]
+        k = k[rows]
+        out[rows, 4] = 48
+        out[rows, 5] = 48
+        out[rows[k == 1], 5] = c[k == 1, 7]
+        out[rows[k == 2], 4:6] = c[k == 2, 7:9]
+        out[rows[k == 3], 4] = Names._pkd_codes[head[rows[k == 3]]]
+        out[rows[k == 3], 5] = c[k == 3, 9]
+        done[rows] = True
+
+        packed = out.view('<U7')[:, 0]
+        rows = flatnonzero(~done)
+        if len(rows) > 0:
+            other = [Names.to_packed(str(x)) for x in s[rows]]
+            packed = packed.astype('<U{}'.format(
+                max([7] + [len(x) for x in other])))
+            packed[rows] = other
+
+        return packed.reshape(shape)
+
     @staticmethod
     def from_packed(p):
         """Unpack asteroid designation/number.
 
         Parameters
         ----------
-        p : str
-           Packed target identifier.
+        p : str or array-like of str
+           Packed target identifier(s).
 
         Returns
         -------
-        s : str
-           Unpacked designation/number.
+        s : str, int, or `~numpy.ndarray`
+           Unpacked designation/number; numbers are returned as
+           integers. For arrays of identifiers, an object array of
+           strings and integers is returned.
+
+        Notes
+        -----
+        Arrays of identifiers are processed in vectorized form; packed
+        numbers and 7-character packed designations are unpacked using
+        lookup tables, other identifiers one by one. Results are
+        identical to those for individual identifiers.
 
         Examples
         --------
         >>> from sbpy.data import Names
         >>> Names.from_packed('J95A01A')
         '1995 AA1'
+        >>> Names.from_packed(['J95A01A', 'G3693'])
+        array(['1995 AA1', 163693], dtype=object)
         """
+        if not isinstance(p, str):
+            return Names._from_packed_array(p)
+
         # packed number
         if p.isdigit():
             return int(p)
@@ -185,6 +401,68 @@ class Names():
         else:
             return p
 
+    @staticmethod
+    def _from_packed_array(p):
+        """Vectorized `~sbpy.data.Names.from_packed`."""
+        p = asarray(p, dtype=str)
+        shape = p.shape
+        p = p.ravel()
+        codes = _char_codes(p, 7)
+        lengths = _str_len(codes)
+        inside = arange(codes.shape[1]) < lengths[:, None]
+        digit = (codes >= 48) & (codes <= 57)
+        find = Names._pkd_find[codes[:, :7].clip(max=127)]
+        find[codes[:, :7] > 127] = -1
+        out = empty(len(p), dtype=object)
+        done = zeros(len(p), dtype=bool)
+
+        # packed numbers
+        rows = flatnonzero((digit | ~inside).all(1) & (lengths > 0) &
+                           (lengths <= 18))
+        out[rows] = _digits_value(codes[rows], lengths[rows]).tolist()
+        done[rows] = True
+
+        # packed numbers with leading letter, e.g., A0345
+        rows = flatnonzero(_is_alpha(codes[:, 0]) & (find[:, 0] >= 0) &
+                           (digit[:, 1:] | ~inside[:, 1:]).all(1) &
+                           (lengths >= 2) & (lengths <= 17))
+        value = _digits_value(codes[rows, 1:], lengths[rows] - 1)
+        out[rows] = (find[rows, 0] * 10**(lengths[rows] - 1) +
+                     value).tolist()
+        done[rows] = True
+
+        # 7-character packed designations, e.g., K07Tf8A
+        rows = flatnonzero(
+            (lengths == 7) & _is_alpha(codes[:, 0]) & (find[:, 0] >= 0) &
+            digit[:, 1:3].all(1) & (find[:, 4] >= 0) & digit[:, 5] &
+            _is_alpha(codes[:, 6]))
+        c = codes[rows]
+        year = find[rows, 0]
+        num = find[rows, 4]
+        unpacked = zeros((len(rows), 10), dtype=uint32)
+        unpacked[:, 0] = 48 + year // 10
+        unpacked[:, 1] = 48 + year % 10
+        unpacked[:, 2:4] = c[:, 1:3]
+        unpacked[:, 4] = 32
+        unpacked[:, 5] = c[:, 3]
+        unpacked[:, 6] = c[:, 6]
+        # leading zeros of the number are dropped
+        unpacked[:, 7] = (48 + num // 10) * (num >= 10)
+        unpacked[:, 8] = 48 + num % 10
+        unpacked[:, 9] = c[:, 5]
+        unpacked[num < 10, 7:9] = unpacked[num < 10, 8:10]
+        unpacked[num < 10, 9] = 0
+        zero = (num == 0)
+        unpacked[zero, 7] = c[zero, 5] * (c[zero, 5] != 48)
+        unpacked[zero, 8] = 0
+        out[rows] = unpacked.view('<U10')[:, 0].tolist()
+        done[rows] = True
+
+        for i in flatnonzero(~done):
+            out[i] = Names.from_packed(str(p[i]))
+
+        return out.reshape(shape)
+
     @staticmethod
     def parse_comet(s):
         """Parse a string as if it were a comet name.
@@ -272,32 +550,24 @@ class Names():
 
         """
 
-        import re
-
-        # define comet matching pattern
-        pat = ('^(([1-9][0-9]*[PDCX]'
-               '(-[A-Z]{1,2})?)|[PDCX]/)'  # type/number/fragm [0,1,2]
-               '|([-]?[0-9]{3,4}[ _][A-Z]{1,2}[0-9]{0,3}(-[1-9A-Z]{0,2})?)'
-               # designation [3,4]
-               '|(([dvA-Z][a-z\']? ?[A-Z]*[a-z]*[ -]?[A-Z]?[1-9]*[a-z]*)'
-               '( [1-9A-Z]{1,2})*)'  # name [5,6]
-               )
-
-        # regex patterns that will be rejected
-        rej_pat = ('(([1-9][0-9]*[pdcxai]\b)'  # small-caps comet number
-                   '|([pdcxai]/))'  # small-caps comet type
-                   )
+        r, error = _parse_memoized('comet', s)
+        if error is not None:
+            raise TargetNameParseError(error)
+        return dict(r)
 
+    @staticmethod
+    def _parse_comet(s):
+        """`~sbpy.data.Names.parse_comet` without memoization."""
         raw = s.translate(str.maketrans('()', '  ')).strip()
 
-        # reject rej_pat patterns
-        rej = re.findall(rej_pat, raw)
+        # reject patterns
+        rej = _COMET_REJECT.findall(raw)
 
         if len(rej) > 0:
             raise TargetNameParseError('{} does not appear to be a '
                                        'comet identifier'.format(s))
 
-        m = re.findall(pat, s)
+        m = _COMET_PATTERN.findall(s)
 
         r = {}
 
@@ -307,24 +577,24 @@ class Names():
                 if len(el[0]) > 0:
                     typnumber = el[0].replace('/', '')
                     try:
-                        r['type'] = re.findall('[PDCXAI]', typnumber)[0]
+                        r['type'] = _COMET_TYPE.findall(typnumber)[0]
                     except IndexError:
                         pass
                     try:
-                        r['number'] = int(re.findall('[0-9]*', typnumber)[0])
+                        r['number'] = int(_COMET_NUMBER.findall(typnumber)[0])
                     except (IndexError, ValueError):
                         pass
                     try:
-                        r['fragment'] = re.findall('-[A-Z]{1,2}',
-                                                   typnumber)[0][1:]
+                        r['fragment'] = _COMET_FRAGMENT.findall(
+                            typnumber)[0][1:]
                     except IndexError:
                         pass
                 # designation & fragment
                 if len(el[3]) > 0:
                     r['desig'] = el[3].replace('_', ' ')
                     try:
-                        r['fragm'] = re.findall('-[A-Z]{1,2}',
-                                                r['desig'])[0][1:]
+                        r['fragm'] = _COMET_FRAGMENT.findall(
+                            r['desig'])[0][1:]
                         r['desig'] = r['desig'][:r['desig'].find('-' +
                                                                  r['fragm'])]
                     except IndexError:
@@ -417,52 +687,25 @@ class Names():
 
         """
 
-        import re
-
-        pat = ('(([1A][8-9][0-9]{2}[ _][A-Z]{2}[0-9]{0,3}|'
-               '20[0-9]{2}[ _][A-Z]{2}[0-9]{0,3})'
-               # designation [0,1]
-               '|([1-9][0-9]{3}[ _](P-L|T-[1-3])))'
-               # Palomar-Leiden  [0,2,3]
-               '|([IJKL][0-9]{2}[A-Z][0-9a-z][0-9][A-Z]'
-               '|PLS[1-9][0-9]{3}|T1S[1-9][0-9]{3}|T2S[1-9][0-9]{3}'
-               '|T3S[1-9][0-9]{3})'
-               # packed desig [4]
-               '|(^[A-Za-z][0-9]{4}| [A-Za-z][0-9]{4})'
-               # packed number [5]
-               '|([A-Z]{3,} |[A-Z]{3,}$'  # capitalized acronyms
-               '|van de [A-Z][a-z]*[ ^ 0-9]*[-]?[A-Z]?[a-z]*[^0-9] *'
-               '|de [A-Z][a-z]*[ ^ 0-9]*[-]?[A-Z]?[a-z]*[^0-9] *'
-               "|['`]?[A-Z][A-Z]*['`]?[a-z][a-z]*['`]?[^0-9]*"
-               "[ -]?[A-Z]?[a-z]*[^0-9]*)"
-               # name [6]
-               '|((^|\b)[1-9][0-9]*(\b|$| |_))'
-               # number [7,8]
-               '|^(([1-9][0-9]*A))'
-               # comet-style designations: 1A [10]
-               )
-
-        # regex patterns that will be rejected
-        rej_pat = ('([1-2][0-9]{0,3}[ _][A-Z][0-9]*(\b|$))'
-                   # comet desig
-                   '|([1-9][0-9]*[PDCXAI]\b)'
-                   # comet number
-                   '|([PDCXAI]/)'
-                   # comet type
-                   '|([1-2][0-9]{0,3}[ _][a-z]{2}[0-9]{0,3})'
-                   )
+        r, error = _parse_memoized('asteroid', s)
+        if error is not None:
+            raise TargetNameParseError(error)
+        return dict(r)
 
+    @staticmethod
+    def _parse_asteroid(s):
+        """`~sbpy.data.Names.parse_asteroid` without memoization."""
         raw = s.translate(str.maketrans('()_', '   ')).strip()
 
-        # reject rej_pat patterns
-        rej = re.findall(rej_pat, raw)
+        # reject patterns
+        rej = _ASTEROID_REJECT.findall(raw)
 
         if len(rej) > 0:
             raise TargetNameParseError('{} does not appear to be an '
                                        'asteroid identifier'.format(s))
 
         # match target patterns
-        m = re.findall(pat, raw)
+        m = _ASTEROID_PATTERN.findall(raw)
 
         r = {}
 
@@ -541,18 +784,8 @@ class Names():
         # parse_comet; the longer one is more likely to describe the
         # nature of the target, if both dictionaries have the same
         # length, the nature is ambiguous
-        ast = {}
-        com = {}
-
-        try:
-            com = Names.parse_comet(s)
-        except TargetNameParseError:
-            pass
-
-        try:
-            ast = Names.parse_asteroid(s)
-        except TargetNameParseError:
-            pass
+        com = _parse_memoized('comet', s)[0] or {}
+        ast = _parse_memoized('asteroid', s)[0] or {}
 
         if len(ast) > 0 and len(com) == 0:
             return 'asteroid'
@@ -560,3 +793,66 @@ class Names():
             return 'comet'
         else:
             raise TargetNameParseError('Target nature unclear.')
+
+    @staticmethod
+    def parse_many(strings):
+        """Parse and classify many target identifiers at once.
+
+        Parameters
+        ----------
+        strings : array-like of str
+           Target identifiers.
+
+        Returns
+        -------
+        r : `~numpy.ndarray`
+           Structured array of the same shape as ``strings`` with fields
+           ``'type'`` (``'asteroid'`` or ``'comet'``, see
+           `~sbpy.data.Names.asteroid_or_comet`; empty if the target
+           nature is unclear), ``'number'`` (0 if not available),
+           ``'desig'``, and ``'name'`` (empty if not available).
+
+        Notes
+        -----
+        Each unique identifier is parsed only once; parsing results of
+        `~sbpy.data.Names.parse_comet` and
+        `~sbpy.data.Names.parse_asteroid` are memoized for up to
+        ``sbpy.data.conf.names_cache_size`` identifiers.
+
+        Examples
+        --------
+        >>> from sbpy.data import Names
+        >>> r = Names.parse_many(['2P/Encke', '(1) Ceres', '2P/Encke'])
+        >>> print(r['type'], r['number'], r['name'])
+        ['comet' 'asteroid' 'comet'] [2 1 2] ['Encke' 'Ceres' 'Encke']
+        """
+        strings = asarray(strings, dtype=str)
+        targets, inverse = unique(strings.ravel(), return_inverse=True)
+
+        types, numbers, desigs, names = [], [], [], []
+        for s in targets.tolist():
+            com = _parse_memoized('comet', s)[0]
+            ast = _parse_memoized('asteroid', s)[0]
+            if ast and not com:
+                types.append('asteroid')
+                r = ast
+            elif com and not ast:
+                types.append('comet')
+                r = com
+            else:
+                types.append('')
+                r = {}
+            numbers.append(r.get('number', 0))
+            desigs.append(r.get('desig', ''))
+            names.append(r.get('name', ''))
+
+        r = empty(len(targets), dtype=[
+            ('type', '<U8'), ('number', int64),
+            ('desig', '<U{}'.format(max([1] + [len(d) for d in desigs]))),
+            ('name', '<U{}'.format(max([1] + [len(n) for n in names])))])
+        r['type'] = types
+        r['number'] = numbers
+        r['desig'] = desigs
+        r['name'] = names
+
+        return r[inverse].reshape(strings.shape)
@@ -9,12 +9,13 @@ Class for storing and querying observations
 created on July 3, 2019
 """
 
+from numpy import unique, argsort, bincount, cumsum
 from astropy.time import Time
 from astroquery.mpc import MPC
-from astropy.table import vstack, hstack
+from astropy.table import hstack
 
 from .ephem import Ephem
-from .core import QueryError
+from .core import QueryError, TableAccumulator
 from ..bib import cite
 
 __all__ = ['Obs']
@@ -160,49 +161,49 @@ class Obs(Ephem):
         """
 
         try:
-            targetids = set(self[id_field])
+            targetids, index = unique(self[id_field], return_inverse=True)
         except (TypeError, KeyError):
             raise QueryError('cannot use field {} as id_field.'.format(
                 id_field))
 
-        all_obs = None
-        all_eph = None
-        for targetid in targetids:
+        # group observations by target: sort once, then take slices of
+        # the sorted object, which share their data with it
+        obs_sorted = self[argsort(index, kind='mergesort')]
+        bounds = cumsum(bincount(index, minlength=len(targetids)))
 
-            if all_obs is None:
-                all_obs = self.table[self[id_field] == targetid]
-            else:
-                all_obs = vstack([all_obs,
-                                  self.table[self[id_field] == targetid]])
+        # observations in the order of the supplemented ephemerides
+        all_obs = obs_sorted.table
+
+        all_eph = TableAccumulator()
+        for i, targetid in enumerate(targetids):
+            obs = obs_sorted[(bounds[i-1] if i > 0 else 0):bounds[i]]
 
             if service == 'jplhorizons':
                 eph = Ephem.from_horizons(
                     targetid,
-                    epochs=self[self[id_field] == targetid][epoch_field],
+                    epochs=obs[epoch_field],
                     location=location,
                     **kwargs)
                 eph.table.remove_column('epoch')
             elif service == 'mpc':
                 eph = Ephem.from_mpc(
                     targetid,
-                    epochs=self[self[id_field] == targetid][epoch_field],
+                    epochs=obs[epoch_field],
                     location=location,
                     **kwargs)
                 eph.table.remove_column('Date')
             elif service == 'miriade':
                 eph = Ephem.from_miriade(
                     targetid,
-                    epochs=self[self[id_field] == targetid][epoch_field],
+                    epochs=obs[epoch_field],
                     location=location,
                     **kwargs)
                 eph.table.remove_column('epoch')
             else:
                 raise QueryError('service {} not known.'.format(service))
 
-            if all_eph is None:
-                all_eph = eph.table
-            else:
-                all_eph = vstack([all_eph, eph.table])
+            all_eph.append(eph)
+        all_eph = all_eph.to_table()
 
         # identify field names that both obs and eph have in common
         fieldnames_intersect = set(all_eph.columns).intersection(
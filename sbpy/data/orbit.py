@@ -9,9 +9,13 @@ Class for querying, manipulating, integrating, and fitting orbital elements.
 created on June 04, 2017
 """
 import os
-from numpy import array, ndarray, double, arange, rad2deg
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from numpy import (array, ndarray, double, arange, rad2deg, empty,
+                   unique, sqrt, pi, errstate, argsort, median,
+                   tile, array_split, asfortranarray, sin, cos)
 from astropy.time import Time
-from astropy.table import vstack, QTable
+from astropy.table import QTable
 from astroquery.jplhorizons import Horizons
 from astroquery.mpc import MPC
 import astropy.units as u
@@ -20,8 +24,10 @@ from warnings import warn
 from ..bib import cite
 from ..exceptions import SbpyException
 from . import conf, DataClass, QueryError, TimeScaleWarning
+from .core import TableAccumulator
+from . import twobody, orbitindex
 
-__all__ = ['Orbit', 'OrbitError', 'OpenOrbError']
+__all__ = ['Orbit', 'OrbitError', 'OpenOrbError', 'OpenOrbSession']
 
 
 class OrbitError(SbpyException):
@@ -34,6 +40,125 @@ class OpenOrbError(SbpyException):
     pass
 
 
+class OpenOrbSession():
+    """Process-wide `pyoorb` initialization.
+
+    Initializing `pyoorb` loads the planet and lunar ephemeris file,
+    which is expensive. `~sbpy.data.orbit.OpenOrbSession.init` only
+    initializes `pyoorb` if it has not been initialized in this process
+    yet or if a different ephemeris file is requested.
+
+    Attributes
+    ----------
+    ephfile : str or None
+        Ephemeris file currently loaded; ``None`` if `pyoorb` has not
+        been initialized or uses its default ephemeris file.
+    initialized : bool
+        ``True`` if `pyoorb` has been initialized in this process.
+    init_count : int
+        Number of `pyoorb` initializations in this process.
+
+    Examples
+    --------
+    >>> from sbpy.data.orbit import OpenOrbSession
+    >>> OpenOrbSession.init('de430')  # doctest: +SKIP
+    >>> OpenOrbSession.init('de430')  # doctest: +SKIP
+    >>> OpenOrbSession.init_count  # doctest: +SKIP
+    1
+    """
+
+    ephfile = None
+    initialized = False
+    init_count = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def init(cls, ephfile='de430'):
+        """Initialize `pyoorb` with ephemeris file ``ephfile``, unless
+        it is already loaded.
+
+        Parameters
+        ----------
+        ephfile : str, optional
+            Planet and Lunar ephemeris file version as provided by JPL.
+            Only used if the ``OORB_DATA`` environment variable is set;
+            otherwise, `pyoorb` uses its default ephemeris file.
+            Default: ``'de430'``
+        """
+        import pyoorb
+
+        if os.getenv('OORB_DATA') is None:
+            # oorb installed using conda
+            path = None
+        else:
+            path = os.path.join(os.getenv('OORB_DATA'), ephfile+'.dat')
+
+        with cls._lock:
+            if cls.initialized and cls.ephfile == path:
+                return
+
+            if path is None:
+                err = pyoorb.pyoorb.oorb_init()
+            else:
+                err = pyoorb.pyoorb.oorb_init(path)
+            if err:
+                cls.initialized = False
+                raise OpenOrbError(
+                    'pyoorb initialization failed with error code '
+                    '{}'.format(err))
+
+            cls.ephfile = path
+            cls.initialized = True
+            cls.init_count += 1
+
+    @classmethod
+    def reset(cls):
+        """Forget the initialization state; `pyoorb` will be
+        initialized again on the next call of
+        `~sbpy.data.orbit.OpenOrbSession.init`."""
+        with cls._lock:
+            cls.ephfile = None
+            cls.initialized = False
+
+
+def _oo_propagate_chains(orbits, chains, dynmodel, step=None):
+    """Propagate pyoorb orbit array ``orbits`` (see
+    `~sbpy.data.Orbit._to_oo`) along ``chains`` of TT MJD epochs.
+
+    Each chain starts from ``orbits``; every further epoch of a chain
+    starts from the orbits propagated to the previous epoch. ``step``
+    is called with the number of propagated orbits after each epoch.
+
+    Returns
+    -------
+    oo_orbits : `~numpy.ndarray`
+        Propagated orbits, shape (epochs, orbits, 12), epochs in the
+        order of the concatenated chains.
+    err : int
+        First non-zero pyoorb error code, or 0.
+    """
+    import pyoorb
+
+    oo_orbits = empty((sum([len(chain) for chain in chains]),) +
+                      orbits.shape, dtype=double)
+    err = 0
+    i = 0
+    for chain in chains:
+        current = orbits
+        for epoch in chain:
+            current, chain_err = pyoorb.pyoorb.oorb_propagation(
+                in_orbits=current,
+                in_epoch=[epoch, conf.oorb_timeScales['TT']],
+                in_dynmodel=dynmodel)
+            current = asfortranarray(current)
+            oo_orbits[i] = current
+            err = err or chain_err
+            i += 1
+            if step is not None:
+                step(len(orbits))
+    return oo_orbits, err
+
+
 class Orbit(DataClass):
     """Class for querying, manipulating, integrating, and fitting orbital
     elements"""
@@ -139,8 +264,8 @@ class Orbit(DataClass):
         if not isinstance(targetids, (list, ndarray, tuple)):
             targetids = [targetids]
 
-        # append elements table for each targetid
-        all_elem = None
+        # gather elements table for each targetid
+        all_elem = TableAccumulator()
         for targetid in targetids:
 
             # load elements using astroquery.jplhorizons
@@ -162,10 +287,8 @@ class Orbit(DataClass):
                 if elem[column_name].unit == '---':
                     elem[column_name].unit = None
 
-            if all_elem is None:
-                all_elem = elem
-            else:
-                all_elem = vstack([all_elem, elem])
+            all_elem.append(elem)
+        all_elem = all_elem.to_table()
 
         # turn epochs into astropy.time.Time and apply timescale
         # https://ssd.jpl.nasa.gov/?horizons_doc
@@ -256,8 +379,8 @@ class Orbit(DataClass):
                 elif 'number' in ident:
                     id_type = 'number'
 
-        # append ephemerides table for each targetid
-        all_elem = None
+        # gather elements table for each targetid
+        all_elem = TableAccumulator()
         for targetid in targetids:
 
             # get elements
@@ -295,12 +418,504 @@ class Orbit(DataClass):
                         continue
                     results[fieldname] = [val]*u.Unit(fieldunit)
 
-            if all_elem is None:
-                all_elem = QTable(results)
+            all_elem.append(QTable(results))
+
+        return cls.from_table(all_elem.to_table())
+
+    def _orbit_type(self):
+        """Identify orbit type (``'KEP'``, ``'COM'``, or ``'CART'``)
+        based on available table columns; returns ``None`` if no
+        orbit type matches."""
+        for testtype in ['KEP', 'COM', 'CART']:
+            fields = conf.oorb_orbit_fields[testtype][1:6]
+            try:
+                self._convert_columns(fields)
+                colnames = self._translate_columns(fields)
+            except KeyError:
+                continue
+            if all([col in self.table.colnames for col in colnames]):
+                return testtype
+        return None
+
+    # two-body functions
+
+    def _epoch_jd(self):
+        """Epochs as TDB Julian dates."""
+        epoch = self['epoch']
+        if isinstance(epoch, Time):
+            return epoch.tdb.jd
+        return u.Quantity(epoch, 'd').value
+
+    def _elements(self, orbittype):
+        """Orbital elements of type ``orbittype`` as arrays in au,
+        days, and radians."""
+        fields = conf.oorb_orbit_fields[orbittype][1:7]
+        units = conf.oorb_orbit_units[orbittype][1:7]
+        self._convert_columns(fields)
+        colnames = self._translate_columns(fields)
+        elements = []
+        for colname, unit in zip(colnames, units):
+            col = self.table[colname]
+            if unit is None:
+                elements.append(array(col, dtype=double))
             else:
-                all_elem = vstack([all_elem, QTable(results)])
+                elements.append(u.Quantity(col, unit, copy=False).to_value(
+                    'rad' if unit == 'deg' else unit))
+        return elements, colnames
+
+    def _state(self):
+        """Heliocentric state vectors (au, au/d) at the orbit epochs
+        derived from Keplerian, cometary, or cartesian elements."""
+        orbittype = self._orbit_type()
+        if orbittype is None:
+            raise OrbitError(
+                'orbit type cannot be determined from elements')
+        elements, colnames = self._elements(orbittype)
 
-        return cls.from_table(all_elem)
+        if orbittype == 'CART':
+            r, v = array(elements[:3]), array(elements[3:])
+        elif orbittype == 'KEP':
+            a, e, incl, Omega, w, M = elements
+            n = sqrt(twobody.GM_SUN / abs(a)**3)
+            r, v = twobody.elements_to_state(a * (1 - e), e, incl, Omega,
+                                             w, M / n)
+        else:
+            q, e, incl, Omega, w, Tp = elements
+            r, v = twobody.elements_to_state(q, e, incl, Omega, w,
+                                             self._epoch_jd() - Tp)
+
+        return r, v, orbittype, colnames
+
+    def _replace_elements(self, colnames, orbittype, elements):
+        """New `~Orbit` with element columns ``colnames`` replaced by
+        ``elements`` of type ``orbittype``; all other columns are
+        retained."""
+        fields = conf.oorb_orbit_fields[orbittype][1:7]
+        units = conf.oorb_orbit_units[orbittype][1:7]
+
+        table = QTable(meta=self.table.meta)
+        if 'targetname' in self.table.colnames:
+            table['targetname'] = self.table['targetname']
+        for field, unit, values in zip(fields, units, elements):
+            if unit is None:
+                table[field] = values
+            elif unit == 'deg':
+                table[field] = u.Quantity(values, 'rad').to('deg')
+            else:
+                table[field] = u.Quantity(values, unit)
+        for colname in self.table.colnames:
+            if colname not in table.colnames and colname not in colnames:
+                table[colname] = self.table[colname]
+        if 'orbtype' in table.colnames:
+            table['orbtype'] = [orbittype] * len(table)
+
+        return Orbit.from_table(table)
+
+    def to_cartesian(self):
+        """Two-body transformation of this orbit object to cartesian
+        elements (state vectors) at the orbit epochs.
+
+        Keplerian (``'a'``, ``'e'``, ``'i'``, ``'Omega'``, ``'w'``,
+        ``'M'``), cometary (``'q'``, ``'e'``, ``'i'``, ``'Omega'``,
+        ``'w'``, ``'Tp_jd'``), and cartesian orbits are supported;
+        elliptic, parabolic, and hyperbolic orbits are transformed
+        alike, using `~sbpy.data.twobody`. Elements are interpreted as
+        heliocentric; cometary orbits require epochs (``'epoch'``).
+        Other columns, e.g., ``'epoch'``, ``'H'``, ``'G'``, are
+        retained.
+
+        Returns
+        -------
+        `~Orbit` object
+            Positions ``'x'``, ``'y'``, ``'z'`` in au and velocities
+            ``'vx'``, ``'vy'``, ``'vz'`` in au/d.
+
+        Examples
+        --------
+        >>> from sbpy.data import Orbit
+        >>> import astropy.units as u
+        >>> orbit = Orbit.from_dict({'a': 2 * u.au, 'e': 0.1,
+        ...                          'i': 10 * u.deg, 'Omega': 0 * u.deg,
+        ...                          'w': 0 * u.deg, 'M': 0 * u.deg})
+        >>> state = orbit.to_cartesian()
+        >>> print(state['x'])  # doctest: +FLOAT_CMP
+        [1.8] AU
+        """
+        r, v, orbittype, colnames = self._state()
+        return self._replace_elements(colnames, 'CART', list(r) + list(v))
+
+    @classmethod
+    def from_cartesian(cls, orbit, orbittype='KEP'):
+        """Two-body transformation of cartesian elements (state
+        vectors) to Keplerian or cometary elements.
+
+        Parameters
+        ----------
+        orbit : `~Orbit` object
+            Heliocentric state vectors: positions ``'x'``, ``'y'``,
+            ``'z'`` (typically in au) and velocities ``'vx'``,
+            ``'vy'``, ``'vz'`` (typically in au/d). Cometary elements
+            require epochs (``'epoch'``).
+        orbittype : str, optional
+            Orbit definition to be transformed to: ``'KEP'``
+            (Keplerian elements) or ``'COM'`` (cometary elements).
+            Default: ``'KEP'``
+
+        Returns
+        -------
+        `~Orbit` object
+            Mean anomalies of elliptic orbits are in the range [0, 360)
+            deg; hyperbolic orbits have negative semi-major axes.
+            Perihelion epochs (``'Tp_jd'``) are TDB Julian dates.
+        """
+        if orbittype not in ('KEP', 'COM'):
+            raise OrbitError(
+                'orbittype must be KEP or COM, not {}'.format(orbittype))
+
+        elements, colnames = orbit._elements('CART')
+        q, e, incl, Omega, w, dt, alpha = twobody.state_to_elements(
+            array(elements[:3]), array(elements[3:]))
+
+        if orbittype == 'KEP':
+            n = sqrt(twobody.GM_SUN * abs(alpha)**3)
+            M = n * dt
+            M[alpha > 0] %= 2 * pi
+            with errstate(divide='ignore'):
+                a = 1 / alpha
+            elements = [a, e, incl, Omega, w, M]
+        else:
+            elements = [q, e, incl, Omega, w, orbit._epoch_jd() - dt]
+
+        return orbit._replace_elements(colnames, orbittype, elements)
+
+    def transform(self, orbittype):
+        """Two-body transformation of this orbit object to a different
+        orbit type definition.
+
+        This is a vectorized alternative to
+        `~sbpy.data.Orbit.oo_transform` that does not require `pyoorb`
+        or an ephemeris file. Keplerian and cometary elements are
+        converted into each other in closed form, cartesian elements
+        are handled by `~sbpy.data.Orbit.to_cartesian` and
+        `~sbpy.data.Orbit.from_cartesian`. Angles may be provided in
+        any angular unit and epochs in any time scale; perihelion
+        epochs (``'Tp_jd'``) are TDB Julian dates.
+
+        Parameters
+        ----------
+        orbittype : str
+            Orbit definition to be transformed to: ``'KEP'``
+            (Keplerian elements), ``'COM'`` (cometary elements), or
+            ``'CART'`` (cartesian elements).
+
+        Returns
+        -------
+        `~Orbit` object
+            Transformed elements in au, deg, au/d, and d; other
+            columns are retained.
+
+        Examples
+        --------
+        >>> from sbpy.data import Orbit
+        >>> from astropy.time import Time
+        >>> import astropy.units as u
+        >>> orbit = Orbit.from_dict({
+        ...     'a': 2 * u.au, 'e': 0.1, 'i': 10 * u.deg,
+        ...     'Omega': 0 * u.deg, 'w': 0 * u.deg, 'M': 0 * u.deg,
+        ...     'epoch': Time(2458000.5, format='jd', scale='tdb')})
+        >>> com = orbit.transform('COM')
+        >>> print(com['q'], com['Tp_jd'])  # doctest: +FLOAT_CMP
+        [1.8] AU [2458000.5] d
+        """
+        if orbittype not in ('KEP', 'COM', 'CART'):
+            raise OrbitError(
+                'orbittype must be KEP, COM, or CART, not {}'.format(
+                    orbittype))
+        intype = self._orbit_type()
+        if intype is None:
+            raise OrbitError(
+                'orbit type cannot be determined from elements')
+
+        if orbittype == 'CART':
+            return self.to_cartesian()
+        if intype == 'CART':
+            return Orbit.from_cartesian(self, orbittype)
+
+        elements, colnames = self._elements(intype)
+        if intype == 'KEP' and orbittype == 'COM':
+            a, e, incl, Omega, w, M = elements
+            n = sqrt(twobody.GM_SUN / abs(a)**3)
+            # nearest perihelion passage, as for cartesian elements
+            M = M.copy()
+            M[a > 0] = (M[a > 0] + pi) % (2 * pi) - pi
+            elements = [a * (1 - e), e, incl, Omega, w,
+                        self._epoch_jd() - M / n]
+        elif intype == 'COM' and orbittype == 'KEP':
+            q, e, incl, Omega, w, Tp = elements
+            with errstate(divide='ignore'):
+                a = q / (1 - e)
+            M = sqrt(twobody.GM_SUN / abs(a)**3) * (self._epoch_jd() - Tp)
+            M[a > 0] %= 2 * pi
+            elements = [a, e, incl, Omega, w, M]
+
+        return self._replace_elements(colnames, orbittype, elements)
+
+    def propagate_2body(self, epochs):
+        """Propagate this orbit object on two-body orbits.
+
+        Propagation is vectorized over all orbits and uses a
+        universal-variable Kepler solver (`~sbpy.data.twobody`) that
+        applies to elliptic, parabolic, and hyperbolic orbits alike.
+        Planetary perturbations are not considered; use
+        `~sbpy.data.Orbit.oo_propagate` for n-body propagation.
+
+        Parameters
+        ----------
+        epochs : `~astropy.time.Time` object
+            Epoch to which all orbits are propagated, or one epoch per
+            orbit.
+
+        Returns
+        -------
+        `~Orbit` object
+            Orbits of the same type (Keplerian, cometary, or cartesian)
+            as this orbit object at ``epochs``.
+
+        Examples
+        --------
+        >>> from sbpy.data import Orbit
+        >>> from astropy.time import Time
+        >>> import astropy.units as u
+        >>> orbit = Orbit.from_dict({
+        ...     'a': 2 * u.au, 'e': 0.1, 'i': 10 * u.deg,
+        ...     'Omega': 0 * u.deg, 'w': 0 * u.deg, 'M': 0 * u.deg,
+        ...     'epoch': Time(2458000.5, format='jd', scale='tdb')})
+        >>> later = orbit.propagate_2body(Time(2458100.5, format='jd',
+        ...                                    scale='tdb'))
+        >>> print(later['M'])  # doctest: +FLOAT_CMP
+        [34.8464933] deg
+        """
+        if not isinstance(epochs, Time):
+            raise OrbitError(
+                'epochs have to be provided as astropy.time.Time objects')
+        n = len(self.table)
+        if not epochs.isscalar and len(epochs) != n:
+            raise OrbitError(
+                'epochs must be a single epoch or one epoch per orbit')
+
+        dt = epochs.tdb.jd - self._epoch_jd()
+
+        orbittype = self._orbit_type()
+        if orbittype is None:
+            raise OrbitError(
+                'orbit type cannot be determined from elements')
+        elements, colnames = self._elements(orbittype)
+
+        if orbittype == 'KEP':
+            a, e, incl, Omega, w, M = elements
+            M = M + sqrt(twobody.GM_SUN / abs(a)**3) * dt
+            M[a > 0] %= 2 * pi
+            elements = [a, e, incl, Omega, w, M]
+        elif orbittype == 'CART':
+            r, v = twobody.propagate(array(elements[:3]),
+                                     array(elements[3:]), dt)
+            elements = list(r) + list(v)
+
+        orbits = self._replace_elements(colnames, orbittype, elements)
+        if epochs.isscalar:
+            epochs = Time([epochs.jd1] * n, [epochs.jd2] * n,
+                          format='jd', scale=epochs.scale)
+        orbits.table['epoch'] = epochs
+        return orbits
+
+    def _cometary(self):
+        """Perihelion distances (au), eccentricities, inclinations,
+        longitudes of the ascending node, and arguments of perihelion
+        (radians) of all orbits."""
+        orbittype = self._orbit_type()
+        if orbittype is None:
+            raise OrbitError(
+                'orbit type cannot be determined from elements')
+        elements, colnames = self._elements(orbittype)
+
+        if orbittype == 'KEP':
+            a, e = elements[:2]
+            return [a * (1 - e), e] + elements[2:5]
+        elif orbittype == 'COM':
+            return elements[:5]
+        return list(twobody.state_to_elements(array(elements[:3]),
+                                              array(elements[3:]))[:5])
+
+    def _other_cometary(self, other):
+        """Cometary elements (see `_cometary`) of a planet name or an
+        `~Orbit` object with one orbit or one orbit per orbit of this
+        object."""
+        if isinstance(other, str):
+            try:
+                a, e, incl, Omega, w = conf.planet_elements[other.lower()]
+            except KeyError:
+                raise OrbitError('unknown planet {}; available planets: '
+                                 '{}'.format(other, ', '.join(
+                                     conf.planet_elements)))
+            return [a * (1 - e), e] + list(u.Quantity(
+                [incl, Omega, w], 'deg').to_value('rad'))
+
+        if not isinstance(other, Orbit):
+            raise OrbitError(
+                'other has to be a planet name or an Orbit object')
+        if len(other.table) not in (1, len(self.table)):
+            raise OrbitError(
+                'other must contain a single orbit or one orbit per orbit')
+        return other._cometary()
+
+    def moid(self, other='earth', **kwargs):
+        """Minimum orbit intersection distance (MOID) between this
+        orbit object and another orbit or a planet.
+
+        The MOID is computed for all orbits at once, neglecting the
+        orbital motion of the apsides and nodes: distances are
+        evaluated on a coarse grid of anomalies for all pairs of
+        orbits and the smallest local minima are refined with Newton
+        iterations (`~sbpy.data.twobody.moid`). Keplerian, cometary,
+        and cartesian orbits are supported; elements are interpreted
+        as heliocentric ecliptic.
+
+        Parameters
+        ----------
+        other : str or `~Orbit` object, optional
+            Planet name (``'mercury'``, ``'venus'``, ``'earth'``,
+            ``'mars'``, ``'jupiter'``, ``'saturn'``, ``'uranus'``,
+            ``'neptune'``; mean J2000 elements from
+            ``sbpy.data.conf.planet_elements``) or an `~Orbit` object
+            with a single orbit or one orbit per orbit of this object.
+            Default: ``'earth'``
+        **kwargs
+            Additional keyword arguments are passed on to
+            `~sbpy.data.twobody.moid`, e.g., ``batch`` to control
+            memory usage.
+
+        Returns
+        -------
+        `~astropy.units.Quantity`
+            MOIDs in au, e.g., to be used as field ``'moid_earth'``.
+
+        Examples
+        --------
+        >>> from sbpy.data import Orbit
+        >>> import astropy.units as u
+        >>> orbit = Orbit.from_dict({'a': 1.5 * u.au, 'e': 0,
+        ...                          'i': 0 * u.deg, 'Omega': 0 * u.deg,
+        ...                          'w': 0 * u.deg, 'M': 0 * u.deg})
+        >>> print(orbit.moid('earth'))  # doctest: +FLOAT_CMP
+        [0.48328612] AU
+        """
+        return u.Quantity(twobody.moid(
+            self._cometary(), self._other_cometary(other), **kwargs), 'au')
+
+    def tisserand(self, planet='jupiter'):
+        """Tisserand parameter with respect to a planet.
+
+        ``T = a_p / a + 2 cos(i) sqrt(a (1 - e**2) / a_p)``, where
+        ``a_p`` is the semi-major axis of the planet and ``i`` is the
+        inclination of the orbit relative to the orbital plane of the
+        planet. Keplerian, cometary, and cartesian orbits are
+        supported, including parabolic and hyperbolic orbits.
+
+        Parameters
+        ----------
+        planet : str or `~Orbit` object, optional
+            Planet name (see `~sbpy.data.Orbit.moid`) or an `~Orbit`
+            object with a single orbit or one orbit per orbit of this
+            object. Default: ``'jupiter'``
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            Tisserand parameters, e.g., to be used as field ``'Tj'``.
+
+        Examples
+        --------
+        >>> from sbpy.data import Orbit
+        >>> import astropy.units as u
+        >>> orbit = Orbit.from_dict({'a': 3.2 * u.au, 'e': 0.6,
+        ...                          'i': 10 * u.deg, 'Omega': 100 * u.deg,
+        ...                          'w': 0 * u.deg, 'M': 0 * u.deg})
+        >>> print(orbit.tisserand())  # doctest: +FLOAT_CMP
+        [2.86627375]
+        """
+        q, e, incl, Omega, w = self._cometary()
+        qp, ep, inclp, Omegap, wp = self._other_cometary(planet)
+        ap = qp / (1 - ep)
+
+        # inclination relative to the orbital plane of the planet
+        cosi = (sin(incl) * sin(inclp) * cos(Omega - Omegap) +
+                cos(incl) * cos(inclp))
+        return ap * (1 - e) / q + 2 * cosi * sqrt(q * (1 + e) / ap)
+
+    def similar_to(self, ref, dmax, criterion='SH', index=None):
+        """Orbits of this orbit object that are similar to a reference
+        orbit.
+
+        Similarity is measured with the D-criteria of Southworth &
+        Hawkins (1963; `~sbpy.data.orbitindex.southworth_hawkins`) or
+        Drummond (1981; `~sbpy.data.orbitindex.drummond`), which are
+        computed for all orbits at once. For many searches in the same
+        orbits, or for all pairs of similar orbits, use an
+        `~sbpy.data.OrbitIndex`.
+
+        Parameters
+        ----------
+        ref : `~Orbit` object
+            Single reference orbit.
+        dmax : float
+            Largest D-criterion of similar orbits.
+        criterion : str, optional
+            ``'SH'`` (Southworth & Hawkins) or ``'D'`` (Drummond).
+            Default: ``'SH'``
+        index : `~sbpy.data.OrbitIndex`, optional
+            Index of this orbit object to be used for the search;
+            ``criterion`` is then ignored.
+
+        Returns
+        -------
+        `~Orbit` object
+            Similar orbits in order of increasing D-criterion, which is
+            provided in field ``'D_SH'`` or ``'D_D'``.
+
+        Examples
+        --------
+        >>> from sbpy.data import Orbit
+        >>> import astropy.units as u
+        >>> orbit = Orbit.from_dict({'targetname': ['a', 'b', 'c'],
+        ...                          'a': [2.2, 2.21, 3] * u.au,
+        ...                          'e': [0.1, 0.11, 0.2],
+        ...                          'i': [5, 5.2, 10] * u.deg,
+        ...                          'Omega': [30, 31, 200] * u.deg,
+        ...                          'w': [40, 40, 0] * u.deg,
+        ...                          'M': [0, 10, 20] * u.deg})
+        >>> similar = orbit.similar_to(orbit[0], 0.1)
+        >>> print(list(similar['targetname']))
+        ['a', 'b']
+        """
+        if len(ref.table) != 1:
+            raise OrbitError('ref must contain a single orbit')
+
+        if index is not None:
+            criterion = index.criterion
+            iref, i, D = index.similar_to(ref, dmax)
+        else:
+            if criterion not in orbitindex.OrbitIndex.criteria:
+                raise ValueError('criterion must be one of {}, not {}'.format(
+                    ', '.join(orbitindex.OrbitIndex.criteria), criterion))
+            D = orbitindex.OrbitIndex.criteria[criterion](
+                self._cometary(), ref._cometary())
+            i = (D <= dmax).nonzero()[0]
+            i = i[argsort(D[i], kind='stable')]
+            D = D[i]
+
+        similar = Orbit.from_table(self.table[i])
+        similar.table['D_' + criterion] = D
+        return similar
 
     # functions using pyoorb
 
@@ -313,26 +928,36 @@ class Orbit(DataClass):
           time scales that are compatible with `pyoorb`. If epochs are
           not provided appropriately, they will be adjusted and a
           `TimeScaleWarning` will be raised.
+        * Orbit types may differ between rows if an ``orbtype`` field
+          (``'KEP'``, ``'COM'``, ``'CART'`` or the corresponding
+          `pyoorb` codes) is present.
+        * Time scales may differ between rows if an ``epoch_scale``
+          field (``'UTC'``, ``'UT1'``, ``'TT'``, ``'TAI'`` or the
+          corresponding `pyoorb` codes) is present; epochs are then
+          provided to `pyoorb` in the time scale of the respective row.
         """
 
-        # identify orbit type based on available table columns
+        n = len(self.table)
+
+        # identify orbit type(s) based on available table columns
         if 'orbtype' in self.field_names:
-            orbittype = self.table['orbtype'][0]
+            codes, rowtype = unique(array(self.table['orbtype']),
+                                    return_inverse=True)
+            elemtypes = {v: k for k, v in conf.oorb_elemType.items()}
+            orbittypes = []
+            for code in codes:
+                if isinstance(code, str):
+                    orbittypes.append(code.upper())
+                else:
+                    orbittypes.append(elemtypes.get(int(code)))
         else:
-            orbittype = None
-
-            for testtype in ['KEP', 'COM', 'CART']:
-                try:
-                    for field in conf.oorb_orbit_fields[testtype][1:6]:
-                        self.__getitem__(field)
-                    orbittype = testtype
-                    break
-                except KeyError:
-                    pass
+            orbittypes = [self._orbit_type()]
+            rowtype = None
 
-        if orbittype is None:
-            raise OrbitError(
-                'orbit type cannot be determined from elements')
+        for orbittype in orbittypes:
+            if orbittype not in ('KEP', 'COM', 'CART'):
+                raise OrbitError(
+                    'orbit type cannot be determined from elements')
 
         # implant ``targetname`` field information, if not available
         if 'targetname' not in self.field_names:
@@ -340,73 +965,73 @@ class Orbit(DataClass):
                                         range(len(self.table))]
 
         # check that epochs are astropy.time.Time
-        if not isinstance(self['epoch'][0], Time):
+        epoch = self['epoch']
+        if not isinstance(epoch, Time):
             raise OrbitError(
                 'epochs have to be provided as astropy.time.Time objects')
 
-        # check that pyoorb can deal with time scale
-        if self['epoch'][0].scale.upper() not in ('UTC', 'UT1', 'TT', 'TAI'):
-            warn(('epochs time scale is {} which is incompatible with '
-                  'pyoorb; converting time scale to TT.').format(
-                self['epoch'][0].scale.upper()))
-            self['epoch'] = self['epoch'].tt
-
-        # assemble orbit array for oorb_ephemeris
-        if orbittype == 'COM':
-            # cometary orbit: id q e i node argperi t_p otype epoch t H G
-            orbits = array(array([arange(0, len(self.table), 1),
-                                  self['q'].to('au').value,
-                                  self['e'].data,
-                                  self['i'].to('radian').value,
-                                  self['Omega'].to('radian').value,
-                                  self['w'].to('radian').value,
-                                  (self['Tp_jd'].to('d').value -
-                                   2400000.5),
-                                  [conf.oorb_elemType[orbittype]] *
-                                  len(self.table),
-                                  self['epoch'].mjd,
-                                  ([conf.oorb_timeScales
-                                    [self['epoch'][0].scale.upper()]] *
-                                   len(self.table)),
-                                  self['H'].value,
-                                  self['G'].data]).transpose(),
-                           dtype=double, order='F')
-        elif orbittype == 'KEP':
-            # keplerian orbit: id a e i node argperi M otype epoch ttype H G
-            orbits = array(array([arange(0, len(self.table), 1),
-                                  self['a'].to('au').value,
-                                  self['e'].data,
-                                  self['incl'].to('radian').value,
-                                  self['Omega'].to('radian').value,
-                                  self['w'].to('radian').value,
-                                  self['M'].to('radian').value,
-                                  [conf.oorb_elemType[orbittype]] *
-                                  len(self.table),
-                                  self['epoch'].mjd,
-                                  ([conf.oorb_timeScales
-                                    [self['epoch'][0].scale.upper()]] *
-                                   len(self.table)),
-                                  self['H'].value,
-                                  self['G'].data]).transpose(),
-                           dtype=double, order='F')
-        elif orbittype == 'CART':
-            # cartesian orbit: id x y z dx dy dz otype epoch ttype H G
-            orbits = array(array([arange(0, len(self.table), 1),
-                                  self['x'].to('au').value,
-                                  self['y'].to('au').value,
-                                  self['z'].to('au').value,
-                                  self['dx'].to('au/d').value,
-                                  self['dy'].to('au/d').value,
-                                  self['dz'].to('au/d').value,
-                                  [conf.oorb_elemType[orbittype]] *
-                                  len(self.table),
-                                  self['epoch'].mjd,
-                                  ([conf.oorb_timeScales
-                                    [self['epoch'][0].scale.upper()]] *
-                                   len(self.table)),
-                                  self['H'].data,
-                                  self['G'].data]).transpose(),
-                           dtype=double, order='F')
+        # identify time scale(s)
+        if 'epoch_scale' in self.field_names:
+            codes, rowscale = unique(array(self.table['epoch_scale']),
+                                     return_inverse=True)
+            timescales = {v: k for k, v in conf.oorb_timeScales.items()}
+            scales = []
+            for code in codes:
+                scale = (code.upper() if isinstance(code, str)
+                         else timescales.get(int(code)))
+                if scale not in conf.oorb_timeScales:
+                    raise OrbitError(
+                        'epoch_scale {} is incompatible with pyoorb'.format(
+                            code))
+                scales.append(scale)
+        else:
+            # check that pyoorb can deal with time scale
+            if epoch.scale.upper() not in conf.oorb_timeScales:
+                warn(('epochs time scale is {} which is incompatible with '
+                      'pyoorb; converting time scale to TT.').format(
+                    epoch.scale.upper()))
+                self['epoch'] = self['epoch'].tt
+                epoch = self['epoch']
+            scales = [epoch.scale.upper()]
+            rowscale = None
+
+        # assemble orbit array for oorb_ephemeris, columns:
+        # id el1 el2 el3 el4 el5 el6 otype epoch ttype H G
+        # (angles in radians, perihelion epochs as MJD)
+        orbits = empty((n, 12), dtype=double, order='F')
+        orbits[:, 0] = arange(n)
+
+        for i, orbittype in enumerate(orbittypes):
+            rows = slice(None) if rowtype is None else (rowtype == i)
+            fields = conf.oorb_orbit_fields[orbittype][1:7]
+            units = conf.oorb_orbit_units[orbittype][1:7]
+            self._convert_columns(fields)
+            colnames = self._translate_columns(fields)
+            for j, (colname, unit) in enumerate(zip(colnames, units)):
+                col = self.table[colname]
+                if unit is None:
+                    orbits[rows, j + 1] = col[rows]
+                else:
+                    orbits[rows, j + 1] = u.Quantity(
+                        col, unit, copy=False).to_value(
+                            'rad' if unit == 'deg' else unit)[rows]
+            if orbittype == 'COM':
+                orbits[rows, 6] -= 2400000.5
+            orbits[rows, 7] = conf.oorb_elemType[orbittype]
+
+        if rowscale is None:
+            orbits[:, 8] = epoch.mjd
+            orbits[:, 9] = conf.oorb_timeScales[scales[0]]
+        else:
+            for i, scale in enumerate(scales):
+                rows = rowscale == i
+                orbits[rows, 8] = getattr(epoch[rows], scale.lower()).mjd
+                orbits[rows, 9] = conf.oorb_timeScales[scale]
+
+        H, G = self._translate_columns(['H', 'G'])
+        orbits[:, 10] = u.Quantity(self.table[H], 'mag',
+                                   copy=False).to_value('mag')
+        orbits[:, 11] = self.table[G]
 
         return orbits
 
@@ -473,13 +1098,7 @@ class Orbit(DataClass):
         """
         import pyoorb
 
-        # initialize pyoorb
-        if os.getenv('OORB_DATA') is None:
-            # oorb installed using conda
-            pyoorb.pyoorb.oorb_init()
-        else:
-            ephfile = os.path.join(os.getenv('OORB_DATA'), ephfile+'.dat')
-            pyoorb.pyoorb.oorb_init(ephfile)
+        OpenOrbSession.init(ephfile)
 
         # extract time scale
         timescale = self.table['epoch'][0].scale.upper()
@@ -508,7 +1127,8 @@ class Orbit(DataClass):
                              'DEL': 4, 'EQX': 5}[orbittype])
 
         if err != 0:
-            OpenOrbError('pyoorb failed with error code {:d}'.format(err))
+            raise OpenOrbError(
+                'pyoorb failed with error code {:d}'.format(err))
 
         # reorder data in Orbit object
         field_names = conf.oorb_orbit_fields[orbittype]
@@ -607,28 +1227,146 @@ class Orbit(DataClass):
 
         import pyoorb
 
-        # initialize pyoorb
-        if os.getenv('OORB_DATA') is None:
-            # oorb installed using conda
-            pyoorb.pyoorb.oorb_init()
+        OpenOrbSession.init(ephfile)
+
+        orbittype, oo_orbits = self._oo_input()
+
+        oo_orbits, err = pyoorb.pyoorb.oorb_propagation(
+            in_orbits=oo_orbits,
+            in_epoch=[epochs.tt.mjd, conf.oorb_timeScales['TT']],
+            in_dynmodel=dynmodel)
+
+        if err != 0:
+            raise OpenOrbError(
+                'pyoorb failed with error code {:d}'.format(err))
+
+        return self._from_oo(oo_orbits, orbittype, epochs.scale)
+
+    @cite({'method': '2009M&PS...44.1853G',
+           'software': 'https://github.com/oorb/oorb'})
+    def oo_propagate_many(self, epochs, dynmodel='N', ephfile='de430',
+                          workers=1, progress=None):
+        """Uses pyoorb to propagate this `~Orbit` object to multiple
+        epochs. Required fields are the same as for
+        `~sbpy.data.Orbit.oo_propagate`.
+
+        The pyoorb orbit array is derived once. Epochs are propagated
+        to in chronological order, starting from the median epoch of
+        the orbits in both directions, and each propagation starts from
+        the orbits propagated to the previous epoch, so that every orbit
+        is integrated only once over the full range of epochs.
+
+        Parameters
+        ----------
+        epochs : `~astropy.time.Time` object
+            Epochs to which the orbits will be propagated. The
+            resulting `~sbpy.data.Orbit` object will have the same time
+            scale as ``epochs``.
+        dynmodel : str, optional
+            The dynamical model to be used in the propagation: ``'N'``
+            for n-body simulation or ``'2'`` for a 2-body
+            simulation. Default: ``'N'``
+        ephfile : str, optional
+            Planet and Lunar ephemeris file version as provided by JPL
+            to be used in the propagation. Default: ``'de430'``
+        workers : int, optional
+            Number of processes used for the propagation. If larger
+            than 1, orbits are split into shards that are propagated in
+            parallel, each process initializing pyoorb once; the results
+            are identical to and in the same order as those of a single
+            process. Default: 1
+        progress : callable, optional
+            Function called with the number of completed and the total
+            number of orbit propagations, ``progress(done, total)``,
+            after each epoch (or after each shard if ``workers`` is
+            larger than 1). Default: ``None``
+
+        Returns
+        -------
+        `~Orbit` object
+            Rows are ordered by epoch (in the order of ``epochs``), then
+            orbit; ``orbits[i * len(self):(i + 1) * len(self)]`` are the
+            orbits propagated to ``epochs[i]``.
+
+        Examples
+        --------
+        Propagate the orbits of Ceres and Pallas to the beginning of
+        each year from 2000 to 2030:
+
+        >>> from sbpy.data import Orbit
+        >>> from astropy.time import Time
+        >>> epochs = Time(['{}-01-01'.format(year)
+        ...                for year in range(2000, 2031)])
+        >>> elem = Orbit.from_horizons(['Ceres', 'Pallas'])  # doctest: +REMOTE_DATA
+        >>> newelem = elem.oo_propagate_many(epochs, workers=2)  # doctest: +SKIP
+        >>> newelem[2 * 10:2 * 11]  # orbits at 2010-01-01  # doctest: +SKIP
+        """
+
+        if epochs.isscalar:
+            epochs = epochs.reshape((1,))
+        m = len(epochs)
+
+        orbittype, oo_orbits = self._oo_input()
+        n = len(oo_orbits)
+
+        # chains of epochs from the median orbit epoch backward and
+        # forward in time
+        t = epochs.tt.mjd
+        t0 = median(oo_orbits[:, 8])
+        order = argsort(t, kind='mergesort')
+        backward = [i for i in order[::-1] if t[i] < t0]
+        forward = [i for i in order if t[i] >= t0]
+        chain_order = array(backward + forward, dtype=int)
+        chains = [list(t[backward]), list(t[forward])]
+
+        total = n * m
+        if workers > 1 and n > 1:
+            shards = array_split(arange(n), min(n, workers * 4))
+            propagated = empty((m, n, 12), dtype=double)
+            err = 0
+            done = 0
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=OpenOrbSession.init,
+                                     initargs=(ephfile,)) as executor:
+                results = executor.map(
+                    _oo_propagate_chains,
+                    [asfortranarray(oo_orbits[shard]) for shard in shards],
+                    [chains] * len(shards), [dynmodel] * len(shards))
+                for shard, (shard_orbits, shard_err) in zip(shards,
+                                                           results):
+                    propagated[:, shard[0]:shard[-1] + 1] = shard_orbits
+                    err = err or shard_err
+                    done += len(shard) * m
+                    if progress is not None:
+                        progress(done, total)
         else:
-            ephfile = os.path.join(os.getenv('OORB_DATA'), ephfile+'.dat')
-            pyoorb.pyoorb.oorb_init(ephfile)
+            OpenOrbSession.init(ephfile)
+            done = [0]
 
-        # extract time scale
-        timescale = epochs.scale.upper()
+            def step(count):
+                done[0] += count
+                progress(done[0], total)
 
-        # identify orbit type based on available table columns
-        orbittype = None
-        for testtype in ['KEP', 'COM', 'CART']:
-            try:
-                self._translate_columns(
-                    conf.oorb_orbit_fields[testtype][1:6])
-                orbittype = testtype
-                break
-            except KeyError:
-                pass
+            propagated, err = _oo_propagate_chains(
+                oo_orbits, chains, dynmodel,
+                step=None if progress is None else step)
 
+        if err != 0:
+            raise OpenOrbError(
+                'pyoorb failed with error code {:d}'.format(err))
+
+        # restore the order of epochs
+        oo_propagated = empty((m, n, 12), dtype=double)
+        oo_propagated[chain_order] = propagated
+
+        return self._from_oo(oo_propagated, orbittype, epochs.scale)
+
+    def _oo_input(self):
+        """Orbit type and pyoorb orbit array (see `_to_oo`) of this
+        orbit object with epochs in TT; default units are applied to
+        element columns without units."""
+
+        orbittype = self._orbit_type()
         if orbittype is None:
             raise OrbitError(
                 'orbit type cannot be determined from elements')
@@ -647,44 +1385,48 @@ class Orbit(DataClass):
                                (u.Quantity, u.CompositeUnit))):
                 self[colname].unit = default_units[colname]
 
-        ooepoch = [epochs.tt.mjd, conf.oorb_timeScales['TT']]
-
-        # convert epochs to TT and MJD
+        # convert epochs to TT
         in_orbits = Orbit.from_table(self.table)
         in_orbits['epoch'] = in_orbits['epoch'].tt
 
-        oo_orbits, err = pyoorb.pyoorb.oorb_propagation(
-            in_orbits=in_orbits._to_oo(),
-            in_epoch=ooepoch,
-            in_dynmodel=dynmodel)
+        return orbittype, in_orbits._to_oo()
 
-        if err != 0:
-            OpenOrbError('pyoorb failed with error code {:d}'.format(err))
+    def _from_oo(self, oo_orbits, orbittype, timescale):
+        """`~Orbit` object from pyoorb orbit array ``oo_orbits`` of type
+        ``orbittype`` with shape (orbits, 12) or (epochs, orbits, 12);
+        rows are ordered by epoch, then orbit. Epochs are provided as
+        Julian dates in time scale ``timescale``."""
 
-        # reorder data in Orbit object
+        oo_orbits = oo_orbits.reshape(-1, 12)
+        n = len(self.table)
         field_names = conf.oorb_orbit_fields[orbittype]
 
         columns = []
-        for i, col in enumerate(oo_orbits.transpose()):
-            columns.append(Orbit._unit_apply(
-                col, conf.oorb_orbit_units[orbittype][i]))
+        for i, unit in enumerate(conf.oorb_orbit_units[orbittype]):
+            col = oo_orbits[:, i]
+            if unit == 'deg':
+                # convert from radians to degrees
+                col = rad2deg(col)
+            elif orbittype == 'COM' and i == 6:
+                # perihelion epochs from MJD to JD
+                col = col + 2400000.5
+            columns.append(Orbit._unit_apply(col, unit))
         orbits = self.from_columns(columns, names=field_names)
 
-        for i, col in enumerate(orbits.field_names):
-            # convert from radians to degrees where unit == deg
-            if conf.oorb_orbit_units[orbittype][i] == 'deg':
-                orbits._table[col] = rad2deg(orbits[col])
-
         # replace id column with actual target names from original orbits
-        orbits.table.replace_column('id', self.table['targetname'])
+        if 'targetname' in self.field_names:
+            targetname = array(self.table['targetname'])
+        else:
+            targetname = array(['orbit_' + str(i) for i in range(n)])
+        orbits.table.replace_column(
+            'id', tile(targetname, len(oo_orbits) // n))
 
         orbits.meta['orbit_type'] = orbittype
-        orbits.table.remove_column('epoch_scale'),
+        orbits.table.remove_column('epoch_scale')
 
         # adjust epochs to standard jd
         orbits.table['epoch'] = Time(
-            Time(orbits.table['epoch'], format='mjd',
-                 scale='tt').__getattr__(timescale.lower()),
-            format='jd')
+            getattr(Time(orbits.table['epoch'], format='mjd', scale='tt'),
+                    timescale.lower()), format='jd')
 
         return orbits
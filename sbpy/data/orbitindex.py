@@ -0,0 +1,251 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+===========================
+sbpy data.OrbitIndex Module
+===========================
+
+Orbital similarity criteria and a spatial index for similarity searches
+in orbit catalogs
+
+Orbital elements are provided as sequences of cometary elements ``(q, e,
+incl, Omega, w)`` with perihelion distances in au and angles in
+radians; all functions broadcast over arrays of orbits.
+
+created on October 16, 2026
+"""
+
+import numpy as np
+
+try:
+    import scipy
+    from scipy.spatial import cKDTree
+except ImportError:
+    scipy = None
+
+from ..exceptions import RequiredPackageUnavailable
+from .twobody import _perifocal_axes
+
+__all__ = ['OrbitIndex', 'southworth_hawkins', 'drummond']
+
+
+def _pole(incl, Omega):
+    """Unit vectors normal to the orbital planes."""
+    si = np.sin(incl)
+    return np.array([si * np.sin(Omega), -si * np.cos(Omega),
+                     np.cos(incl)])
+
+
+def _chord(x1, x2):
+    """Euclidean distance between vectors of shape (3, ...)."""
+    return np.sqrt(np.sum((x1 - x2)**2, 0))
+
+
+def _broadcast(elements1, elements2):
+    """Elements of both orbits as float arrays of the same shape."""
+    return np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in
+                                 tuple(elements1) + tuple(elements2)])
+
+
+def southworth_hawkins(elements1, elements2):
+    """Southworth & Hawkins (1963) orbital similarity criterion D_SH.
+
+    ``D_SH**2 = (e2 - e1)**2 + (q2 - q1)**2 + (2 sin(I21 / 2))**2
+    + ((e1 + e2) / 2 * 2 sin(Pi21 / 2))**2``, where ``I21`` is the angle
+    between the orbital planes and ``Pi21`` the difference between the
+    longitudes of perihelion measured from the intersection of the
+    orbital planes.
+
+    Parameters
+    ----------
+    elements1, elements2 : sequence of array-like
+        Cometary elements ``(q, e, incl, Omega, w)`` of the orbits to be
+        compared, broadcast against each other.
+
+    Returns
+    -------
+    D : `~numpy.ndarray`
+    """
+    q1, e1, i1, O1, w1, q2, e2, i2, O2, w2 = _broadcast(elements1,
+                                                        elements2)
+
+    # chord between the orbit poles: 2 sin(I21 / 2)
+    chord = _chord(_pole(i1, O1), _pole(i2, O2))
+    dO = (O2 - O1 + np.pi) % (2 * np.pi) - np.pi
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.cos((i2 + i1) / 2) * np.sin(dO / 2) / np.sqrt(
+            1 - (chord / 2)**2)
+    Pi = w2 - w1 + 2 * np.arcsin(np.clip(np.nan_to_num(x), -1, 1))
+
+    return np.sqrt((e2 - e1)**2 + (q2 - q1)**2 + chord**2 +
+                   ((e1 + e2) * np.sin(Pi / 2))**2)
+
+
+def drummond(elements1, elements2):
+    """Drummond (1981) orbital similarity criterion D_D.
+
+    ``D_D**2 = ((e2 - e1) / (e2 + e1))**2 + ((q2 - q1) / (q2 + q1))**2
+    + (I21 / pi)**2 + ((e1 + e2) / 2 * theta21 / pi)**2``, where ``I21``
+    is the angle between the orbital planes and ``theta21`` the angle
+    between the directions of perihelion.
+
+    Parameters
+    ----------
+    elements1, elements2 : sequence of array-like
+        Cometary elements ``(q, e, incl, Omega, w)`` of the orbits to be
+        compared, broadcast against each other.
+
+    Returns
+    -------
+    D : `~numpy.ndarray`
+    """
+    q1, e1, i1, O1, w1, q2, e2, i2, O2, w2 = _broadcast(elements1,
+                                                        elements2)
+
+    I21 = 2 * np.arcsin(np.clip(_chord(_pole(i1, O1), _pole(i2, O2)) / 2,
+                                0, 1))
+    theta21 = 2 * np.arcsin(np.clip(_chord(_perifocal_axes(i1, O1, w1)[0],
+                                           _perifocal_axes(i2, O2, w2)[0])
+                                    / 2, 0, 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        de = np.where(e1 + e2 > 0, (e2 - e1) / (e2 + e1), 0)
+
+    return np.sqrt(de**2 + ((q2 - q1) / (q2 + q1))**2 + (I21 / np.pi)**2 +
+                   ((e1 + e2) / 2 * theta21 / np.pi)**2)
+
+
+class OrbitIndex():
+    """Spatial index for orbital similarity searches.
+
+    Orbits are embedded in a low-dimensional Euclidean space in which
+    the distance between two orbits is a lower bound of their
+    D-criterion (or of a monotonic function of it), and indexed with a
+    k-d tree (`scipy.spatial.cKDTree`). Searches for similar orbits
+    only compute D-criteria for the candidate pairs found in the tree
+    and scale sub-quadratically with the number of orbits.
+
+    Requires `scipy`.
+
+    Parameters
+    ----------
+    orbit : `~sbpy.data.Orbit` object
+        Keplerian, cometary, or cartesian orbits to be indexed;
+        elements are interpreted as heliocentric ecliptic.
+    criterion : str, optional
+        D-criterion: ``'SH'`` (`southworth_hawkins`) or ``'D'``
+        (`drummond`). Default: ``'SH'``
+    leafsize : int, optional
+        Leaf size of the k-d tree.
+
+    Examples
+    --------
+    >>> from sbpy.data import Orbit, OrbitIndex
+    >>> import astropy.units as u
+    >>> orbit = Orbit.from_dict({'a': [2.2, 2.21, 3] * u.au,
+    ...                          'e': [0.1, 0.11, 0.2],
+    ...                          'i': [5, 5.2, 10] * u.deg,
+    ...                          'Omega': [30, 31, 200] * u.deg,
+    ...                          'w': [40, 40, 0] * u.deg,
+    ...                          'M': [0, 10, 20] * u.deg})
+    >>> index = OrbitIndex(orbit)  # doctest: +SKIP
+    >>> i, j, D = index.pairs(0.1)  # doctest: +SKIP
+    >>> print(i, j)  # doctest: +SKIP
+    [0] [1]
+    """
+
+    criteria = {'SH': southworth_hawkins, 'D': drummond}
+
+    def __init__(self, orbit, criterion='SH', leafsize=16):
+        if scipy is None:
+            raise RequiredPackageUnavailable('scipy')
+        if criterion not in self.criteria:
+            raise ValueError('criterion must be one of {}, not {}'.format(
+                ', '.join(self.criteria), criterion))
+
+        self.criterion = criterion
+        self.elements = [np.atleast_1d(x) for x in orbit._cometary()]
+        self._tree = cKDTree(self._embed(self.elements).T,
+                             leafsize=leafsize)
+
+    def __len__(self):
+        return len(self.elements[0])
+
+    def _embed(self, elements):
+        """Embedding of cometary ``elements``, shape (dimensions,
+        orbits)."""
+        q, e, incl, Omega = elements[:4]
+        pole = _pole(incl, Omega)
+        if self.criterion == 'SH':
+            # Euclidean distances are the first three terms of D_SH
+            return np.vstack((q, e, pole))
+        # |log(q2 / q1)| / 2 = artanh(|q2 - q1| / (q2 + q1)) and the
+        # chord between the poles is smaller than the angle between them
+        return np.vstack((np.log(q) / 2, pole / np.pi))
+
+    def _radius(self, dmax):
+        """Search radius in the embedding for criterion ``dmax``."""
+        if self.criterion == 'SH':
+            return dmax
+        # all terms are at most dmax; artanh(t) / t is increasing
+        return np.arctanh(dmax) if dmax < 1 else np.inf
+
+    def distance(self, i, j):
+        """D-criteria between indexed orbits ``i`` and ``j``."""
+        return self.criteria[self.criterion](
+            [x[i] for x in self.elements], [x[j] for x in self.elements])
+
+    def similar_to(self, ref, dmax):
+        """Indexed orbits similar to reference orbits.
+
+        Parameters
+        ----------
+        ref : `~sbpy.data.Orbit` object
+            Reference orbits.
+        dmax : float
+            Largest D-criterion of similar orbits.
+
+        Returns
+        -------
+        iref, i : `~numpy.ndarray`
+            Indices of reference and similar indexed orbits, sorted by
+            reference orbit and D-criterion.
+        D : `~numpy.ndarray`
+            D-criteria.
+        """
+        elements = [np.atleast_1d(x) for x in ref._cometary()]
+        candidates = self._tree.query_ball_point(
+            self._embed(elements).T, self._radius(dmax))
+        iref = np.repeat(np.arange(len(candidates)),
+                         [len(c) for c in candidates])
+        i = np.array(np.concatenate(candidates), dtype=int)
+
+        D = self.criteria[self.criterion](
+            [x[iref] for x in elements], [x[i] for x in self.elements])
+        similar = D <= dmax
+        iref, i, D = iref[similar], i[similar], D[similar]
+        order = np.lexsort((D, iref))
+        return iref[order], i[order], D[order]
+
+    def pairs(self, dmax):
+        """All pairs of similar indexed orbits.
+
+        Parameters
+        ----------
+        dmax : float
+            Largest D-criterion of similar orbits.
+
+        Returns
+        -------
+        i, j : `~numpy.ndarray`
+            Indices of the orbits of each pair, ``i < j``, sorted by
+            ``i`` and ``j``.
+        D : `~numpy.ndarray`
+            D-criteria.
+        """
+        candidates = self._tree.query_pairs(self._radius(dmax),
+                                            output_type='ndarray')
+        i, j = np.sort(candidates, 1).T
+        D = self.distance(i, j)
+        similar = D <= dmax
+        i, j, D = i[similar], j[similar], D[similar]
+        order = np.lexsort((j, i))
+        return i[order], j[order], D[order]
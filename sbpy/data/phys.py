@@ -9,18 +9,24 @@ Class for storing and querying physical properties
 created on June 04, 2017
 """
 
+import re
+import threading
 from collections import OrderedDict
 
-from numpy import ndarray, array, isnan, nan, interp, log, exp
+from numpy import (ndarray, array, isnan, nan, interp, log, exp, absolute,
+                   lexsort, unique, searchsorted, append, full)
 import astropy.units as u
+from astropy.io import ascii
+from astropy.table import Table, vstack
 from astroquery.jplsbdb import SBDB
 from astroquery.jplspec import JPLSpec
 
 from .core import DataClass
+from .querycache import fetch_all
 from ..bib import cite
 from ..exceptions import SbpyException
 
-__all__ = ['Phys']
+__all__ = ['Phys', 'JPLSpecCatalog']
 
 
 class JPLSpecQueryFailed(SbpyException):
@@ -29,12 +35,197 @@ class JPLSpecQueryFailed(SbpyException):
     '''
 
 
+class JPLSpecCatalog():
+    """Local index of the `JPL Molecular Spectroscopy Catalog
+    <https://spec.jpl.nasa.gov/home.html>`_.
+
+    Spectral lines are grouped by species tag and sorted by frequency,
+    so that line lookups are binary searches and do not require
+    remote queries.
+
+    Parameters
+    ----------
+    lines : `~astropy.table.Table`
+        Spectral lines with at least the columns ``FREQ`` (MHz),
+        ``LGINT``, ``DR``, ``ELO``, ``GUP``, and ``TAG``, e.g., as
+        returned by `~astroquery.jplspec.JPLSpec.query_lines`. Negative
+        tags (laboratory measurements) are treated as their absolute
+        values.
+
+    Examples
+    --------
+    >>> from sbpy.data import JPLSpecCatalog, Phys
+    >>> import astropy.units as u
+    >>> cat = JPLSpecCatalog.from_file('c028001.cat')  # doctest: +SKIP
+    >>> mol_data = Phys.from_jplspec(47 * u.K, 230538 * u.MHz, 28001,
+    ...                              catalog=cat)  # doctest: +SKIP
+    """
+
+    _columns = ('FREQ', 'LGINT', 'DR', 'ELO', 'GUP')
+
+    _species_table = None
+    _species_table_lock = threading.Lock()
+
+    def __init__(self, lines):
+        tags = absolute(array(lines['TAG'], int))
+        freq = array(u.Quantity(lines['FREQ'], u.MHz).value)
+        order = lexsort((freq, tags))
+        tags = tags[order]
+        data = {'FREQ': freq[order]}
+        for col in self._columns[1:]:
+            data[col] = array(lines[col])[order]
+
+        self._index = {}
+        uniq, i0 = unique(tags, return_index=True)
+        i1 = append(i0[1:], len(tags))
+        for tag, start, stop in zip(uniq, i0, i1):
+            self._index[int(tag)] = {col: data[col][start:stop]
+                                     for col in self._columns}
+
+    @classmethod
+    def from_file(cls, *filenames):
+        """Load catalog files as provided by the JPL Molecular
+        Spectroscopy Catalog.
+
+        Parameters
+        ----------
+        *filenames : str
+            Names of catalog files (80-character card images, one line
+            per row, e.g., ``c018003.cat``).
+
+        Returns
+        -------
+        catalog : `~sbpy.data.JPLSpecCatalog`
+        """
+        tables = []
+        for filename in filenames:
+            tables.append(ascii.read(
+                filename, header_start=None, data_start=0,
+                names=('FREQ', 'ERR', 'LGINT', 'DR', 'ELO', 'GUP', 'TAG',
+                       'QNFMT'),
+                col_starts=(0, 13, 21, 29, 31, 41, 44, 51),
+                col_ends=(12, 20, 28, 30, 40, 43, 50, 54),
+                format='fixed_width'))
+        return cls(vstack(tables))
+
+    @classmethod
+    def species_table(cls):
+        """Species table of the catalog.
+
+        `~astroquery.jplspec.JPLSpec.get_species_table` is read only
+        once per process; the same table is returned on subsequent
+        calls and must not be modified.
+
+        Returns
+        -------
+        table : `~astropy.table.Table`
+        """
+        with cls._species_table_lock:
+            if cls._species_table is None:
+                cls._species_table = JPLSpec.get_species_table()
+        return cls._species_table
+
+    @classmethod
+    def resolve(cls, mol_tag):
+        """Resolve molecule name to species tag.
+
+        Parameters
+        ----------
+        mol_tag : int or str
+            Species tag or regular expression matching exactly one
+            species name in `~sbpy.data.JPLSpecCatalog.species_table`.
+
+        Returns
+        -------
+        tag : int
+        """
+        if not isinstance(mol_tag, str):
+            return int(mol_tag)
+
+        cat = cls.species_table()
+        pattern = re.compile(mol_tag)
+        tags = [tag for tag, name in zip(cat['TAG'], cat['NAME'])
+                if pattern.search(str(name))]
+        if len(tags) != 1:
+            raise JPLSpecQueryFailed(
+                ('{} molecules found for mol_tag {}: {}. Please refine '
+                 'your regex to be more specific (hint \'^name$\' will '
+                 'match \'name\' exactly with no ambiguity).').format(
+                     len(tags), mol_tag, tags))
+        return int(tags[0])
+
+    @property
+    def tags(self):
+        """Species tags in this catalog."""
+        return sorted(self._index)
+
+    def lines(self, mol_tag, min_frequency, max_frequency):
+        """Spectral lines of a species in a frequency range.
+
+        Parameters
+        ----------
+        mol_tag : int or str
+            Species tag or name, see `~sbpy.data.JPLSpecCatalog.resolve`.
+        min_frequency, max_frequency : `~astropy.units.Quantity`
+            Frequency range.
+
+        Returns
+        -------
+        lines : `~astropy.table.Table`
+        """
+        tag = self.resolve(mol_tag)
+        data = self._index.get(tag)
+        if data is None:
+            raise JPLSpecQueryFailed(
+                'Molecule tag {} not in catalog.'.format(tag))
+        i0 = searchsorted(data['FREQ'],
+                          u.Quantity(min_frequency, u.MHz).value, 'left')
+        i1 = searchsorted(data['FREQ'],
+                          u.Quantity(max_frequency, u.MHz).value, 'right')
+
+        lines = Table([data[col][i0:i1] for col in self._columns],
+                      names=self._columns)
+        lines['TAG'] = full(i1 - i0, tag)
+        lines['FREQ'].unit = u.MHz
+        lines['ELO'].unit = 1 / u.cm
+        return lines
+
+    def nearest(self, mol_tag, frequency):
+        """Spectral line of a species closest to a frequency.
+
+        Parameters
+        ----------
+        mol_tag : int or str
+            Species tag or name, see `~sbpy.data.JPLSpecCatalog.resolve`.
+        frequency : `~astropy.units.Quantity`
+            Frequency.
+
+        Returns
+        -------
+        line : dict
+            Line parameters (``FREQ`` in MHz, ``LGINT``, ``DR``, ``ELO``,
+            and ``GUP``), or ``None`` if the catalog does not contain
+            lines of this species.
+        """
+        data = self._index.get(self.resolve(mol_tag))
+        if data is None:
+            return None
+
+        freq = data['FREQ']
+        f = u.Quantity(frequency, u.MHz).value
+        i = searchsorted(freq, f)
+        if i == len(freq) or (i > 0 and f - freq[i - 1] <= freq[i] - f):
+            i -= 1
+        return {col: data[col][i] for col in self._columns}
+
+
 class Phys(DataClass):
     """Class for storing and querying physical properties"""
 
     @classmethod
     @cite({'software: astroquery': '2019AJ....157...98G'})
-    def from_sbdb(cls, targetids, references=False, notes=False):
+    def from_sbdb(cls, targetids, references=False, notes=False,
+                  max_workers=1, retries=0, retry_delay=1):
         """Load physical properties from `JPL Small-Body Database (SBDB)
         <https://ssd.jpl.nasa.gov/sbdb.cgi>`_ using
         `~astroquery.jplsbdb` for one or more targets. Builds a
@@ -48,6 +239,16 @@ class Phys(DataClass):
         targetids : str, int or iterable thereof
             Target identifier(s) to be queried; use object numbers, names,
             or designations as unambiguous as possible.
+        max_workers : int, optional
+            Maximum number of targets queried concurrently.
+            Default: ``1``
+        retries : int, optional
+            Number of times a target query is repeated in case of a
+            network error. Default: ``0``
+        retry_delay : float, optional
+            Delay in seconds before the first repetition of a failed
+            query; the delay is doubled for each further repetition.
+            Default: ``1``
 
         Returns
         -------
@@ -70,17 +271,23 @@ class Phys(DataClass):
         if not isinstance(targetids, (list, ndarray, tuple)):
             targetids = [targetids]
 
+        # query targets, possibly concurrently
+        results = fetch_all(lambda targetid: SBDB.query(str(targetid),
+                                                        phys=True),
+                            targetids, max_workers=max_workers,
+                            retries=retries, retry_delay=retry_delay)
+
         alldata = []
         columnnames = ['targetname']
-        columnunits = OrderedDict([('targetname', set())])
-        for targetid in targetids:
-
-            sbdb = SBDB.query(str(targetid), phys=True)
+        columnunits = OrderedDict([('targetname', OrderedDict())])
+        for sbdb in results:
 
             # assemble data from sbdb output
             data = OrderedDict([('targetname', sbdb['object']['fullname'])])
             for key, val in sbdb['phys_par'].items():
-                if val is None or val == 'None':
+                # avoid comparing Quantity objects with strings, which
+                # is expensive
+                if val is None or (isinstance(val, str) and val == 'None'):
                     val = nan
                 if '_note' in key:
                     if notes:
@@ -90,7 +297,7 @@ class Phys(DataClass):
                         data[key] = val
                 else:
                     try:
-                        if isnan(val):
+                        if isnan(getattr(val, 'value', val)):
                             val = nan
                     except TypeError:
                         pass
@@ -99,44 +306,44 @@ class Phys(DataClass):
                 # add to columnnames if not yet there
                 if key not in columnnames:
                     columnnames.append(key)
-                    columnunits[key] = set()
+                    columnunits[key] = OrderedDict()
 
-                # identify units
+                # identify units, in the order they are encountered
                 if isinstance(val, u.Quantity):
-                    columnunits[key].add(val.unit)
+                    columnunits[key][val.unit] = None
                 elif isinstance(val, u.CompositeUnit):
                     for unit in val.bases:
-                        columnunits[key].add(unit)
+                        columnunits[key][unit] = None
 
             alldata.append(data)
 
         # re-assemble data on a per-column basis
         coldata = []
         for col in columnnames:
-            data = []
-
-            for obj in alldata:
-                try:
-                    data.append(obj[col])
-                except KeyError:
-                    data.append(nan)
+            data = [obj.get(col, nan) for obj in alldata]
 
-            # identify common unit (or at least any unit)
+            # identify common unit (the first unit encountered)
             try:
                 unit = list(columnunits[col])[0]
-                # transform data to this unit
+                # transform data to this unit; conversion factors are
+                # derived once for each unit present in this column
+                factors = {}
                 newdata = []
                 for dat in data:
-                    if isinstance(dat, (u.Quantity, u.CompositeUnit)):
-                        try:
-                            newdata.append(dat.to(unit))
-                        except u.UnitConversionError:
-                            # keep data untouched if conversion fails
-                            unit = 1
-                            newdata = data
-                            break
+                    if isinstance(dat, u.Quantity):
+                        if dat.unit not in factors:
+                            factors[dat.unit] = dat.unit.to(unit)
+                        newdata.append(dat.value * factors[dat.unit])
+                    elif isinstance(dat, u.CompositeUnit):
+                        if dat not in factors:
+                            factors[dat] = dat.to(unit)
+                        newdata.append(factors[dat])
                     else:
                         newdata.append(dat)
+            except u.UnitConversionError:
+                # keep data untouched if conversion fails
+                unit = 1
+                newdata = data
             except IndexError:
                 # data has no unit assigned
                 unit = 1
@@ -159,7 +366,8 @@ class Phys(DataClass):
 
     @classmethod
     @cite({'software: astroquery': '2019AJ....157...98G'})
-    def from_jplspec(cls, temp_estimate, transition_freq, mol_tag):
+    def from_jplspec(cls, temp_estimate, transition_freq, mol_tag,
+                     catalog=None):
         """Returns relevant constants from JPLSpec catalog and energy
         calculations
 
@@ -182,6 +390,11 @@ class Phys(DataClass):
             interested in. For more information, visit
             `astroquery.jplspec` documentation.
 
+        catalog : `~sbpy.data.JPLSpecCatalog`, optional
+            Local copy of the catalog. If provided, the transition is
+            looked up in ``catalog`` instead of querying JPLSpec.
+            Default: ``None``
+
         Returns
         -------
         Molecular data : `~sbpy.data.Phys` instance
@@ -198,64 +411,75 @@ class Phys(DataClass):
 
         """
 
-        if isinstance(mol_tag, str):
-            query = JPLSpec.query_lines_async(
-                min_frequency=(transition_freq - (1 * u.GHz)),
-                max_frequency=(transition_freq + (1 * u.GHz)),
-                molecule=mol_tag,
-                parse_name_locally=True,
-                get_query_payload=True)
-
-            res = dict(query)
-            # python request payloads aren't stable (could be
-            # dictionary or list)
-            # depending on the version, so make
-            # sure to check back from time to time
-            if len(res['Mol']) > 1:
+        if catalog is not None:
+            mol_tag = catalog.resolve(mol_tag)
+            data = catalog.nearest(mol_tag, transition_freq)
+            if (data is None or
+                    abs(data['FREQ'] * u.MHz - transition_freq) > 1 * u.GHz):
                 raise JPLSpecQueryFailed(
-                    ("Ambiguous choice for molecule,\
-                    more than one molecule was found for \
-                    the given mol_tag. Please refine \
-                    your search to one of the following tags\
-                    {} by using JPLSpec.get_species_table()\
-                    (as shown in JPLSpec documentation)\
-                    to parse their names and choose your \
-                    molecule of interest, or refine your\
-                    regex to be more specific (hint '^name$'\
-                    will match 'name' exactly with no\
-                    ambiguity).").format(res['Mol']))
-            else:
-                mol_tag = res['Mol'][0]
+                    ("Zero lines were found in the local catalog in a "
+                     "+/- 1 GHz range from your provided transition "
+                     "frequency for molecule tag {}.").format(mol_tag))
+            t_freq = data['FREQ'] * u.MHz
+        else:
+            if isinstance(mol_tag, str):
+                query = JPLSpec.query_lines_async(
+                    min_frequency=(transition_freq - (1 * u.GHz)),
+                    max_frequency=(transition_freq + (1 * u.GHz)),
+                    molecule=mol_tag,
+                    parse_name_locally=True,
+                    get_query_payload=True)
+
+                res = dict(query)
+                # python request payloads aren't stable (could be
+                # dictionary or list)
+                # depending on the version, so make
+                # sure to check back from time to time
+                if len(res['Mol']) > 1:
+                    raise JPLSpecQueryFailed(
+                        ("Ambiguous choice for molecule,\
+                        more than one molecule was found for \
+                        the given mol_tag. Please refine \
+                        your search to one of the following tags\
+                        {} by using JPLSpec.get_species_table()\
+                        (as shown in JPLSpec documentation)\
+                        to parse their names and choose your \
+                        molecule of interest, or refine your\
+                        regex to be more specific (hint '^name$'\
+                        will match 'name' exactly with no\
+                        ambiguity).").format(res['Mol']))
+                else:
+                    mol_tag = res['Mol'][0]
 
-        query = JPLSpec.query_lines(
-            min_frequency=(transition_freq - (1 * u.GHz)),
-            max_frequency=(transition_freq + (1 * u.GHz)),
-            molecule=mol_tag)
+            query = JPLSpec.query_lines(
+                min_frequency=(transition_freq - (1 * u.GHz)),
+                max_frequency=(transition_freq + (1 * u.GHz)),
+                molecule=mol_tag)
 
-        freq_list = query['FREQ']
+            freq_list = query['FREQ']
 
-        if freq_list[0] == 'Zero lines we':
-            raise JPLSpecQueryFailed(
-                ("Zero lines were found by JPLSpec in a +/- 1 GHz "
-                 "range from your provided transition frequency for "
-                 "molecule tag {}.").format(mol_tag))
+            if freq_list[0] == 'Zero lines we':
+                raise JPLSpecQueryFailed(
+                    ("Zero lines were found by JPLSpec in a +/- 1 GHz "
+                     "range from your provided transition frequency for "
+                     "molecule tag {}.").format(mol_tag))
 
-        t_freq = min(list(freq_list.quantity),
-                     key=lambda x: abs(x-transition_freq))
+            t_freq = min(list(freq_list.quantity),
+                         key=lambda x: abs(x-transition_freq))
 
-        data = query[query['FREQ'] == t_freq.value]
+            data = query[query['FREQ'] == t_freq.value][0]
 
-        df = int(data['DR'].data)
+        df = int(data['DR'])
 
-        lgint = float(data['LGINT'].data)
+        lgint = float(data['LGINT'])
 
         lgint = 10**lgint * u.nm * u.nm * u.MHz
 
-        elo = float(data['ELO'].data) / u.cm
+        elo = float(data['ELO']) / u.cm
 
-        gu = float(data['GUP'].data)
+        gu = float(data['GUP'])
 
-        cat = JPLSpec.get_species_table()
+        cat = JPLSpecCatalog.species_table()
 
         mol = cat[cat['TAG'] == mol_tag]
 
@@ -273,7 +497,7 @@ class Phys(DataClass):
 
         partition = 10**(f)
 
-        part300 = 10 ** (float(mol['QLOG1'].data))
+        part300 = 10 ** (float(mol['QLOG1'][0]))
 
         # yields in 1/cm
         energy = elo + (t_freq.to(1/u.cm, equivalencies=u.spectral()))
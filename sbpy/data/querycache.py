@@ -0,0 +1,360 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+===========================
+sbpy data.QueryCache Module
+===========================
+
+Persistent on-disk cache and concurrent execution of remote queries
+
+created on October 16, 2026
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import threading
+from warnings import warn
+from concurrent.futures import ThreadPoolExecutor
+
+from numpy import ndarray, ascontiguousarray
+from astropy.time import Time
+from astropy.coordinates import EarthLocation
+from astropy.utils.state import ScienceState
+import astropy.units as u
+from requests.exceptions import RequestException
+
+from .core import (DataClassError, QueryError, COLUMNAR_INDEX,
+                   _write_columnar, _read_columnar)
+from ..exceptions import SbpyWarning
+
+__all__ = ['QueryCache', 'query_cache', 'QueryCacheWarning']
+
+
+class QueryCacheWarning(SbpyWarning):
+    """Will be raised in case a query result cannot be cached."""
+    pass
+
+
+def _hash_update(h, obj):
+    """Update hash object ``h`` with a canonical representation of
+    ``obj``."""
+
+    if isinstance(obj, Time):
+        h.update('Time:{}:'.format(obj.scale).encode())
+        _hash_update(h, obj.jd1)
+        _hash_update(h, obj.jd2)
+    elif isinstance(obj, EarthLocation):
+        h.update(b'EarthLocation:')
+        _hash_update(h, u.Quantity(obj.geocentric).to('m'))
+    elif isinstance(obj, u.Quantity):
+        h.update('Quantity:{}:'.format(obj.unit.to_string()).encode())
+        _hash_update(h, obj.value)
+    elif isinstance(obj, ndarray):
+        h.update('ndarray:{}:{}:'.format(obj.dtype.str, obj.shape).encode())
+        h.update(ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update('dict:{}:'.format(len(obj)).encode())
+        for key in sorted(obj, key=str):
+            _hash_update(h, key)
+            _hash_update(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update('list:{}:'.format(len(obj)).encode())
+        for item in obj:
+            _hash_update(h, item)
+    else:
+        h.update('{}:{!r}:'.format(type(obj).__name__, obj).encode())
+
+
+class QueryCache():
+    """Persistent on-disk cache for remote query results.
+
+    Results are stored in the binary columnar format of
+    `~sbpy.data.DataClass.to_file`, one directory per query, and
+    addressed by a hash of the service name and all query parameters.
+    The cache is used by remote query functions in `sbpy.data` while it
+    is activated through `~sbpy.data.query_cache`.
+
+    Parameters
+    ----------
+    path : str
+        Cache directory; will be created if it does not exist.
+    ttl : `~astropy.units.Quantity` or float, optional
+        Time-to-live of cached results (float values are interpreted
+        as seconds); expired results are queried again. If ``None``,
+        results never expire. Default: ``None``
+    max_size : `~astropy.units.Quantity` or int, optional
+        Maximum size of the cache (int values are interpreted as
+        bytes). If exceeded, the least recently used results are
+        removed. If ``None``, the size is not limited. Default: ``None``
+    offline : bool, optional
+        If ``True``, no remote queries are performed; results that are
+        not available in the cache raise a `~sbpy.data.QueryError`.
+        Default: ``False``
+
+    Examples
+    --------
+    >>> from sbpy.data import Ephem, QueryCache, query_cache
+    >>> from astropy.time import Time
+    >>> import astropy.units as u
+    >>> cache = QueryCache('ephem_cache', ttl=1*u.day,
+    ...                    max_size=1*u.Gbyte)  # doctest: +SKIP
+    >>> with query_cache.set(cache):  # doctest: +SKIP
+    ...     eph = Ephem.from_horizons('Ceres',
+    ...                               epochs=Time('2020-01-01'))
+
+    Running the same query again while the cache is active reads the
+    result from disk. Queries can be run ahead of time to pre-warm the
+    cache and later be repeated without network access:
+
+    >>> with query_cache.set(QueryCache('ephem_cache',
+    ...                                 offline=True)):  # doctest: +SKIP
+    ...     eph = Ephem.from_horizons('Ceres',
+    ...                               epochs=Time('2020-01-01'))
+    """
+
+    def __init__(self, path, ttl=None, max_size=None, offline=False):
+        self.path = path
+        self.ttl = None if ttl is None else u.Quantity(ttl, u.s)
+        self.max_size = (None if max_size is None
+                         else u.Quantity(max_size, u.byte))
+        self.offline = offline
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(service, **params):
+        """Derive cache key for a query of ``service`` with parameters
+        ``params``.
+
+        Parameters
+        ----------
+        service : str
+            Service name.
+        **params
+            Query parameters, e.g., target identifier, epochs,
+            location, and additional keyword arguments.
+
+        Returns
+        -------
+        key : str
+        """
+        h = hashlib.sha256()
+        _hash_update(h, service)
+        _hash_update(h, params)
+        return h.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def get(self, key):
+        """Retrieve a query result from the cache.
+
+        Parameters
+        ----------
+        key : str
+            Cache key as provided by `~sbpy.data.QueryCache.key`.
+
+        Returns
+        -------
+        table : `~astropy.table.Table`, `~astropy.table.QTable` or None
+            ``None`` is returned if ``key`` is not in the cache or the
+            result has expired.
+        """
+        entry = self._entry(key)
+        try:
+            created = os.path.getmtime(os.path.join(entry, COLUMNAR_INDEX))
+        except OSError:
+            return None
+
+        if (self.ttl is not None and
+                time.time() - created > self.ttl.to_value(u.s)):
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        # access time of the entry is tracked for LRU eviction
+        os.utime(entry)
+        return _read_columnar(entry, mmap_mode=None)
+
+    def put(self, key, table):
+        """Store a query result in the cache.
+
+        Parameters
+        ----------
+        key : str
+            Cache key as provided by `~sbpy.data.QueryCache.key`.
+        table : `~astropy.table.Table` or `~astropy.table.QTable`
+            Query result.
+        """
+        entry = self._entry(key)
+        tmp = '{}.{}.{}.tmp'.format(entry, os.getpid(),
+                                    threading.get_ident())
+        try:
+            _write_columnar(table, tmp, overwrite=True)
+        except DataClassError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            warn('query result not cached: {}'.format(e), QueryCacheWarning)
+            return
+
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # entry has been written concurrently
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.evict()
+
+    def _entries(self):
+        """List of (last access, size, path) for all cache entries."""
+        entries = []
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            if (name.endswith('.tmp') or
+                    not os.path.isfile(os.path.join(entry, COLUMNAR_INDEX))):
+                continue
+            size = sum([os.path.getsize(os.path.join(entry, f))
+                        for f in os.listdir(entry)])
+            entries.append((os.path.getmtime(entry), size, entry))
+        return entries
+
+    @property
+    def size(self):
+        """Total size of all cached results."""
+        return sum([entry[1] for entry in self._entries()]) * u.byte
+
+    def evict(self):
+        """Remove least recently used results until the cache size is
+        below ``max_size``."""
+        if self.max_size is None:
+            return
+
+        entries = sorted(self._entries())
+        size = sum([entry[1] for entry in entries])
+        for accessed, entry_size, entry in entries:
+            if size <= self.max_size.to_value(u.byte):
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            size -= entry_size
+
+    def clear(self):
+        """Remove all results from the cache."""
+        for accessed, size, entry in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def query(self, service, func, **params):
+        """Return the cached result for ``service`` and ``params`` or
+        call ``func`` and cache its result.
+
+        Parameters
+        ----------
+        service : str
+            Service name.
+        func : callable
+            Function without arguments that performs the query and
+            returns a `~astropy.table.Table` or
+            `~astropy.table.QTable`.
+        **params
+            Query parameters, see `~sbpy.data.QueryCache.key`.
+
+        Returns
+        -------
+        table : `~astropy.table.Table` or `~astropy.table.QTable`
+        """
+        key = self.key(service, **params)
+        table = self.get(key)
+        if table is None:
+            if self.offline:
+                raise QueryError(
+                    ('{} query with parameters {} not available in '
+                     'offline query cache {}').format(
+                         service, params, self.path))
+            table = func()
+            self.put(key, table)
+        return table
+
+
+class query_cache(ScienceState):
+    """Get/set the `sbpy` remote query cache.
+
+    Queries are not cached by default:
+
+    >>> from sbpy.data import query_cache
+    >>> print(query_cache.get())
+    None
+
+    To enable caching, use a `~sbpy.data.QueryCache` object or the
+    name of a cache directory:
+
+    >>> with query_cache.set('sbpy_cache'):  # doctest: +SKIP
+    ...     # queries are cached in sbpy_cache
+    ...     pass
+
+    """
+    _value = None
+
+    @classmethod
+    def validate(cls, value):
+        if value is None or isinstance(value, QueryCache):
+            return value
+        elif isinstance(value, str):
+            return QueryCache(value)
+        else:
+            raise TypeError(
+                "query_cache must be None, a string, or QueryCache instance.")
+
+
+def cached_query(service, func, **params):
+    """Call ``func`` through the active `~sbpy.data.query_cache`, if
+    any, using ``service`` and ``params`` as cache key."""
+    cache = query_cache.get()
+    if cache is None:
+        return func()
+    return cache.query(service, func, **params)
+
+
+def _retry(func, retries=0, retry_delay=1):
+    """Call ``func``; retry up to ``retries`` times with exponential
+    backoff starting at ``retry_delay`` seconds if a network error
+    occurs."""
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except RequestException:
+            if attempt == retries:
+                raise
+            time.sleep(retry_delay * 2**attempt)
+
+
+def fetch_all(fetch, items, max_workers=1, retries=0, retry_delay=1):
+    """Call ``fetch`` for each of ``items``, using up to ``max_workers``
+    concurrent threads.
+
+    Parameters
+    ----------
+    fetch : callable
+        Function that performs the query for a single item.
+    items : iterable
+        Items to be queried, e.g., target identifiers.
+    max_workers : int, optional
+        Maximum number of concurrent queries. Default: 1
+    retries : int, optional
+        Number of times a query is repeated in case of network errors.
+        Default: 0
+    retry_delay : float, optional
+        Delay in seconds before the first repetition; the delay is
+        doubled for each further repetition. Default: 1
+
+    Returns
+    -------
+    results : list
+        Results of ``fetch`` in the order of ``items``.
+    """
+
+    def call(item):
+        return _retry(lambda: fetch(item), retries, retry_delay)
+
+    if max_workers <= 1:
+        return [call(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(call, items))
@@ -0,0 +1,68 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+import time
+import threading
+
+import pytest
+import numpy as np
+from astropy.time import Time
+from astropy.table import Table
+from requests.exceptions import ConnectionError
+
+from .. import ephem
+
+
+class MockHorizons:
+    """Stand-in for `astroquery.jplhorizons.Horizons` counting queries
+    and the peak number of simultaneous queries."""
+    queries = 0
+    delay = 0
+    failures = 0
+    active = 0
+    peak = 0
+    _lock = threading.Lock()
+
+    def __init__(self, id=None, id_type=None, location=None, epochs=None):
+        self.id = id
+        self.epochs = epochs
+
+    def ephemerides(self, **kwargs):
+        with MockHorizons._lock:
+            MockHorizons.queries += 1
+            if MockHorizons.failures > 0:
+                MockHorizons.failures -= 1
+                raise ConnectionError('connection refused')
+            MockHorizons.active += 1
+            MockHorizons.peak = max(MockHorizons.peak, MockHorizons.active)
+        try:
+            time.sleep(MockHorizons.delay)
+        finally:
+            with MockHorizons._lock:
+                MockHorizons.active -= 1
+
+        if isinstance(self.epochs, dict):
+            # range of epochs with a given number of intervals
+            start, stop = Time([self.epochs['start'], self.epochs['stop']],
+                               scale='utc').jd
+            jd = np.linspace(start, stop, int(self.epochs['step']) + 1)
+        else:
+            jd = np.atleast_1d(self.epochs)
+        eph = Table()
+        eph['targetname'] = [self.id] * len(jd)
+        eph['datetime_str'] = ['---'] * len(jd)
+        eph['datetime_jd'] = jd
+        eph['datetime_jd'].unit = 'd'
+        eph['RA'] = np.linspace(0, 1, len(jd))
+        eph['RA'].unit = 'deg'
+        eph['V'] = np.ones(len(jd))
+        eph['V'].unit = '---'
+        return eph
+
+
+@pytest.fixture
+def horizons(monkeypatch):
+    for attr, value in (('queries', 0), ('delay', 0), ('failures', 0),
+                        ('active', 0), ('peak', 0)):
+        monkeypatch.setattr(MockHorizons, attr, value)
+    monkeypatch.setattr(ephem, 'Horizons', MockHorizons)
+    return MockHorizons
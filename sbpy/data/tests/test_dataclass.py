@@ -1,12 +1,14 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 import os
+import pathlib
 from collections import OrderedDict
 import pytest
 from copy import deepcopy
-from numpy import array
+from numpy import array, arange, memmap, isnan
 import astropy.units as u
-from astropy.table import QTable, Column
-from ..core import DataClass, conf, DataClassError
+from astropy.time import Time
+from astropy.table import QTable, Table, Column, MaskedColumn, vstack
+from ..core import DataClass, conf, DataClassError, TableAccumulator
 
 
 def data_path(filename):
@@ -311,6 +313,39 @@ def test_get_set():
     assert isinstance(data, DataClass)
 
 
+def test_views_copy():
+    """test that rows and slices share data, unless copied"""
+
+    data = DataClass.from_dict(
+        OrderedDict((('a', [1, 2, 3]),
+                     ('b', [4, 5, 6]*u.m))))
+
+    # slices and single rows share data with the original object
+    view = data[1:]
+    view['a'][0] = 0
+    assert data['a'][1] == 0
+    row = data[-1]
+    assert len(row) == 1
+    row['b'][0] = 0*u.m
+    assert data['b'][2] == 0*u.m
+
+    with pytest.raises(IndexError):
+        data[3]
+
+    # masks return new data
+    masked = data[data['a'] > 0]
+    masked['a'][0] = 10
+    assert data['a'][0] == 1
+
+    # copies are independent
+    copied = data[:2].copy()
+    assert isinstance(copied, DataClass)
+    copied['a'][0] = 10
+    copied['b'][0] = 10*u.m
+    assert data['a'][0] == 1
+    assert data['b'][0] == 4*u.m
+
+
 def test_units():
     """ test units on multi-row tables """
 
@@ -380,6 +415,27 @@ def test_translate_columns():
     conf.fieldname_idx = storage[1]
 
 
+def test_translate_columns_cache():
+    """test that resolved alternative field names follow table changes"""
+
+    tab = DataClass.from_dict(
+        OrderedDict((('rh', [1, 2, 3]*u.au),
+                     ('delta', [4, 5, 6]*u.au))))
+
+    assert tab._translate_columns('r') == ['rh']
+    assert tab['r'][0] == 1*u.au
+
+    # remove translated column and provide an alternative
+    tab.table.remove_column('rh')
+    tab['heldist'] = [7, 8, 9]*u.au
+    assert tab._translate_columns('r') == ['heldist']
+    assert tab['r'][0] == 7*u.au
+
+    # alternative field name becomes actual column
+    tab['r'] = [0, 0, 0]*u.au
+    assert tab['r'][0] == 0*u.au
+
+
 def test_indexing():
     """make sure that indexing functionality is not compromised through
     column name translation"""
@@ -483,22 +539,138 @@ def test_meta():
     assert tab.meta == {'test': 'stuff'}
 
 
-def test_io():
+def test_io(tmpdir):
     """test file writing and reading capabilities"""
     tab = DataClass.from_dict(OrderedDict([('a', [1, 2, 3]*u.m),
                                            ('b', [4, 5, 6]),
                                            ('c', [7, 8, 9]*u.kg)]))
     tab.meta['test'] = 'stuff'
 
-    tab.to_file('dataclass_table.fits', format='fits', overwrite=True)
+    path = str(tmpdir.join('dataclass_table.fits'))
+    tab.to_file(path, format='fits', overwrite=True)
 
-    tab2 = DataClass.from_file('dataclass_table.fits', format='fits')
+    tab2 = DataClass.from_file(path, format='fits')
 
     assert all(tab.table == tab2.table)
     assert tab.meta == {key.lower(): val.lower()
                         for key, val in tab2.meta.items()}
 
 
+def test_io_columnar(tmpdir):
+    """test columnar file writing and memory-mapped reading"""
+    tab = DataClass.from_dict(OrderedDict([
+        ('a', [1, 2, 3]*u.m),
+        ('b', [4, 5, 6]),
+        ('c', ['x', 'yy', 'zzz']),
+        ('epoch', Time([2451545.1, 2451546.2, 2451547.3], format='jd',
+                       scale='tdb'))]))
+    tab.meta['test'] = 'stuff'
+
+    path = str(tmpdir.join('columnar'))
+    tab.to_file(path, format='columnar')
+
+    with pytest.raises(OSError):
+        tab.to_file(path, format='columnar')
+    tab.to_file(path, format='columnar', overwrite=True)
+
+    # format is identified automatically
+    tab2 = DataClass.from_file(path)
+
+    assert tab2.table.colnames == tab.table.colnames
+    assert all(tab2['a'] == tab['a'])
+    assert tab2['a'].unit == u.m
+    assert list(tab2['b']) == [4, 5, 6]
+    assert list(tab2['c']) == ['x', 'yy', 'zzz']
+    assert tab2['epoch'].scale == 'tdb'
+    assert tab2['epoch'].format == 'jd'
+    assert all(tab2['epoch'] == tab['epoch'])
+    assert tab2.meta == tab.meta
+
+    # column data are memory-mapped, modifications stay in memory
+    for name in ['a', 'b', 'c']:
+        base = tab2[name]
+        while not isinstance(base, memmap):
+            base = base.base
+    tab2['a'][0] = 10*u.m
+    tab3 = DataClass.from_file(path, format='columnar', mmap_mode=None)
+    assert tab3['a'][0] == 1*u.m
+
+    # masked columns
+    tab.table['d'] = MaskedColumn([1., 2., 3.], mask=[False, True, False])
+    tab.to_file(path, format='columnar', overwrite=True)
+    tab4 = DataClass.from_file(path)
+    assert list(tab4['d'].mask) == [False, True, False]
+    assert tab4['d'][0] == 1
+
+    # object columns cannot be written
+    tab.table['e'] = array([1, 'a', None], dtype=object)
+    with pytest.raises(DataClassError):
+        tab.to_file(str(tmpdir.join('fail')), format='columnar')
+
+
+def test_from_file_object(tmpdir):
+    """test reading from file-like objects"""
+    tab = DataClass.from_dict({'a': [1, 2, 3]*u.m})
+    path = str(tmpdir.join('table.fits'))
+    tab.to_file(path, format='fits')
+    with open(path, 'rb') as f:
+        tab2 = DataClass.from_file(f)
+    assert all(tab2['a'] == tab['a'])
+
+
+@pytest.mark.parametrize('filename,format,kwargs', (
+    ('table.ecsv', 'ascii.ecsv', {}),
+    ('table.txt', 'ascii', {'format': 'ascii'}),
+    ('table.fits', 'fits', {'astropy_native': True}),
+    ('table', 'columnar', {})
+))
+def test_iter_file(tmpdir, filename, format, kwargs):
+    """test reading files in chunks"""
+    if format == 'ascii.ecsv':
+        pytest.importorskip('yaml')
+
+    tab = DataClass.from_dict(OrderedDict([
+        ('a', [1, 2, 3, 4, 5]*u.m),
+        ('b', [4, 5, 6, 7, 8]),
+        ('epoch', Time(2451545 + arange(5), format='jd', scale='utc'))]))
+
+    path = str(tmpdir.join(filename))
+    if format == 'ascii':
+        tab.table['epoch'] = tab['epoch'].jd
+    tab.to_file(path, format=format)
+
+    chunks = list(DataClass.iter_file(path, chunksize=2,
+                                      meta={'test': 'stuff'}, **kwargs))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert all([isinstance(chunk, DataClass) for chunk in chunks])
+    assert all([chunk.meta['test'] == 'stuff' for chunk in chunks])
+    assert list(chunks[1]['b']) == [6, 7]
+    if format != 'ascii':
+        assert chunks[2]['a'][0] == 5*u.m
+        assert isinstance(chunks[2]['epoch'], Time)
+        assert chunks[2]['epoch'][0] == tab['epoch'][4]
+
+
+@pytest.mark.parametrize('format', (
+    'ascii.basic', 'ascii.csv', 'csv', 'ascii.tab', 'ascii.ecsv',
+    'ascii.commented_header', 'ascii.ipac', 'ascii.fixed_width',
+    'ascii.rst', 'ascii'))
+def test_iter_file_rows(tmpdir, format):
+    """every row is read exactly once, for all ASCII formats"""
+    if format == 'ascii.ecsv':
+        pytest.importorskip('yaml')
+
+    tab = DataClass.from_dict(OrderedDict([
+        ('a', arange(1, 8)), ('b', arange(11, 18) * 1.5)]))
+    path = pathlib.Path(str(tmpdir.join('table.txt')))
+    tab.to_file(str(path), format=format)
+
+    chunks = list(DataClass.iter_file(path, chunksize=2, format=format))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 2, 1]
+    assert list(vstack([chunk.table for chunk in chunks])['a']) == list(
+        range(1, 8))
+
+
 def test_apply():
     """test DataClass.apply"""
     tab = DataClass.from_columns([[2451223, 2451224, 2451226]*u.d,
@@ -520,3 +692,47 @@ def test_apply():
 
     with pytest.raises(DataClassError):
         tab.apply([12.1, 12.5, 12.6, 99]*u.mag, name='V')  # wrong size
+
+
+def test_table_accumulator():
+    """test TableAccumulator"""
+
+    acc = TableAccumulator()
+    assert len(acc.to_table()) == 0
+
+    first = QTable({'targetname': ['a', 'a'],
+                    'r': [1, 2] * u.au,
+                    'epoch': Time([2451223, 2451224], format='jd')})
+    acc.append(first)
+    assert acc.to_table() is first
+
+    acc.append(DataClass.from_dict({'targetname': ['bb'],
+                                    'r': [1.5e8] * u.km,
+                                    'epoch': Time([2451225], format='jd'),
+                                    'V': [12.1] * u.mag}))
+    acc.append(QTable({'targetname': ['c'],
+                       'r': [3] * u.au,
+                       'epoch': Time([2451226], format='jd')}))
+    assert len(acc) == 4
+
+    tab = acc.to_table()
+    assert isinstance(tab, QTable)
+    assert list(tab['targetname']) == ['a', 'a', 'bb', 'c']
+    assert tab['r'].unit == u.au
+    assert u.allclose(tab['r'], [1, 2, 1.5e8 / 149597870.7, 3] * u.au)
+    assert all(tab['epoch'].jd == [2451223, 2451224, 2451225, 2451226])
+    # missing quantities are filled with NaN
+    assert list(isnan(tab['V'])) == [True, True, False, True]
+    # input tables are not modified
+    assert first['r'].unit == u.au
+    assert len(first) == 2
+
+    # plain columns with units
+    acc = TableAccumulator()
+    acc.append(Table({'x': Column([1., 2.], unit='m')}))
+    acc.append(Table({'x': MaskedColumn([1., 2.], mask=[False, True],
+                                        unit='km')}))
+    tab = acc.to_table()
+    assert tab['x'].unit == u.m
+    assert list(tab['x'].data.data[:3]) == [1, 2, 1000]
+    assert list(tab['x'].mask) == [False, False, False, True]
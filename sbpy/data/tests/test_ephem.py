@@ -1,13 +1,17 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 
+import sys
+import multiprocessing
 import pytest
 from copy import deepcopy
 from numpy import abs
+import numpy as np
 import warnings
 
 from numpy.testing import assert_allclose
 import astropy.units as u
 from astropy.time import Time
+from astropy.table import Table
 from astropy.coordinates import EarthLocation
 from astropy.tests.helper import assert_quantity_allclose
 
@@ -15,7 +19,8 @@ from ... import exceptions as sbe
 from ... import bib
 from ..core import conf
 from .. import ephem
-from .. import Ephem, Orbit, QueryError
+from .. import Ephem, Orbit
+from ..orbit import OpenOrbError, OpenOrbSession
 
 try:
     import pyoorb
@@ -90,3 +95,286 @@ class TestEphemFromOorb:
             oo_ephem = Ephem.from_oo(orbit, scope='basic')
             assert 'sbpy.data.ephem.Ephem.from_oo' in bib.show()
         bib.reset()
+
+
+def test_epoch_batches():
+    # regular grid
+    t = np.arange(10.)
+    assert ephem._epoch_batches(t, 1e-6) == [(True, 0, 10)]
+    assert ephem._epoch_batches(t, 1e-6, max_run=4) == [
+        (True, 0, 4), (True, 4, 8), (True, 8, 10)]
+
+    # irregular epochs are grouped into lists
+    t = np.array([0, 1, 2, 3, 5, 8, 13, 14, 15, 16, 17, 30.])
+    assert ephem._epoch_batches(t, 1e-6, min_run=4, max_list=2) == [
+        (True, 0, 4), (False, 4, 6), (True, 6, 11), (False, 11, 12)]
+    assert ephem._epoch_batches(t, 1e-6, min_run=20, max_list=5) == [
+        (False, 0, 5), (False, 5, 10), (False, 10, 12)]
+
+    # order is preserved
+    t = np.array([3, 2, 1, 0, 1, 2, 3.])
+    assert ephem._epoch_batches(t, 1e-6, min_run=3, max_list=3) == [
+        (False, 0, 3), (True, 3, 7)]
+
+
+class MockMPC:
+    """Stand-in for `astroquery.mpc.MPC` recording queries."""
+    queries = []
+
+    @classmethod
+    def get_ephemeris(cls, target, location='500', start=None, step=1 * u.d,
+                      number=None, **kwargs):
+        cls.queries.append((start, step, number))
+        step = u.Quantity(step).to_value('d')
+        eph = Table()
+        # MPC epochs are rounded to full seconds
+        eph['Date'] = Time(start.jd + np.arange(number) * step, format='jd',
+                           scale='utc', precision=0)
+        eph['Date'] = Time(eph['Date'].iso, scale='utc')
+        eph['RA'], eph['Dec'] = cls.position(eph['Date'].jd)
+        eph['RA'].unit = 'deg'
+        eph['Dec'].unit = 'deg'
+        eph['Uncertainty information'] = ['N/A'] * number
+        return eph
+
+    @staticmethod
+    def position(jd):
+        t = jd - 2458000.5
+        ra = (350 + 0.2 * t + 2 * np.sin(t / 20)) % 360
+        dec = 10 + 5 * np.cos(t / 30)
+        return ra, dec
+
+
+class MockMiriade:
+    """Stand-in for `astroquery.imcce.Miriade` recording queries."""
+    queries = []
+
+    def get_ephemerides(self, targetname, objtype='asteroid', location=500,
+                        epoch=None, epoch_step='1d', epoch_nsteps=1,
+                        **kwargs):
+        MockMiriade.queries.append((epoch_step, epoch_nsteps))
+        step = int(epoch_step[:-1]) * {'d': u.d, 'h': u.h, 'm': u.min,
+                                       's': u.s}[epoch_step[-1]]
+        eph = Table()
+        eph['epoch'] = (Time(epoch).jd +
+                        np.arange(epoch_nsteps) * step.to_value('d'))
+        eph['RA'], eph['DEC'] = MockMPC.position(eph['epoch'])
+        return eph
+
+
+class TestEphemBatches:
+    def test_horizons(self, horizons, monkeypatch):
+        monkeypatch.setattr(conf, 'horizons_max_epoch_list', 5)
+
+        # 10 regular epochs, then 7 irregular epochs
+        jd = np.r_[2458000.5 + np.arange(10) / 24,
+                   2458001.5 + np.arange(7)**2 / 24]
+        eph = Ephem.from_horizons('Ceres', epochs=Time(jd, format='jd'))
+        assert horizons.queries == 3
+        assert np.allclose(eph['epoch'].jd, jd)
+
+    def test_mpc(self, monkeypatch):
+        monkeypatch.setattr(ephem, 'MPC', MockMPC)
+        MockMPC.queries = []
+
+        jd = np.r_[2458000.5 + np.arange(100) / 24, 2458010.5,
+                   2458020.5 + np.arange(2000) / 1440]
+        eph = Ephem.from_mpc('Ceres', epochs=Time(jd, format='jd'))
+        assert [(q[1], q[2]) for q in MockMPC.queries] == [
+            (1 * u.h, 100), (10 * u.d, 2), (1 * u.min, 1441),
+            (1 * u.min, 558)]
+        assert np.allclose(eph['epoch'].jd, jd)
+
+    def test_miriade(self, monkeypatch):
+        monkeypatch.setattr(ephem, 'Miriade', MockMiriade)
+        monkeypatch.setattr(MockMiriade, 'queries', [])
+
+        # steps of full seconds are queried as ranges with integer
+        # steps, other epochs individually
+        jd = np.r_[2458000.5 + np.arange(100) / 24, 2458010.5,
+                   2458020.5 + np.arange(1, 10) * 1.5 / 86400]
+        eph = Ephem.from_miriade('Ceres', epochs=Time(jd, format='jd'))
+        assert MockMiriade.queries == [('1h', 100)] + [('1d', 1)] * 10
+        assert np.allclose(eph['epoch'].jd, jd)
+
+        assert ephem._miriade_step(86400) == '1d'
+        assert ephem._miriade_step(5400) == '90m'
+        assert ephem._miriade_step(61) == '61s'
+
+    def test_mpc_interpolate(self, monkeypatch):
+        monkeypatch.setattr(ephem, 'MPC', MockMPC)
+        MockMPC.queries = []
+
+        # two clusters of irregular epochs
+        rng = np.random.RandomState(0)
+        jd = np.r_[2458000.5 + rng.rand(1000) * 300,
+                   2459000.5 + rng.rand(1000) * 30]
+        rng.shuffle(jd)
+        epochs = Time(jd, format='jd', scale='utc')
+        eph = Ephem.from_mpc('Ceres', epochs=epochs,
+                             interpolate=0.1 * u.arcsec)
+        assert len(MockMPC.queries) < 20
+        assert np.allclose(eph['epoch'].jd, jd)
+        assert list(eph['Uncertainty information']) == ['N/A'] * 2000
+
+        ra, dec = MockMPC.position(jd)
+        dra = (eph['RA'].to_value('deg') - ra + 180) % 360 - 180
+        ddec = eph['Dec'].to_value('deg') - dec
+        error = np.hypot(dra * np.cos(np.radians(dec)), ddec) * u.deg
+        assert error.max() < 0.1 * u.arcsec
+
+        with pytest.raises(ValueError):
+            Ephem.from_mpc('Ceres', epochs=epochs, interpolate=1 * u.arcsec,
+                           ra_format={'sep': ':'})
+        with pytest.raises(ValueError):
+            Ephem.from_mpc('Ceres', epochs={'start': epochs[0],
+                                            'step': 1 * u.d, 'number': 10},
+                           interpolate=1 * u.arcsec)
+
+
+class MockOorb:
+    """Stand-in for the pyoorb extension module; ephemeris fields are
+    simple functions of orbital elements and epochs."""
+    err = 0
+
+    @staticmethod
+    def oorb_init(ephfile=None):
+        return 0
+
+    @staticmethod
+    def oorb_ephemeris_basic(orbits, location, epochs, dynmodel):
+        mjd = np.array([epoch[0] for epoch in epochs])
+        eph = np.empty((len(orbits), len(mjd), 11))
+        eph[..., 0] = mjd
+        for i in range(1, 11):
+            eph[..., i] = orbits[:, i:i + 1] + i * (mjd - 58000)
+        return eph, MockOorb.err
+
+
+@pytest.fixture
+def oorb(monkeypatch):
+    module = type('pyoorb', (), {'pyoorb': MockOorb})
+    monkeypatch.setattr(ephem, 'pyoorb', module)
+    monkeypatch.setitem(sys.modules, 'pyoorb', module)
+    for attr in ('ephfile', 'initialized', 'init_count'):
+        monkeypatch.setattr(OpenOrbSession, attr,
+                            getattr(OpenOrbSession, attr))
+    OpenOrbSession.reset()
+    monkeypatch.setattr(MockOorb, 'err', 0)
+    return MockOorb
+
+
+class TestEphemFromOorbMock:
+    @pytest.mark.skipif(
+        multiprocessing.get_start_method() != 'fork',
+        reason='worker processes must inherit the mocked pyoorb')
+    def test_workers(self, oorb):
+        n = 11
+        orbit = Orbit.from_dict({
+            'targetname': ['{}'.format(i) for i in range(n)],
+            'a': np.linspace(1, 3, n) * u.au, 'e': np.linspace(0, 0.5, n),
+            'incl': np.full(n, 10) * u.deg, 'Omega': np.arange(n) * u.deg,
+            'w': np.full(n, 30) * u.deg, 'M': np.full(n, 40) * u.deg,
+            'epoch': Time(np.full(n, 58000), format='mjd'),
+            'H': np.full(n, 15) * u.mag, 'G': np.full(n, 0.15)})
+        epochs = Time(58000 + np.arange(5), format='mjd')
+
+        eph1 = Ephem.from_oo(orbit, epochs, scope='basic')
+        Ephem.from_oo(orbit, epochs, scope='basic')
+        assert OpenOrbSession.init_count == 1
+        eph3 = Ephem.from_oo(orbit, epochs, scope='basic', workers=3)
+        assert len(eph3) == n * 5
+        assert eph3.table.colnames == eph1.table.colnames
+        assert list(eph3['targetname']) == list(eph1['targetname'])
+        for field in ('RA', 'r', 'trueanom'):
+            assert u.allclose(eph3[field], eph1[field])
+        assert np.allclose(eph3['epoch'].jd, eph1['epoch'].jd)
+
+    def test_error(self, oorb):
+        orbit = Orbit.from_dict({
+            'targetname': ['a'], 'a': [2] * u.au, 'e': [0.1],
+            'incl': [10] * u.deg, 'Omega': [0] * u.deg, 'w': [30] * u.deg,
+            'M': [40] * u.deg, 'epoch': Time([58000], format='mjd'),
+            'H': [15] * u.mag, 'G': [0.15]})
+        oorb.err = 1
+        with pytest.raises(OpenOrbError):
+            Ephem.from_oo(orbit, Time(58000, format='mjd'), scope='basic')
+
+
+class TestEphemFromOrbit2Body:
+
+    @pytest.fixture
+    def orbit(self):
+        return Orbit.from_dict({
+            'targetname': ['a', 'b'],
+            'a': [2, 2.5] * u.au, 'e': [0, 0.2], 'i': [0, 10] * u.deg,
+            'Omega': [0, 30] * u.deg, 'w': [0, 40] * u.deg,
+            'M': [90, 50] * u.deg,
+            'epoch': Time([2458000.5] * 2, format='jd', scale='tdb'),
+            'H': [10, 12] * u.mag, 'G': [0.15, 0.25]})
+
+    def test_geometry(self, orbit):
+        epochs = Time(2458000.5 + np.arange(3), format='jd', scale='tdb')
+        observer = {'x': [1, 1, 1] * u.au, 'y': [0, 0, 0] * u.au,
+                    'z': [0, 0, 0] * u.au}
+        eph = Ephem.from_orbit_2body(orbit, epochs, observer=observer)
+        assert len(eph) == 6
+        assert list(eph['targetname']) == ['a'] * 3 + ['b'] * 3
+        assert np.allclose((eph['epoch'][:3] - epochs).jd, 0)
+        assert set(eph.field_names) - {'targetname', 'epoch'} <= set(
+            conf.oorb_ephem_full_fields)
+        # rates require observer velocities
+        assert 'DEC_rate' not in eph.field_names
+
+        # light-time corrected target positions
+        lighttime = eph['Delta'].value / 173.1446326846693
+        emitted = Time(eph['epoch'].tdb.jd - lighttime, format='jd',
+                       scale='tdb')
+        state = orbit[[0, 0, 0, 1, 1, 1]].propagate_2body(
+            emitted).to_cartesian()
+        for k in ('x', 'y', 'z'):
+            assert_allclose(eph[k].value, state[k].value, atol=1e-12)
+
+        # circular orbit at the first epoch: target at (0, 2, 0) au
+        eph0 = eph[0]
+        assert_allclose(eph0['r'].value, 2)
+        assert_allclose(eph0['Delta'].value, np.sqrt(5), rtol=1e-4)
+        assert_allclose(eph0['alpha'].value, np.degrees(np.arctan(0.5)),
+                        rtol=1e-4)
+        assert_allclose(eph0['elong'].value,
+                        np.degrees(np.arctan(2)), rtol=1e-4)
+        assert_allclose(eph0['trueanom'].value, 90, rtol=1e-4)
+        assert_allclose(eph0['DEC'].value, np.degrees(np.arcsin(
+            2 * np.sin(np.radians(23.439291)) / np.sqrt(5))), rtol=1e-4)
+
+        # HG magnitudes
+        from ...photometry import HG
+        V = (HG.evaluate(np.radians(eph['alpha'].value), 12, 0.25) +
+             5 * np.log10(eph['r'].value * eph['Delta'].value))
+        assert_allclose(eph['V'][3:].value, V[3:])
+
+    def test_rates(self, orbit):
+        epochs = Time(2458000.5 + np.array([0, 1e-3, 2e-3]), format='jd',
+                      scale='tdb')
+        eph = Ephem.from_orbit_2body(orbit[1:], epochs)
+        assert_allclose(eph['r'].value, eph['r'][0].value, rtol=1e-4)
+        assert_allclose(np.sqrt(eph['obsx']**2 + eph['obsy']**2 +
+                                eph['obsz']**2).value, 1, atol=0.02)
+
+        dra = ((eph['RA'][2] - eph['RA'][0]).to_value('deg') / 2e-3 *
+               np.cos(eph['DEC'][1].to_value('rad')))
+        ddec = (eph['DEC'][2] - eph['DEC'][0]).to_value('deg') / 2e-3
+        assert_allclose(eph['RA*cos(Dec)_rate'][1].value, dra, rtol=1e-4)
+        assert_allclose(eph['DEC_rate'][1].value, ddec, rtol=1e-4)
+
+        # per-epoch observer positions may be provided
+        observer = eph[['obsx', 'obsy', 'obsz']]
+        observer.table.rename_columns(['obsx', 'obsy', 'obsz'],
+                                      ['x', 'y', 'z'])
+        eph2 = Ephem.from_orbit_2body(orbit[1:], epochs, observer=observer)
+        assert_allclose(eph2['RA'].value, eph['RA'].value)
+
+        with pytest.raises(ValueError):
+            Ephem.from_orbit_2body(orbit, epochs, location='G37')
+        with pytest.raises(ValueError):
+            Ephem.from_orbit_2body(orbit, epochs, observer=observer[:2])
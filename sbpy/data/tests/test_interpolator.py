@@ -0,0 +1,139 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+import pytest
+import numpy as np
+import astropy.units as u
+from astropy.time import Time
+
+from .. import (Orbit, Ephem, EphemerisInterpolator,
+                EphemerisInterpolatorWarning)
+
+
+@pytest.fixture
+def orbit():
+    return Orbit.from_dict({
+        'targetname': ['a', 'b'],
+        'a': [2, 2.5] * u.au, 'e': [0.1, 0.2], 'i': [5, 10] * u.deg,
+        'Omega': [0, 30] * u.deg, 'w': [0, 40] * u.deg,
+        'M': [90, 50] * u.deg,
+        'epoch': Time([2458000.5] * 2, format='jd', scale='tdb')})
+
+
+@pytest.fixture
+def interp(orbit):
+    epochs = Time(2458000.5 + np.arange(0, 400, 0.25), format='jd',
+                  scale='tdb')
+    eph = Ephem.from_orbit_2body(orbit, epochs)
+    return EphemerisInterpolator.from_ephem(eph)
+
+
+class TestEphemerisInterpolator:
+
+    def test_from_ephem(self, interp):
+        assert len(interp) == 2
+        assert list(interp.targetnames) == ['a', 'b']
+        assert interp.fields == ['RA', 'DEC', 'r', 'Delta', 'alpha']
+        assert interp.degree == 10
+        assert not interp.wrap.any()
+        for field, error in interp.max_error.items():
+            assert error <= EphemerisInterpolator.default_tol[field]
+        # segments are contiguous and cover the input epochs
+        for j in range(2):
+            s0, s1 = interp.offsets[j], interp.offsets[j + 1]
+            assert interp.t0[s0] == 2458000.5 - 2451545
+            assert interp.t1[s1 - 1] == 2458000.5 + 399.75 - 2451545
+            assert np.all(interp.t0[s0 + 1:s1] == interp.t1[s0:s1 - 1])
+
+    def test_evaluate(self, orbit, interp):
+        epochs = Time(2458000.5 + np.random.RandomState(0).rand(500) * 399.75,
+                      format='jd', scale='tdb')
+        expected = Ephem.from_orbit_2body(orbit, epochs)
+        eph = interp.evaluate(np.repeat(['a', 'b'], 500),
+                              Time(np.tile(epochs.jd, 2), format='jd',
+                                   scale='tdb'))
+        assert list(eph['targetname']) == list(expected['targetname'])
+        assert np.allclose((eph['epoch'] - expected['epoch']).jd, 0)
+
+        # errors are within the estimated error bounds
+        max_error = interp.max_error
+        cosdec = np.cos(expected['DEC'])
+        dra = (eph['RA'] - expected['RA'] + 180 * u.deg) % (
+            360 * u.deg) - 180 * u.deg
+        assert np.abs(dra * cosdec).max() <= max_error['RA']
+        assert eph['RA'].min() >= 0 * u.deg
+        assert eph['RA'].max() < 360 * u.deg
+        for field in ('DEC', 'r', 'Delta', 'alpha'):
+            assert (np.abs(eph[field] - expected[field]).max() <=
+                    max_error[field])
+
+        # broadcast target names and epochs, selected fields
+        eph = interp.evaluate('b', epochs[:3], fields=['Delta'])
+        assert eph.table.colnames == ['targetname', 'epoch', 'Delta']
+        assert u.allclose(eph['Delta'], expected['Delta'][500:503],
+                          atol=1e-8 * u.au)
+        eph = interp.evaluate(['a', 'b'], epochs[0].utc)
+        assert list(eph['targetname']) == ['a', 'b']
+        assert eph['epoch'].scale == 'utc'
+
+        with pytest.raises(KeyError):
+            interp.evaluate('c', epochs)
+        with pytest.raises(ValueError):
+            interp.evaluate('a', Time(2458000, format='jd', scale='tdb'))
+
+    def test_file(self, interp, tmpdir):
+        filename = str(tmpdir.join('interp.npz'))
+        interp.to_file(filename)
+        interp2 = EphemerisInterpolator.from_file(filename)
+        assert interp2.fields == interp.fields
+        assert interp2.units == interp.units
+        assert interp2.scale == 'tdb'
+        epochs = Time(2458100.5 + np.arange(10), format='jd', scale='tdb')
+        eph = interp.evaluate('a', epochs)
+        eph2 = interp2.evaluate('a', epochs)
+        for field in interp.fields:
+            assert np.all(eph[field] == eph2[field])
+
+    def test_tolerance(self, orbit):
+        epochs = Time(2458000.5 + np.arange(0, 400, 4), format='jd',
+                      scale='tdb')
+        eph = Ephem.from_orbit_2body(orbit, epochs)
+        with pytest.warns(EphemerisInterpolatorWarning):
+            EphemerisInterpolator.from_ephem(eph, fields=['RA', 'DEC'])
+        interp = EphemerisInterpolator.from_ephem(
+            eph, fields=['RA', 'DEC', 'elong'],
+            tol={'RA': 1 * u.arcsec, 'DEC': 1 * u.arcsec,
+                 'elong': 1 * u.arcsec})
+        assert interp.fields == ['RA', 'DEC', 'elong']
+
+        with pytest.raises(ValueError):
+            EphemerisInterpolator.from_ephem(eph, fields=['elong'])
+        with pytest.raises(ValueError):
+            EphemerisInterpolator.from_ephem(eph[:1])
+
+    def test_two_epochs(self, orbit, recwarn):
+        epochs = Time([2458000.5, 2458001.5], format='jd', scale='tdb')
+        eph = Ephem.from_orbit_2body(orbit, epochs)
+        interp = EphemerisInterpolator.from_ephem(eph, fields=['RA', 'DEC'])
+        assert len(recwarn) == 0
+        assert np.all(interp.error == 0)
+        eph2 = interp.evaluate(eph['targetname'], eph['epoch'])
+        assert u.allclose(eph2['RA'], eph['RA'], atol=1e-8 * u.deg)
+        assert u.allclose(eph2['DEC'], eph['DEC'], atol=1e-8 * u.deg)
+
+    def test_wrap(self):
+        # right ascension crossing 360 deg
+        epochs = Time(2458000.5 + np.arange(0, 20, 0.1), format='jd')
+        eph = Ephem.from_dict({
+            'targetname': ['a'] * 200, 'epoch': epochs,
+            'RA': (350 + np.arange(200) * 0.1) % 360 * u.deg,
+            'DEC': (-5 + np.arange(200) * 0.01) * u.deg})
+        interp = EphemerisInterpolator.from_ephem(eph)
+        assert interp.fields == ['RA', 'DEC']
+        assert list(interp.wrap) == [True, False]
+        eph2 = interp.evaluate('a', epochs)
+        dra = (eph2['RA'] - eph['RA'] + 180 * u.deg) % (
+            360 * u.deg) - 180 * u.deg
+        assert np.abs(dra).max() < 1e-8 * u.deg
+        assert eph2['RA'].min() >= 0 * u.deg
+        assert eph2['RA'].max() < 360 * u.deg
+        assert u.allclose(eph2['DEC'], eph['DEC'], atol=1e-8 * u.deg)
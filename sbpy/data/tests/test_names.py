@@ -1,6 +1,9 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 import pytest
+import numpy as np
 
+from .. import names
+from ..core import conf
 from ..names import Names, TargetNameParseError, natural_sort_key
 
 # name: expected result from parse_comet()
@@ -83,6 +86,39 @@ def test_asteroid_or_comet():
                 'failed for {}'.format(asteroid)
 
 
+def test_parse_many(monkeypatch):
+    """Bulk parsing agrees with parsing individual strings"""
+    targets = list(comets) + list(asteroids)
+    r = Names.parse_many(targets * 2)
+    assert r.shape == (2 * len(targets),)
+    for t, row in zip(targets * 2, r):
+        try:
+            nature = Names.asteroid_or_comet(t)
+        except TargetNameParseError:
+            assert row['type'] == ''
+            continue
+        assert row['type'] == nature
+        p = (Names.parse_comet(t) if nature == 'comet'
+             else Names.parse_asteroid(t))
+        assert row['number'] == p.get('number', 0)
+        assert row['desig'] == p.get('desig', '')
+        assert row['name'] == p.get('name', '')
+
+    # shape is retained
+    assert Names.parse_many([['2P/Encke'], ['(1) Ceres']]).shape == (2, 1)
+
+    # memoized results are not modified by callers
+    r = Names.parse_comet('2P/Encke')
+    r['number'] = 3
+    assert Names.parse_comet('2P/Encke')['number'] == 2
+
+    # the cache size follows the configuration
+    monkeypatch.setattr(conf, 'names_cache_size', 2)
+    Names.parse_many(['2P/Encke', '(1) Ceres', '(2) Pallas'])
+    assert names._memoized[1].cache_info().maxsize == 2
+    assert names._memoized[1].cache_info().currsize == 2
+
+
 def test_packed():
     """Test packed numbers and designations"""
     assert Names.to_packed('1995 XA') == 'J95X00A'
@@ -100,6 +136,32 @@ def test_packed():
     assert Names.from_packed('2000 AA') == '2000 AA'
 
 
+def test_packed_array():
+    """Vectorized packing is identical to packing individual strings"""
+    unpacked = ['1995 XA', '2007 TA418', '1995 AA1', '2011 FX12', '5',
+                '50000', '100345', '360017', '619999', '0012',
+                '1989 AB', '2000 Xa1', '2040 P-L']
+    packed = Names.to_packed(np.array(unpacked))
+    assert packed.tolist() == [Names.to_packed(s) for s in unpacked]
+    assert Names.to_packed(unpacked[:2]).tolist() == ['J95X00A',
+                                                      'K07Tf8A']
+
+    packed = ['J95X00A', 'K07Tf8A', 'K07T00A', 'j95X00A', 'J95X0jA',
+              '50000', 'A0345', 'a0017', 'j0017', 'G3693', '1989AB',
+              '2000 AA', 'PLS2040', 'T1S3138', 'J95X00', ' 0001']
+    unpacked = Names.from_packed(np.array(packed))
+    expected = [Names.from_packed(p) for p in packed]
+    assert unpacked.tolist() == expected
+    assert [type(u) for u in unpacked] == [type(e) for e in expected]
+
+    # shape is retained
+    assert Names.from_packed(np.array([['A0345'], ['J95X00A']])).shape == (
+        2, 1)
+
+    with pytest.raises(TargetNameParseError):
+        Names.to_packed(['1', '620000'])
+
+
 def test_parse_comet():
     """Test comet name parsing."""
 
@@ -0,0 +1,412 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+import os
+import sys
+import multiprocessing
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+import astropy.units as u
+from astropy.time import Time
+
+from ..core import conf
+from ..orbit import Orbit, OrbitError, OpenOrbError, OpenOrbSession
+
+try:
+    import pyoorb
+    HAS_PYOORB = True
+except ImportError:
+    HAS_PYOORB = False
+
+
+class TestToOO:
+
+    def test_kep(self):
+        orbit = Orbit.from_dict({
+            'targetname': ['a', 'b'],
+            'a': [1, 2] * u.au, 'e': [0.1, 0.2], 'incl': [180, 90] * u.deg,
+            'Omega': [0, 1] * u.rad, 'w': [0, 90] * u.deg,
+            'M': [45, 0] * u.deg,
+            'epoch': Time([58000, 58001], format='mjd', scale='utc'),
+            'H': [10, 12] * u.mag, 'G': [0.15, 0.2]})
+        oo = orbit._to_oo()
+        assert oo.flags['F_CONTIGUOUS']
+        assert_allclose(oo, [
+            [0, 1, 0.1, np.pi, 0, 0, np.pi / 4, 3, 58000, 1, 10, 0.15],
+            [1, 2, 0.2, np.pi / 2, 1, np.pi / 2, 0, 3, 58001, 1, 12, 0.2]])
+
+    def test_com_timescale(self):
+        orbit = Orbit.from_dict({
+            'q': [1] * u.au, 'e': [0.5], 'i': [10] * u.deg,
+            'Omega': [20] * u.deg, 'w': [30] * u.deg,
+            'Tp_jd': [2458000.5] * u.d,
+            'epoch': Time([2458001.5], format='jd', scale='tdb'),
+            'H': [15] * u.mag, 'G': [0.15]})
+        with pytest.warns(UserWarning):
+            oo = orbit._to_oo()
+        assert orbit['targetname'][0] == 'orbit_0'
+        assert oo[0, 7] == conf.oorb_elemType['COM']
+        assert_allclose(oo[0, 1:7], [1, 0.5] + list(np.radians(
+            [10, 20, 30])) + [58000])
+        assert oo[0, 9] == conf.oorb_timeScales['TT']
+        assert_allclose(oo[0, 8], orbit['epoch'].tt.mjd[0])
+
+    def test_mixed(self):
+        # heterogeneous orbit types and time scales
+        epochs = Time([58000, 58000], format='mjd', scale='utc')
+        orbit = Orbit.from_dict({
+            'orbtype': ['KEP', 'CART'],
+            'a': [1, np.nan] * u.au, 'e': [0.1, np.nan],
+            'incl': [10, np.nan] * u.deg, 'Omega': [20, np.nan] * u.deg,
+            'w': [30, np.nan] * u.deg, 'M': [40, np.nan] * u.deg,
+            'x': [np.nan, 1] * u.au, 'y': [np.nan, 2] * u.au,
+            'z': [np.nan, 3] * u.au, 'vx': [np.nan, 0.1] * u.au / u.d,
+            'vy': [np.nan, 0.2] * u.au / u.d,
+            'vz': [np.nan, 0.3] * u.au / u.d,
+            'epoch': epochs, 'epoch_scale': ['UTC', 'TT'],
+            'H': [10, 12] * u.mag, 'G': [0.15, 0.2]})
+        oo = orbit._to_oo()
+        assert_allclose(oo[:, 7], [3, 1])
+        assert_allclose(oo[0, 1:7], [1, 0.1] + list(np.radians(
+            [10, 20, 30, 40])))
+        assert_allclose(oo[1, 1:7], [1, 2, 3, 0.1, 0.2, 0.3])
+        assert_allclose(oo[:, 9], [1, 3])
+        assert_allclose(oo[:, 8], [58000, epochs[1].tt.mjd])
+
+        # pyoorb codes are accepted as well
+        orbit.table['orbtype'] = [3, 1]
+        orbit.table['epoch_scale'] = [1., 3.]
+        assert_allclose(orbit._to_oo(), oo)
+
+    def test_errors(self):
+        orbit = Orbit.from_dict({'targetname': ['a'], 'a': [1] * u.au,
+                                 'epoch': [58000] * u.d})
+        with pytest.raises(OrbitError):
+            orbit._to_oo()
+
+        orbit = Orbit.from_dict({
+            'a': [1] * u.au, 'e': [0.1], 'incl': [10] * u.deg,
+            'Omega': [20] * u.deg, 'w': [30] * u.deg, 'M': [40] * u.deg,
+            'epoch': [58000] * u.d, 'H': [10] * u.mag, 'G': [0.15]})
+        with pytest.raises(OrbitError):
+            orbit._to_oo()
+
+
+class MockOorbInit:
+    """Stand-in for the pyoorb extension module recording
+    initializations."""
+    calls = []
+    err = 0
+
+    @classmethod
+    def oorb_init(cls, ephfile=None):
+        cls.calls.append(ephfile)
+        return cls.err
+
+
+def test_open_orb_session(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyoorb',
+                        type('pyoorb', (), {'pyoorb': MockOorbInit}))
+    monkeypatch.setenv('OORB_DATA', 'data')
+    for attr in ('ephfile', 'initialized', 'init_count'):
+        monkeypatch.setattr(OpenOrbSession, attr,
+                            getattr(OpenOrbSession, attr))
+    monkeypatch.setattr(MockOorbInit, 'calls', [])
+    OpenOrbSession.reset()
+    count = OpenOrbSession.init_count
+
+    # initialize once per ephemeris file
+    for ephfile in ('de430', 'de430', 'de405', 'de405', 'de430'):
+        OpenOrbSession.init(ephfile)
+    assert OpenOrbSession.init_count == count + 3
+    assert MockOorbInit.calls == [os.path.join('data', 'de430.dat'),
+                                  os.path.join('data', 'de405.dat'),
+                                  os.path.join('data', 'de430.dat')]
+    assert OpenOrbSession.ephfile == os.path.join('data', 'de430.dat')
+
+    # without OORB_DATA, pyoorb uses its default ephemeris file
+    monkeypatch.delenv('OORB_DATA')
+    OpenOrbSession.init()
+    OpenOrbSession.init('de405')
+    assert MockOorbInit.calls[-1] is None
+    assert OpenOrbSession.init_count == count + 4
+
+    monkeypatch.setattr(MockOorbInit, 'err', 1)
+    OpenOrbSession.reset()
+    with pytest.raises(OpenOrbError):
+        OpenOrbSession.init()
+    assert not OpenOrbSession.initialized
+
+
+class MockOorbPropagation(MockOorbInit):
+    """Stand-in for the pyoorb extension module propagating Keplerian
+    orbits on two-body orbits and recording propagations."""
+    propagations = []
+
+    @classmethod
+    def oorb_propagation(cls, in_orbits, in_epoch, in_dynmodel):
+        cls.propagations.append((in_orbits[:, 8].tolist(), in_epoch[0]))
+        out = np.array(in_orbits)
+        n = np.sqrt(0.01720209895**2 / out[:, 1]**3)
+        out[:, 6] = (out[:, 6] + n * (in_epoch[0] - out[:, 8])) % (
+            2 * np.pi)
+        out[:, 8] = in_epoch[0]
+        out[:, 9] = in_epoch[1]
+        return out, cls.err
+
+    @classmethod
+    def oorb_element_transformation(cls, in_orbits, in_element_type):
+        return np.array(in_orbits), cls.err
+
+
+class TestOOPropagateMany:
+
+    @pytest.fixture
+    def orbit(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'pyoorb',
+                            type('pyoorb', (), {
+                                'pyoorb': MockOorbPropagation}))
+        monkeypatch.delenv('OORB_DATA', raising=False)
+        for attr in ('ephfile', 'initialized', 'init_count'):
+            monkeypatch.setattr(OpenOrbSession, attr,
+                                getattr(OpenOrbSession, attr))
+        monkeypatch.setattr(MockOorbPropagation, 'propagations', [])
+        monkeypatch.setattr(MockOorbPropagation, 'err', 0)
+        OpenOrbSession.reset()
+        return Orbit.from_dict({
+            'targetname': ['a', 'b', 'c'],
+            'a': [2, 3, 1.5] * u.au, 'e': [0.1, 0.5, 0],
+            'i': [10, 120, 0] * u.deg, 'Omega': [20, 30, 0] * u.deg,
+            'w': [40, 50, 0] * u.deg, 'M': [60, 10, 5] * u.deg,
+            'epoch': Time([58000] * 3, format='mjd', scale='tt'),
+            'H': [10, 12, 14] * u.mag, 'G': [0.15] * 3})
+
+    def test_chains(self, orbit):
+        epochs = Time([58010, 57990, 58020, 58000.5, 57980], format='mjd',
+                      scale='tt')
+        done = []
+        prop = orbit.oo_propagate_many(
+            epochs, progress=lambda *args: done.append(args))
+        assert OpenOrbSession.init_count == 1
+
+        # backward and forward chains from the orbit epoch
+        assert [(start[0], end) for start, end in
+                MockOorbPropagation.propagations] == [
+            (58000, 57990), (57990, 57980), (58000, 58000.5),
+            (58000.5, 58010), (58010, 58020)]
+        assert done == [(3 * i, 15) for i in range(1, 6)]
+
+        # rows are ordered by epoch, then orbit
+        assert len(prop) == 15
+        assert list(prop['id']) == ['a', 'b', 'c'] * 5
+        assert_allclose(prop['epoch'].mjd, np.repeat(epochs.mjd, 3))
+        assert prop['epoch'].scale == 'tt'
+        assert prop['M'].unit == u.deg
+        assert_allclose(prop['a'].value, [2, 3, 1.5] * 5)
+        expected = orbit.propagate_2body(epochs[2])
+        assert_allclose(prop['M'][6:9].value, expected['M'].value)
+        assert 'epoch_scale' not in prop.field_names
+
+        # identical to propagations to individual epochs
+        single = orbit.oo_propagate(epochs[3])
+        for field in ('a', 'e', 'incl', 'Omega', 'w', 'M'):
+            assert_allclose(u.Quantity(single[field]).value,
+                            u.Quantity(prop[field][9:12]).value)
+
+    @pytest.mark.skipif(
+        multiprocessing.get_start_method() != 'fork',
+        reason='worker processes must inherit the mocked pyoorb')
+    def test_workers(self, orbit):
+        epochs = Time(58000 + np.arange(-10, 30, 10), format='mjd',
+                      scale='tt')
+        prop = orbit.oo_propagate_many(epochs)
+        done = []
+        sharded = orbit.oo_propagate_many(
+            epochs, workers=2, progress=lambda *args: done.append(args))
+        assert list(sharded['id']) == list(prop['id'])
+        for field in ('a', 'e', 'incl', 'Omega', 'w', 'M'):
+            assert_allclose(u.Quantity(sharded[field]).value,
+                            u.Quantity(prop[field]).value)
+        assert done[-1] == (12, 12)
+
+    def test_error(self, orbit):
+        # pyoorb is initialized, then fails
+        OpenOrbSession.init()
+        MockOorbPropagation.err = 1
+        with pytest.raises(OpenOrbError):
+            orbit.oo_propagate_many(Time([58010], format='mjd', scale='tt'))
+        with pytest.raises(OpenOrbError):
+            orbit.oo_transform('COM')
+
+
+class TestTwoBody:
+
+    @pytest.fixture
+    def orbit(self):
+        return Orbit.from_dict({
+            'targetname': ['a', 'b', 'c'],
+            'a': [2, -3, 1.5] * u.au, 'e': [0.1, 1.5, 0],
+            'i': [10, 120, 0] * u.deg, 'Omega': [20, 30, 0] * u.deg,
+            'w': [40, 50, 0] * u.deg, 'M': [60, -10, 5] * u.deg,
+            'epoch': Time([2458000.5] * 3, format='jd', scale='tdb'),
+            'H': [10, 12, 14] * u.mag})
+
+    def test_to_cartesian(self, orbit):
+        state = orbit.to_cartesian()
+        assert list(state.field_names[:7]) == [
+            'targetname', 'x', 'y', 'z', 'vx', 'vy', 'vz']
+        assert 'a' not in state.field_names
+        assert all(state['H'] == orbit['H'])
+        r = np.sqrt(state['x']**2 + state['y']**2 + state['z']**2)
+
+        # circular equatorial orbit
+        assert_allclose(r[2], 1.5 * u.au)
+        assert_allclose([state['x'][2].value, state['y'][2].value],
+                        [1.5 * np.cos(np.radians(5)),
+                         1.5 * np.sin(np.radians(5))])
+
+        # distance from the Kepler equation
+        M = np.radians(60)
+        E = M
+        for i in range(20):
+            E -= (E - 0.1 * np.sin(E) - M) / (1 - 0.1 * np.cos(E))
+        assert_allclose(r[0], 2 * (1 - 0.1 * np.cos(E)) * u.au)
+
+    def test_from_cartesian(self, orbit):
+        state = orbit.to_cartesian()
+        kep = Orbit.from_cartesian(state)
+        for field in ('a', 'e', 'incl', 'Omega', 'w', 'H'):
+            assert_allclose(u.Quantity(kep[field]).value,
+                            u.Quantity(orbit[field]).value, atol=1e-10)
+        assert_allclose(kep['M'], [60, -10, 5] * u.deg)
+        assert kep['M'].unit == u.deg
+
+        com = Orbit.from_cartesian(state, orbittype='COM')
+        assert_allclose(com['q'], [1.8, 1.5, 1.5] * u.au)
+        n = np.sqrt(0.01720209895**2 / 8)
+        assert_allclose(com['Tp_jd'][0],
+                        (2458000.5 - np.radians(60) / n) * u.d)
+        assert_allclose(com.to_cartesian()['vz'].value, state['vz'].value,
+                        atol=1e-15)
+
+        with pytest.raises(OrbitError):
+            Orbit.from_cartesian(state, orbittype='CART')
+
+    def test_transform(self, orbit):
+        com = orbit.transform('COM')
+        assert_allclose(com['q'], [1.8, 1.5, 1.5] * u.au)
+        assert all(com['H'] == orbit['H'])
+        n = np.sqrt(0.01720209895**2 / np.abs([2, -3, 1.5])**3)
+        assert_allclose(com['Tp_jd'],
+                        (2458000.5 - np.radians([60, -10, 5]) / n) * u.d)
+        ref = Orbit.from_cartesian(orbit.to_cartesian(), 'COM')
+        for field in ('q', 'e', 'incl', 'Omega', 'w', 'Tp_jd'):
+            assert_allclose(u.Quantity(com[field]).value,
+                            u.Quantity(ref[field]).value, atol=1e-8)
+
+        # round trips through all orbit types
+        for orbittype in ('KEP', 'COM', 'CART'):
+            kep = orbit.transform(orbittype).transform('KEP')
+            for field in ('a', 'e', 'incl', 'Omega', 'w', 'M'):
+                assert_allclose(u.Quantity(kep[field]).value,
+                                u.Quantity(orbit[field]).value, atol=1e-8)
+        assert kep['M'].unit == u.deg
+
+        # radians and epochs in other time scales
+        rad = Orbit.from_dict({
+            'a': 2 * u.au, 'e': 0.1, 'i': np.radians(10) * u.rad,
+            'Omega': np.radians(20) * u.rad, 'w': np.radians(40) * u.rad,
+            'M': np.radians(60) * u.rad,
+            'epoch': Time(2458000.5, format='jd', scale='tdb').utc})
+        com = rad.transform('COM')
+        assert com['i'].unit == u.deg
+        assert_allclose(com['i'], 10 * u.deg)
+        assert_allclose(com['Tp_jd'][0], (2458000.5 - np.radians(60) / n[0])
+                        * u.d)
+
+        # nearest perihelion passage, as for cartesian elements
+        late = Orbit.from_dict({
+            'a': 5 * u.au, 'e': 0.3, 'i': 10 * u.deg, 'Omega': 20 * u.deg,
+            'w': 40 * u.deg, 'M': 270 * u.deg,
+            'epoch': Time(2458000.5, format='jd', scale='tdb')})
+        com = late.transform('COM')
+        ref = late.transform('CART').transform('COM')
+        assert_allclose(com['Tp_jd'][0].value, ref['Tp_jd'][0].value,
+                        atol=1e-6)
+        assert com['Tp_jd'][0].value > 2458000.5
+
+        with pytest.raises(OrbitError):
+            orbit.transform('EQX')
+
+    def test_moid(self, orbit):
+        moid = orbit.moid('earth')
+        assert moid.unit == u.au
+        # all orbit types agree
+        for orbittype in ('COM', 'CART'):
+            assert_allclose(orbit.transform(orbittype).moid('Earth'), moid)
+        # circular equatorial orbit
+        a, e = conf.planet_elements['earth'][:2]
+        assert_allclose(moid[2], (1.5 - a * (1 + e)) * u.au)
+
+        # single orbit or one orbit per orbit
+        assert_allclose(orbit.moid(orbit[:1])[0], 0 * u.au, atol=1e-12)
+        assert_allclose(orbit.moid(orbit), 0 * u.au, atol=1e-12)
+
+        with pytest.raises(OrbitError):
+            orbit.moid('pluto')
+        with pytest.raises(OrbitError):
+            orbit.moid(orbit[:2])
+
+    def test_tisserand(self, orbit):
+        tj = orbit.tisserand()
+        a, e, incl, Omega, w = conf.planet_elements['jupiter']
+        assert_allclose(tj[2], a / 1.5 + 2 * np.cos(np.radians(incl)) *
+                        np.sqrt(1.5 / a))
+        assert_allclose(orbit.transform('COM').tisserand(), tj)
+        assert_allclose(orbit.to_cartesian().tisserand(), tj)
+
+        # with respect to a circular orbit in the ecliptic
+        circ = Orbit.from_dict({
+            'a': 5 * u.au, 'e': 0, 'i': 0 * u.deg, 'Omega': 0 * u.deg,
+            'w': 0 * u.deg, 'M': 0 * u.deg})
+        assert_allclose(orbit.tisserand(circ),
+                        5 / np.array([2, -3, 1.5]) + 2 * np.cos(
+                            np.radians([10, 120, 0])) * np.sqrt(
+                                np.array([2 * 0.99, 3 * 1.25, 1.5]) / 5))
+
+    @pytest.mark.skipif('not HAS_PYOORB')
+    def test_transform_pyoorb(self, orbit):
+        for orbittype in ('COM', 'CART'):
+            ref = orbit[:1].oo_transform(orbittype)
+            other = orbit[:1].transform(orbittype)
+            for field in conf.oorb_orbit_fields[orbittype][1:7]:
+                assert_allclose(u.Quantity(other[field]).value,
+                                u.Quantity(ref[field]).value, rtol=1e-8)
+
+    def test_propagate_2body(self, orbit):
+        t = Time(2458500.5, format='jd', scale='tdb')
+        kep = orbit.propagate_2body(t)
+        assert all(kep['epoch'] == t)
+        n = np.degrees(np.sqrt(0.01720209895**2 / np.abs([2, -3, 1.5])**3))
+        assert_allclose(kep['M'].value, [(60 + 500 * n[0]) % 360,
+                                         -10 + 500 * n[1],
+                                         (5 + 500 * n[2]) % 360])
+
+        # all orbit types agree
+        state = orbit.to_cartesian().propagate_2body(t)
+        com = Orbit.from_cartesian(orbit.to_cartesian(), 'COM')
+        for other in (kep, com.propagate_2body(t)):
+            other = other.to_cartesian()
+            for field in ('x', 'y', 'z', 'vx', 'vy', 'vz'):
+                assert_allclose(u.Quantity(other[field]).value,
+                                u.Quantity(state[field]).value, atol=1e-10)
+
+        # one epoch per orbit
+        epochs = Time([2458000.5, 2458500.5, 2458500.5], format='jd',
+                      scale='tdb')
+        state = orbit.to_cartesian().propagate_2body(epochs)
+        assert_allclose(state['x'][0], orbit.to_cartesian()['x'][0])
+
+        with pytest.raises(OrbitError):
+            orbit.propagate_2body(epochs[:2])
@@ -0,0 +1,119 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+import astropy.units as u
+
+from ... import exceptions as sbe
+from .. import Orbit, OrbitIndex
+from ..orbit import OrbitError
+from ..orbitindex import southworth_hawkins, drummond
+
+try:
+    import scipy
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+
+@pytest.fixture
+def orbit():
+    rng = np.random.RandomState(0)
+    n = 300
+    return Orbit.from_dict({
+        'targetname': ['o{}'.format(i) for i in range(n)],
+        'q': rng.uniform(1, 3, n) * u.au, 'e': rng.uniform(0, 0.5, n),
+        'i': rng.uniform(0, 30, n) * u.deg,
+        'Omega': rng.uniform(0, 360, n) * u.deg,
+        'w': rng.uniform(0, 360, n) * u.deg,
+        'Tp_jd': np.full(n, 2458000.5) * u.d,
+        'epoch': np.full(n, 2458000.5) * u.d})
+
+
+def test_d_criteria():
+    # coplanar orbits
+    el1 = (1, 0.1, 0, 0, 0)
+    el2 = (1.1, 0.2, 0, 0, np.radians(10))
+    assert_allclose(southworth_hawkins(el1, el2),
+                    np.sqrt(0.02 + (0.3 * np.sin(np.radians(5)))**2))
+    assert_allclose(drummond(el1, el2),
+                    np.sqrt(1 / 9 + (0.1 / 2.1)**2 + (0.15 / 18)**2))
+    # perihelion directions on the line of nodes
+    el2 = (1, 0.1, np.radians(10), 0, 0)
+    assert_allclose(southworth_hawkins(el1, el2), 2 * np.sin(np.radians(5)))
+    assert_allclose(drummond(el1, el2), 1 / 18)
+    # longitudes of perihelion from the line of nodes
+    el2 = (1, 0.1, 0, np.radians(350), np.radians(20))
+    assert_allclose(southworth_hawkins(el1, el2),
+                    0.2 * np.sin(np.radians(5)))
+
+    # identical, circular orbits
+    assert_allclose(drummond((1, 0, 0, 1, 2), (1, 0, 0, 1, 2)), 0)
+
+    # symmetry, broadcasting
+    rng = np.random.RandomState(1)
+    el1 = [rng.uniform(0, 1, 10) for i in range(5)]
+    el2 = [rng.uniform(0, 1, 10) for i in range(5)]
+    for criterion in (southworth_hawkins, drummond):
+        assert_allclose(criterion(el1, el2), criterion(el2, el1))
+        assert criterion(el1, [x[0] for x in el2]).shape == (10,)
+
+
+def test_similar_to(orbit):
+    similar = orbit.similar_to(orbit[3], 0.3)
+    assert similar['targetname'][0] == 'o3'
+    assert similar['D_SH'][0] == 0
+    assert np.all(np.diff(similar['D_SH']) >= 0)
+    D = southworth_hawkins(orbit._cometary(), orbit[3]._cometary())
+    assert len(similar) == np.sum(D <= 0.3)
+
+    similar = orbit.similar_to(orbit[3], 0.3, criterion='D')
+    assert len(similar) == np.sum(
+        drummond(orbit._cometary(), orbit[3]._cometary()) <= 0.3)
+
+    with pytest.raises(OrbitError):
+        orbit.similar_to(orbit[:2], 0.3)
+    with pytest.raises(ValueError):
+        orbit.similar_to(orbit[3], 0.3, criterion='X')
+
+
+@pytest.mark.skipif('not HAS_SCIPY')
+class TestOrbitIndex:
+
+    @pytest.mark.parametrize('criterion', ('SH', 'D'))
+    def test_pairs(self, orbit, criterion):
+        index = OrbitIndex(orbit, criterion=criterion)
+        assert len(index) == 300
+        i, j = np.triu_indices(300, 1)
+        D = index.distance(i, j)
+        for dmax in (0.2, 0.5):
+            i1, j1, D1 = index.pairs(dmax)
+            assert list(zip(i1, j1)) == list(zip(i[D <= dmax],
+                                                 j[D <= dmax]))
+            assert_allclose(D1, D[D <= dmax])
+
+    @pytest.mark.parametrize('criterion', ('SH', 'D'))
+    def test_similar_to(self, orbit, criterion):
+        index = OrbitIndex(orbit, criterion=criterion)
+        iref, i, D = index.similar_to(orbit[[3, 5]], 0.3)
+        for k in (0, 1):
+            expected = orbit.similar_to(orbit[[3, 5][k]], 0.3,
+                                        criterion=criterion)
+            assert list(orbit['targetname'][i[iref == k]]) == list(
+                expected['targetname'])
+            assert_allclose(D[iref == k], expected['D_' + criterion])
+
+        similar = orbit.similar_to(orbit[5], 0.3, index=index)
+        assert list(similar['targetname']) == list(expected['targetname'])
+
+    def test_errors(self, orbit):
+        with pytest.raises(ValueError):
+            OrbitIndex(orbit, criterion='X')
+
+
+def test_no_scipy(orbit, monkeypatch):
+    from .. import orbitindex
+    monkeypatch.setattr(orbitindex, 'scipy', None)
+    with pytest.raises(sbe.RequiredPackageUnavailable):
+        OrbitIndex(orbit)
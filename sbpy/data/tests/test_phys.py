@@ -0,0 +1,108 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+from collections import OrderedDict
+
+import pytest
+import numpy as np
+import astropy.units as u
+
+from .. import phys
+from .. import Phys, JPLSpecCatalog
+from ..phys import JPLSpecQueryFailed
+
+
+class MockSBDB:
+    """Stand-in for `astroquery.jplsbdb.SBDB`."""
+    queries = 0
+
+    @classmethod
+    def query(cls, targetid, phys=False):
+        cls.queries += 1
+        i = int(targetid)
+        phys_par = OrderedDict([
+            ('H', 10 + i * 0.1),
+            ('H_ref', 'MPC'),
+            ('diameter', (i + 1) * u.km if i % 2 else (i + 1) * 1000 * u.m),
+            ('albedo', 0.1 if i % 2 else 'None'),
+        ])
+        if i % 3 == 0:
+            phys_par['GM'] = 0.01 * u.km**3 / u.s**2
+        return {'object': {'fullname': '{} Object'.format(i)},
+                'phys_par': phys_par}
+
+
+@pytest.fixture
+def sbdb(monkeypatch):
+    MockSBDB.queries = 0
+    monkeypatch.setattr(phys, 'SBDB', MockSBDB)
+    return MockSBDB
+
+
+@pytest.mark.parametrize('max_workers', (1, 4))
+def test_from_sbdb(sbdb, max_workers):
+    data = Phys.from_sbdb(list(range(10)), max_workers=max_workers)
+    assert sbdb.queries == 10
+    assert list(data['targetname']) == ['{} Object'.format(i)
+                                        for i in range(10)]
+    assert np.allclose(data['H'], 10 + np.arange(10) * 0.1)
+    assert list(data['H_ref']) == ['MPC'] * 10
+
+    # units are converted column-wise to the first unit encountered
+    assert data['diameter'].unit == u.m
+    assert u.allclose(data['diameter'], (np.arange(10) + 1) * u.km)
+
+    # missing values are nan
+    assert np.isnan(data['albedo'][::2]).all()
+    assert np.allclose(data['albedo'][1::2], 0.1)
+    assert data['GM'].unit == u.km**3 / u.s**2
+    assert np.isnan(data['GM'].value[[1, 2, 4, 5, 7, 8]]).all()
+    assert u.allclose(data['GM'][::3], 0.01 * u.km**3 / u.s**2)
+
+
+# card images from the catalog file of CO (c028001.cat)
+CO_CAT = """\
+  345795.9899  0.0005 -3.6118 2   11.5350  7 -28001 101 3 2
+  115271.2018  0.0005 -5.0105 2    0.0000  3 -28001 101 1 0
+  230538.0000  0.0005 -4.1197 2    3.8450  5 -28001 101 2 1
+"""
+
+
+@pytest.fixture
+def co_catalog(tmpdir):
+    filename = str(tmpdir.join('c028001.cat'))
+    with open(filename, 'w') as outf:
+        outf.write(CO_CAT)
+    return JPLSpecCatalog.from_file(filename)
+
+
+def test_jplspec_catalog(co_catalog):
+    assert co_catalog.tags == [28001]
+    assert JPLSpecCatalog.resolve('^CO$') == 28001
+    assert JPLSpecCatalog.species_table() is JPLSpecCatalog.species_table()
+    with pytest.raises(JPLSpecQueryFailed):
+        JPLSpecCatalog.resolve('CO')
+
+    lines = co_catalog.lines(28001, 100 * u.GHz, 230538 * u.MHz)
+    assert list(lines['FREQ']) == [115271.2018, 230538.0]
+    assert len(co_catalog.lines('^CO$', 1 * u.GHz, 2 * u.GHz)) == 0
+
+    line = co_catalog.nearest(28001, 300 * u.GHz)
+    assert line['FREQ'] == 345795.9899
+    assert line['GUP'] == 7
+    assert co_catalog.nearest(18003, 300 * u.GHz) is None
+
+
+def test_from_jplspec_catalog(co_catalog):
+    mol_data = Phys.from_jplspec(47 * u.K, 230.53799 * u.GHz, '^CO$',
+                                 catalog=co_catalog)
+    assert mol_data['mol_tag'][0] == 28001
+    assert u.isclose(mol_data['t_freq'][0], 230538 * u.MHz)
+    assert u.isclose(mol_data['lgint300'][0],
+                     10**-4.1197 * u.nm**2 * u.MHz)
+    assert mol_data['dgup'][0] == 5
+    assert mol_data['degfreedom'][0] == 2
+    assert u.isclose(mol_data['elo_J'][0],
+                     (3.845 / u.cm).to(u.J, u.spectral()))
+
+    with pytest.raises(JPLSpecQueryFailed):
+        Phys.from_jplspec(47 * u.K, 250 * u.GHz, 28001, catalog=co_catalog)
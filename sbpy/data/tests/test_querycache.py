@@ -0,0 +1,148 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+import os
+import time
+
+import pytest
+import numpy as np
+import astropy.units as u
+from astropy.time import Time
+from astropy.table import Table
+from requests.exceptions import ConnectionError
+
+from .. import Ephem, QueryCache, query_cache, QueryCacheWarning, QueryError
+from ..querycache import fetch_all
+
+
+def test_key():
+    epochs = Time([2458000.5, 2458001.5], format='jd', scale='utc')
+    k = QueryCache.key('jplhorizons', targetid='Ceres', epochs=epochs,
+                       kwargs={'a': 1, 'b': 2})
+    assert k == QueryCache.key('jplhorizons', kwargs={'b': 2, 'a': 1},
+                               epochs=epochs.copy(), targetid='Ceres')
+    assert k != QueryCache.key('jplhorizons', targetid='Ceres',
+                               epochs=epochs + 1 * u.s,
+                               kwargs={'a': 1, 'b': 2})
+    assert k != QueryCache.key('mpc', targetid='Ceres', epochs=epochs,
+                               kwargs={'a': 1, 'b': 2})
+
+
+def test_from_horizons(tmpdir, horizons):
+    epochs = Time([2458000.5, 2458001.5], format='jd', scale='utc')
+    eph0 = Ephem.from_horizons(['Ceres', 'Pallas'], epochs=epochs)
+
+    cache = QueryCache(str(tmpdir))
+    with query_cache.set(cache):
+        eph1 = Ephem.from_horizons(['Ceres', 'Pallas'], epochs=epochs)
+        assert horizons.queries == 4
+        eph2 = Ephem.from_horizons(['Ceres', 'Pallas'], epochs=epochs)
+        assert horizons.queries == 4
+        Ephem.from_horizons('Ceres', epochs=epochs[:1])
+        assert horizons.queries == 5
+
+    assert eph1.table.colnames == eph0.table.colnames
+    assert eph2.table.colnames == eph0.table.colnames
+    assert all(eph2['targetname'] == eph0['targetname'])
+    assert u.allclose(eph2['RA'], eph0['RA'])
+    assert np.allclose((eph2['epoch'] - eph0['epoch']).jd, 0)
+
+    # cache is not used when it is not set
+    Ephem.from_horizons(['Ceres', 'Pallas'], epochs=epochs)
+    assert horizons.queries == 7
+
+
+def test_offline(tmpdir, horizons):
+    epochs = Time(2458000.5, format='jd', scale='utc')
+    with query_cache.set(str(tmpdir)):
+        Ephem.from_horizons('Ceres', epochs=epochs)
+
+    with query_cache.set(QueryCache(str(tmpdir), offline=True)):
+        eph = Ephem.from_horizons('Ceres', epochs=epochs)
+        assert eph['targetname'][0] == 'Ceres'
+        with pytest.raises(QueryError):
+            Ephem.from_horizons('Pallas', epochs=epochs)
+    assert horizons.queries == 1
+
+
+def test_ttl(tmpdir):
+    cache = QueryCache(str(tmpdir), ttl=1 * u.hour)
+    key = cache.key('test', targetid=1)
+    cache.put(key, Table({'a': [1, 2]}))
+    assert list(cache.get(key)['a']) == [1, 2]
+
+    # age the entry beyond its time-to-live
+    index = os.path.join(str(tmpdir), key, 'columns.json')
+    past = time.time() - 7200
+    os.utime(index, (past, past))
+    assert cache.get(key) is None
+    assert not os.path.exists(os.path.join(str(tmpdir), key))
+
+
+def test_lru(tmpdir):
+    cache = QueryCache(str(tmpdir))
+    keys = [cache.key('test', targetid=i) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, Table({'a': np.arange(1000)}))
+        past = time.time() - 100 + i
+        os.utime(os.path.join(str(tmpdir), key), (past, past))
+    size = cache.size
+
+    # access oldest entry, then shrink the cache to two entries
+    cache.get(keys[0])
+    cache.max_size = size * 2 / 3
+    cache.evict()
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+    cache.clear()
+    assert cache.size == 0 * u.byte
+
+
+def test_not_serializable(tmpdir):
+    cache = QueryCache(str(tmpdir))
+    key = cache.key('test')
+    with pytest.warns(QueryCacheWarning):
+        cache.put(key, Table({'a': [1]}, meta={'b': object()}))
+    assert cache.get(key) is None
+
+
+def test_query_cache_validate(tmpdir):
+    with query_cache.set(str(tmpdir)):
+        assert isinstance(query_cache.get(), QueryCache)
+    assert query_cache.get() is None
+    with pytest.raises(TypeError):
+        query_cache.set(1)
+
+
+def test_fetch_all():
+    def fetch(i):
+        time.sleep(0.01 * (5 - i))
+        return i
+
+    assert fetch_all(fetch, range(5)) == list(range(5))
+    assert fetch_all(fetch, range(5), max_workers=5) == list(range(5))
+
+
+def test_from_horizons_concurrent(horizons):
+    targets = ['{}'.format(i) for i in range(20)]
+    epochs = Time([2458000.5, 2458001.5], format='jd', scale='utc')
+    horizons.delay = 0.05
+    eph = Ephem.from_horizons(targets, epochs=epochs, max_workers=10)
+    assert horizons.peak > 1
+    assert horizons.queries == 20
+    assert list(eph['targetname']) == [t for t in targets for i in range(2)]
+
+
+def test_from_horizons_retries(horizons):
+    epochs = Time(2458000.5, format='jd', scale='utc')
+    horizons.failures = 2
+    eph = Ephem.from_horizons('Ceres', epochs=epochs, retries=2,
+                              retry_delay=0.01)
+    assert horizons.queries == 3
+    assert eph['targetname'][0] == 'Ceres'
+
+    horizons.failures = 2
+    with pytest.raises(ConnectionError):
+        Ephem.from_horizons('Ceres', epochs=epochs, retries=1,
+                            retry_delay=0.01)
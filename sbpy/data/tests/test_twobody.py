@@ -0,0 +1,193 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from .. import twobody
+from ..twobody import (GM_SUN, stumpff, solve_universal, solve_kepler,
+                       propagate, elements_to_state, state_to_elements)
+
+
+@pytest.fixture
+def elements():
+    rng = np.random.RandomState(0)
+    n = 2000
+    e = np.r_[rng.uniform(0, 0.99, n // 4),
+              1 + rng.uniform(-1e-6, 1e-6, n // 4),
+              rng.uniform(1.001, 5, n // 4),
+              rng.uniform(0.999, 1.001, n - 3 * (n // 4))]
+    q = rng.uniform(0.1, 5, n)
+    incl = rng.uniform(0, np.pi, n)
+    Omega = rng.uniform(0, 2 * np.pi, n)
+    w = rng.uniform(0, 2 * np.pi, n)
+    dt = rng.uniform(-5000, 5000, n)
+    return q, e, incl, Omega, w, dt
+
+
+def test_stumpff():
+    psi = np.array([-1, -0.05, 0, 0.05, 1, 100])
+    c2, c3 = stumpff(psi)
+    s = np.sqrt(np.abs(psi[[0, 1, 3, 4, 5]]))
+    assert_allclose(c2[[0, 1]], (np.cosh(s[:2]) - 1) / s[:2]**2)
+    assert_allclose(c3[[0, 1]], (np.sinh(s[:2]) - s[:2]) / s[:2]**3)
+    assert_allclose(c2[2:4], [1 / 2, (1 - np.cos(s[2])) / s[2]**2])
+    assert_allclose(c3[2:4], [1 / 6, (s[2] - np.sin(s[2])) / s[2]**3])
+    assert_allclose(c2[4:], (1 - np.cos(s[3:])) / s[3:]**2)
+    assert_allclose(c3[4:], (s[3:] - np.sin(s[3:])) / s[3:]**3)
+
+
+def test_kepler_equation(elements):
+    """Compare with classical solutions of Kepler's equation."""
+    q, e, incl, Omega, w, dt = elements
+    r, v = elements_to_state(q, e, incl, Omega, w, dt)
+    rn = np.sqrt(np.sum(r**2, 0))
+
+    # vis-viva
+    assert_allclose(np.sum(v**2, 0), GM_SUN * (2 / rn - (1 - e) / q),
+                    rtol=1e-10)
+
+    a = q / (1 - e)
+    ell = e < 0.99
+    M = np.sqrt(GM_SUN / a[ell]**3) * dt[ell]
+    E = M + e[ell] * np.sin(M)
+    for i in range(50):
+        E -= (E - e[ell] * np.sin(E) - M) / (1 - e[ell] * np.cos(E))
+    assert_allclose(rn[ell], a[ell] * (1 - e[ell] * np.cos(E)), rtol=1e-10)
+
+    hyp = e > 1.001
+    M = np.sqrt(GM_SUN / -a[hyp]**3) * dt[hyp]
+    H = np.arcsinh(M / e[hyp])
+    for i in range(100):
+        H -= (e[hyp] * np.sinh(H) - H - M) / (e[hyp] * np.cosh(H) - 1)
+    assert_allclose(rn[hyp], a[hyp] * (1 - e[hyp] * np.cosh(H)),
+                    rtol=1e-10)
+
+    # Barker's equation
+    r, v = elements_to_state(q, 1, incl, Omega, w, dt)
+    B = 1.5 * np.sqrt(GM_SUN / 2 / q**3) * dt
+    D = np.cbrt(B + np.sqrt(B**2 + 1)) - np.cbrt(np.sqrt(B**2 + 1) - B)
+    assert_allclose(np.sqrt(np.sum(r**2, 0)), q * (1 + D**2), rtol=1e-10)
+
+
+def test_elements_roundtrip(elements):
+    q, e, incl, Omega, w, dt = elements
+    r, v = elements_to_state(q, e, incl, Omega, w, dt)
+    q1, e1, incl1, Omega1, w1, dt1, alpha = state_to_elements(r, v)
+    assert_allclose(q1, q, rtol=1e-10)
+    assert_allclose(e1, e, atol=1e-10)
+    assert_allclose(incl1, incl, atol=1e-10)
+    assert_allclose(alpha, (1 - e) / q, atol=1e-10)
+    for x1, x in ((Omega1, Omega), (w1, w)):
+        assert_allclose((x1 - x + np.pi) % (2 * np.pi) - np.pi, 0,
+                        atol=1e-9)
+
+    # elliptic orbits: modulo the orbital period
+    period = np.where(e < 1, 2 * np.pi / np.sqrt(GM_SUN * np.abs(alpha)**3),
+                      np.inf)
+    ddt = np.where(e < 1, (dt1 - dt + period / 2) % period - period / 2,
+                   dt1 - dt)
+    assert_allclose(ddt / np.maximum(np.abs(dt), 1), 0, atol=1e-7)
+
+
+def test_circular_equatorial():
+    r, v = elements_to_state([1, 2], [0, 0.5], [0, np.pi], [1, 1],
+                             [2, 2], [10, 10])
+    q, e, incl, Omega, w, dt, alpha = state_to_elements(r, v)
+    assert_allclose(q, [1, 2])
+    assert_allclose(e, [0, 0.5], atol=1e-12)
+    assert_allclose(incl, [0, np.pi])
+    assert_allclose([Omega[0], w[0]], [0, 0])
+    # true longitude is conserved
+    assert_allclose(r[:, 0], elements_to_state(1, 0, 0, 0, 0, dt[0])[0])
+
+
+def test_propagate(elements):
+    q, e, incl, Omega, w, dt = elements
+    r0, v0 = elements_to_state(q, e, incl, Omega, w, dt)
+    r1, v1 = propagate(r0, v0, 1234.5)
+    r, v = elements_to_state(q, e, incl, Omega, w, dt + 1234.5)
+    scale = np.sqrt(np.sum(r**2, 0))
+    assert_allclose((r1 - r) / scale, 0, atol=1e-7)
+
+    r2, v2 = propagate(r1, v1, -1234.5)
+    assert_allclose((r2 - r0) / np.sqrt(np.sum(r0**2, 0)), 0, atol=1e-7)
+    assert_allclose((v2 - v0) / np.sqrt(np.sum(v0**2, 0)), 0, atol=1e-7)
+
+    # per-orbit time intervals
+    r3, v3 = propagate(r0[:, :3], v0[:, :3], [0, 1, 2])
+    assert_allclose(r3[:, 0], r0[:, 0])
+    assert_allclose(r3[:, 2], propagate(r0[:, 2], v0[:, 2], 2)[0])
+
+
+def test_solve_universal():
+    # periods are removed for elliptic orbits
+    period = 2 * np.pi / np.sqrt(GM_SUN)
+    dt = np.array([0.25, 3.25]) * period
+    chi, c2, c3, r, dt = solve_universal(1, 0, 1, dt)
+    assert_allclose(dt, 0.25 * period)
+    assert_allclose(r, 1)
+    assert_allclose(chi, np.pi / 2)
+
+    with pytest.warns(UserWarning):
+        solve_universal(1, 0.5, 0.5, 100, maxiter=1)
+
+
+def test_solve_kepler():
+    rng = np.random.RandomState(1)
+    M = rng.uniform(-10, 10, 1000)
+    e = rng.uniform(0, 0.999, 1000)
+    E = solve_kepler(M, e)
+    assert np.all((E >= -np.pi) & (E < np.pi))
+    assert_allclose((E - e * np.sin(E) - M + np.pi) % (2 * np.pi) - np.pi,
+                    0, atol=1e-14)
+    assert_allclose(solve_kepler([0, np.pi / 2], 0), [0, np.pi / 2])
+
+
+def test_elliptic_universal(elements):
+    """Classical and universal Kepler equation solutions agree."""
+    q, e, incl, Omega, w, dt = elements
+    ell = e < 0.9
+    args = (q[ell], e[ell], incl[ell], Omega[ell], w[ell], dt[ell])
+    r, v = elements_to_state(*args)
+    P, Q = twobody._perifocal_axes(*args[2:5])
+    r1, v1 = twobody._elements_to_state_universal(*args[:2], P, Q,
+                                                   args[5], GM_SUN)
+    assert_allclose(r, r1, atol=1e-10)
+    assert_allclose(v, v1, atol=1e-12)
+
+
+def test_moid():
+    # coplanar circular and crossing orbits
+    assert_allclose(twobody.moid((1, 0, 0, 0, 0), ([1.5, 0.5, 1], 0, 0, 0,
+                                                   0)), [0.5, 0.5, 0],
+                    atol=1e-12)
+    assert_allclose(twobody.moid((1, 0, 0, 0, 0), (2, 0.5, np.pi / 2, 0, 0)),
+                    1)
+    # parabolic orbit tangent to a circular orbit
+    assert_allclose(twobody.moid((1, 1, 0.3, 0, 0), (1, 0, 0, 0, 0)), 0,
+                    atol=1e-12)
+
+    # compare with dense grids of points on both orbits
+    rng = np.random.RandomState(2)
+    n = 10
+    el1 = (rng.uniform(0.3, 4, n), np.r_[rng.uniform(0, 0.9, n - 3),
+                                          rng.uniform(1, 3, 3)],
+           rng.uniform(0, np.pi, n), rng.uniform(0, 2 * np.pi, n),
+           rng.uniform(0, 2 * np.pi, n))
+    el2 = (rng.uniform(0.3, 4, n), rng.uniform(0, 0.9, n),
+           rng.uniform(0, np.pi, n), rng.uniform(0, 2 * np.pi, n),
+           rng.uniform(0, 2 * np.pi, n))
+    moid = twobody.moid(el1, el2)
+    for i in range(n):
+        r = []
+        for q, e, incl, Omega, w in (np.array(el1)[:, i],
+                                     np.array(el2)[:, i]):
+            numax = np.pi if e < 1 else np.arccos(-1 / e)
+            nu = np.linspace(-numax, numax, 1000)[1:-1]
+            P, Q = twobody._perifocal_axes(incl, Omega, w)
+            r.append(twobody._conic(q * (1 + e), e, P[:, None], Q[:, None],
+                                    nu)[0])
+        d = np.sqrt(np.sum((r[0][:, :, None] - r[1][:, None, :])**2, 0))
+        assert moid[i] <= d.min() + 1e-12
+        assert moid[i] > d.min() - 1e-2
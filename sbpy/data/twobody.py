@@ -0,0 +1,617 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+===========================
+sbpy data.twobody Module
+===========================
+
+Vectorized two-body (Keplerian) orbit computations
+
+All functions operate on arrays of orbits at once. Kepler's equation is
+solved in its universal-variable form, which applies to elliptic,
+parabolic, and hyperbolic orbits alike and remains well conditioned for
+near-parabolic orbits. Lengths are in au, times in days, and angles in
+radians; Cartesian coordinates refer to the frame of the orbital
+elements (typically heliocentric ecliptic J2000).
+
+created on October 16, 2026
+"""
+
+from warnings import warn
+
+import numpy as np
+
+__all__ = ['GM_SUN', 'stumpff', 'solve_universal', 'solve_kepler',
+           'propagate', 'elements_to_state', 'state_to_elements', 'moid']
+
+#: Heliocentric gravitational parameter (square of the Gaussian
+#: gravitational constant) in au**3/d**2
+GM_SUN = 0.01720209895**2
+
+# |psi| below which series expansions of the Stumpff functions are used
+_PSI_SERIES = 0.1
+
+# eccentricity below which elliptic orbits are treated with the
+# classical (eccentric anomaly) form of Kepler's equation
+_ECC_CLASSICAL = 0.9
+
+
+def stumpff(psi):
+    """Stumpff functions c2 and c3.
+
+    Parameters
+    ----------
+    psi : array-like
+        Argument, ``alpha * chi**2``.
+
+    Returns
+    -------
+    c2, c3 : `~numpy.ndarray`
+    """
+    psi = np.asarray(psi, dtype=float)
+    c2 = np.empty_like(psi)
+    c3 = np.empty_like(psi)
+
+    series = np.abs(psi) < _PSI_SERIES
+    ell = (psi > 0) & ~series
+    hyp = (psi < 0) & ~series
+
+    p = psi[series]
+    c2[series] = 1/2 - p*(1/24 - p*(1/720 - p*(1/40320 - p/3628800)))
+    c3[series] = 1/6 - p*(1/120 - p*(1/5040 - p*(1/362880 - p/39916800)))
+
+    s = np.sqrt(psi[ell])
+    c2[ell] = (1 - np.cos(s)) / psi[ell]
+    c3[ell] = (s - np.sin(s)) / s**3
+
+    with np.errstate(over='ignore'):
+        s = np.sqrt(-psi[hyp])
+        c2[hyp] = (np.cosh(s) - 1) / -psi[hyp]
+        c3[hyp] = (np.sinh(s) - s) / s**3
+
+    return c2, c3
+
+
+def solve_universal(r0, sigma0, alpha, dt, mu=GM_SUN, tol=1e-14,
+                    maxiter=50):
+    """Solve the universal Kepler equation.
+
+    Laguerre-Conway iterations are performed for all orbits at once;
+    elliptic orbits are first reduced to less than half a period.
+
+    Parameters
+    ----------
+    r0 : array-like
+        Initial heliocentric distance.
+    sigma0 : array-like
+        ``dot(r0, v0) / sqrt(mu)`` of the initial state.
+    alpha : array-like
+        Inverse semi-major axis (``2 / r0 - v0**2 / mu``); negative for
+        hyperbolic orbits, zero for parabolic orbits.
+    dt : array-like
+        Time since the initial state.
+    mu : float, optional
+        Gravitational parameter. Default: `GM_SUN`
+    tol : float, optional
+        Relative convergence tolerance for the universal anomaly.
+    maxiter : int, optional
+        Maximum number of iterations.
+
+    Returns
+    -------
+    chi, c2, c3, r, dt : `~numpy.ndarray`
+        Universal anomaly, Stumpff functions for ``alpha * chi**2``,
+        distance at ``dt``, and ``dt`` reduced by full periods for
+        elliptic orbits.
+    """
+    r0, sigma0, alpha, dt = np.broadcast_arrays(
+        *[np.asarray(x, dtype=float) for x in (r0, sigma0, alpha, dt)])
+    dt = dt.copy()
+    sqmu = np.sqrt(mu)
+
+    # reduce elliptic orbits to less than half a period
+    ell = alpha > 0
+    period = 2 * np.pi / (sqmu * alpha[ell]**1.5)
+    dt[ell] -= period * np.round(dt[ell] / period)
+
+    # initial guess; orbits that are not elliptic start from the
+    # solution of the cubic (parabolic) approximation
+    # r0 * chi + beta * chi**3 / 6 = sqrt(mu) * dt
+    beta = 1 - alpha * r0
+    chi = sqmu * alpha * dt
+    other = ~ell
+    if other.any():
+        p = 6 * r0[other] / np.where(beta[other] > 0, beta[other], 1)
+        b = 3 * sqmu * dt[other] / np.where(beta[other] > 0, beta[other], 1)
+        d = np.sqrt(b**2 + p**3 / 27)
+        chi[other] = np.cbrt(b + d) + np.cbrt(b - d)
+
+    hyp = alpha < 0
+    if hyp.any():
+        a = 1 / alpha[hyp]
+        s = np.sign(dt[hyp])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            arg = (-2 * mu * alpha[hyp] * dt[hyp] /
+                   (sigma0[hyp] * sqmu + s * np.sqrt(-mu * a) *
+                    (1 - r0[hyp] * alpha[hyp])))
+            guess = s * np.sqrt(-a) * np.log(arg)
+        good = np.isfinite(guess) & (arg > 1)
+        chi[np.flatnonzero(hyp)[good]] = guess[good]
+
+    n = 5
+    for i in range(maxiter):
+        psi = alpha * chi**2
+        c2, c3 = stumpff(psi)
+        f = (r0 * chi + sigma0 * chi**2 * c2 + beta * chi**3 * c3 -
+             sqmu * dt)
+        df = chi**2 * c2 + sigma0 * chi * (1 - psi * c3) + r0 * (1 - psi * c2)
+        ddf = sigma0 * (1 - psi * c2) + beta * chi * (1 - psi * c3)
+        delta = n * f / (df + np.sign(df) * np.sqrt(
+            np.abs((n - 1)**2 * df**2 - n * (n - 1) * f * ddf)))
+        chi -= delta
+        if np.all(np.abs(delta) <= tol * (1 + np.abs(chi))):
+            break
+    else:
+        warn('universal Kepler equation did not converge for {} '
+             'orbits'.format(np.sum(np.abs(delta) >
+                                    tol * (1 + np.abs(chi)))))
+
+    psi = alpha * chi**2
+    c2, c3 = stumpff(psi)
+    r = chi**2 * c2 + sigma0 * chi * (1 - psi * c3) + r0 * (1 - psi * c2)
+
+    return chi, c2, c3, r, dt
+
+
+def solve_kepler(M, e, tol=1e-12, maxiter=10):
+    """Solve Kepler's equation ``E - e * sin(E) = M`` for elliptic
+    orbits.
+
+    Starting from Mikkola's (1987) cubic approximation, Danby's
+    quartically convergent iterations are performed for all orbits at
+    once.  Two iterations usually reach machine precision.
+
+    Parameters
+    ----------
+    M : array-like
+        Mean anomaly in radians.
+    e : array-like
+        Eccentricity, ``0 <= e < 1``.
+    tol : float, optional
+        Absolute convergence tolerance on the last correction to the
+        eccentric anomaly.  With quartic convergence, the remaining
+        error is much smaller than ``tol``.
+    maxiter : int, optional
+        Maximum number of iterations.
+
+    Returns
+    -------
+    E : `~numpy.ndarray`
+        Eccentric anomaly in radians, in the range [-pi, pi).
+    """
+    M, e = np.broadcast_arrays(np.asarray(M, dtype=float),
+                               np.asarray(e, dtype=float))
+    M = (M + np.pi) % (2 * np.pi) - np.pi
+
+    # Mikkola's starting value
+    alpha = (1 - e) / (4 * e + 0.5)
+    beta = M / (8 * e + 1)
+    z = np.cbrt(beta + np.where(beta < 0, -1, 1)
+                * np.sqrt(beta**2 + alpha**3))
+    s = z - alpha / z
+    s = s - 0.078 * s**5 / (1 + e)
+    E = M + e * (3 * s - 4 * s**3)
+
+    for i in range(maxiter):
+        es, ec = e * np.sin(E), e * np.cos(E)
+        f = E - es - M
+        f1 = 1 - ec
+        d1 = -f / f1
+        d2 = -f / (f1 + d1 * es / 2)
+        d3 = -f / (f1 + d2 * es / 2 + d2**2 * ec / 6)
+        E += d3
+        if np.all(np.abs(d3) <= tol):
+            break
+    else:
+        warn('Kepler equation did not converge for {} orbits'.format(
+            np.sum(np.abs(d3) > tol)))
+    return E
+
+
+def propagate(r, v, dt, mu=GM_SUN):
+    """Propagate state vectors on two-body orbits.
+
+    Parameters
+    ----------
+    r, v : array-like
+        Position and velocity vectors, shape (3, ...).
+    dt : array-like
+        Time intervals, broadcastable to the shape of ``r[0]``.
+    mu : float, optional
+        Gravitational parameter. Default: `GM_SUN`
+
+    Returns
+    -------
+    r, v : `~numpy.ndarray`
+        Propagated position and velocity vectors.
+
+    Notes
+    -----
+    States are propagated through their elements
+    (`state_to_elements`, `elements_to_state`), i.e., relative to the
+    perihelion passage, for which the universal Kepler equation is
+    best conditioned.
+    """
+    q, e, incl, Omega, w, dtp, alpha = state_to_elements(r, v, mu=mu)
+    return elements_to_state(q, e, incl, Omega, w, dtp + dt, mu=mu)
+
+
+def _perifocal_axes(incl, Omega, w):
+    """Unit vectors toward the perihelion (P) and in the orbital plane
+    perpendicular to it (Q)."""
+    co, so = np.cos(Omega), np.sin(Omega)
+    cw, sw = np.cos(w), np.sin(w)
+    ci, si = np.cos(incl), np.sin(incl)
+    P = np.array([co * cw - so * sw * ci, so * cw + co * sw * ci, sw * si])
+    Q = np.array([-co * sw - so * cw * ci, -so * sw + co * cw * ci,
+                  cw * si])
+    return P, Q
+
+
+def _elements_to_state_universal(q, e, P, Q, dt, mu):
+    """`elements_to_state` from the universal Kepler equation, given
+    the perifocal axes ``P`` and ``Q``."""
+    sqmu = np.sqrt(mu)
+    alpha = (1 - e) / q
+    vq = np.sqrt(mu * (1 + e) / q)
+
+    # propagate from perihelion in the orbital plane
+    chi, c2, c3, r, dt = solve_universal(q, 0, alpha, dt, mu=mu)
+    f = 1 - chi**2 * c2 / q
+    g = dt - chi**3 * c3 / sqmu
+    fdot = sqmu * chi * (alpha * chi**2 * c3 - 1) / (r * q)
+    gdot = 1 - chi**2 * c2 / r
+
+    return f * q * P + g * vq * Q, fdot * q * P + gdot * vq * Q
+
+
+def _elements_to_state_elliptic(q, e, P, Q, dt, mu):
+    """`elements_to_state` from the classical Kepler equation for
+    elliptic orbits, given the perifocal axes ``P`` and ``Q``."""
+    a = q / (1 - e)
+    E = solve_kepler(np.sqrt(mu / a**3) * dt, e)
+    cE, sE = np.cos(E), np.sin(E)
+    b = np.sqrt(1 - e**2)
+    vr = np.sqrt(mu * a) / (a * (1 - e * cE))
+    return (a * (cE - e) * P + a * b * sE * Q,
+            -vr * sE * P + vr * b * cE * Q)
+
+
+def elements_to_state(q, e, incl, Omega, w, dt, mu=GM_SUN):
+    """Convert cometary orbital elements to state vectors.
+
+    Parameters
+    ----------
+    q : array-like
+        Perihelion distance.
+    e : array-like
+        Eccentricity.
+    incl, Omega, w : array-like
+        Inclination, longitude of the ascending node, and argument of
+        the perihelion in radians.
+    dt : array-like
+        Time since perihelion passage.
+    mu : float, optional
+        Gravitational parameter. Default: `GM_SUN`
+
+    Returns
+    -------
+    r, v : `~numpy.ndarray`
+        Position and velocity vectors, shape (3, ...).
+
+    Notes
+    -----
+    Elliptic orbits with eccentricities below 0.9 are solved with the
+    classical Kepler equation (`solve_kepler`), all other orbits with
+    the universal Kepler equation (`solve_universal`).
+    """
+    q, e, incl, Omega, w, dt = np.broadcast_arrays(
+        *[np.asarray(x, dtype=float) for x in (q, e, incl, Omega, w, dt)])
+    P, Q = _perifocal_axes(incl, Omega, w)
+
+    ell = e < _ECC_CLASSICAL
+    if ell.all():
+        return _elements_to_state_elliptic(q, e, P, Q, dt, mu)
+    elif not ell.any():
+        return _elements_to_state_universal(q, e, P, Q, dt, mu)
+
+    r = np.empty(P.shape)
+    v = np.empty(P.shape)
+    for rows, func in ((ell, _elements_to_state_elliptic),
+                       (~ell, _elements_to_state_universal)):
+        r[:, rows], v[:, rows] = func(q[rows], e[rows], P[:, rows],
+                                      Q[:, rows], dt[rows], mu)
+    return r, v
+
+
+def _arctanc(y):
+    """``arctan(sqrt(y)) / sqrt(y)``, continued as
+    ``arctanh(sqrt(-y)) / sqrt(-y)`` for negative ``y``."""
+    y = np.asarray(y, dtype=float)
+    out = np.empty_like(y)
+    series = np.abs(y) < 1e-4
+    p = y[series]
+    out[series] = 1 - p * (1/3 - p * (1/5 - p / 7))
+    pos = (y > 0) & ~series
+    s = np.sqrt(y[pos])
+    out[pos] = np.arctan(s) / s
+    neg = (y < 0) & ~series
+    s = np.sqrt(-y[neg])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[neg] = np.arctanh(s) / s
+    return out
+
+
+def state_to_elements(r, v, mu=GM_SUN, tol=1e-11):
+    """Convert state vectors to cometary orbital elements.
+
+    Parameters
+    ----------
+    r, v : array-like
+        Position and velocity vectors, shape (3, ...).
+    mu : float, optional
+        Gravitational parameter. Default: `GM_SUN`
+    tol : float, optional
+        Eccentricities and sines of inclinations below ``tol`` are
+        considered circular and equatorial, respectively; the argument
+        of the perihelion and longitude of the ascending node are then
+        set to zero.
+
+    Returns
+    -------
+    q, e, incl, Omega, w, dt, alpha : `~numpy.ndarray`
+        Perihelion distance, eccentricity, inclination, longitude of
+        the ascending node and argument of the perihelion (radians, in
+        [0, 2 pi)), time since perihelion passage, and inverse
+        semi-major axis. ``dt`` is in the range of half a period around
+        the perihelion for elliptic orbits.
+    """
+    r = np.asarray(r, dtype=float)
+    v = np.asarray(v, dtype=float)
+    rn = np.sqrt(np.sum(r**2, 0))
+    rv = np.sum(r * v, 0)
+    v2 = np.sum(v**2, 0)
+
+    h = np.cross(r, v, axis=0)
+    hn = np.sqrt(np.sum(h**2, 0))
+    evec = ((v2 - mu / rn) * r - rv * v) / mu
+    e = np.sqrt(np.sum(evec**2, 0))
+    alpha = 2 / rn - v2 / mu
+    q = hn**2 / mu / (1 + e)
+
+    incl = np.arccos(np.clip(h[2] / hn, -1, 1))
+    hxy = np.hypot(h[0], h[1])
+    node = hxy >= tol * hn
+    Omega = np.where(node, np.arctan2(h[0], -h[1]), 0)
+    cO = np.where(node, -h[1] / np.where(node, hxy, 1), 1)
+    sO = np.where(node, h[0] / np.where(node, hxy, 1), 0)
+    ci, si = h[2] / hn, hxy / hn
+
+    # coordinates in the orbital plane, measured from the node
+    def plane(x):
+        x1 = x[0] * cO + x[1] * sO
+        y1 = -x[0] * sO + x[1] * cO
+        return x1, y1 * ci + x[2] * si
+
+    theta = np.arctan2(*plane(r)[::-1])
+    w = np.where(e < tol, 0, np.arctan2(*plane(evec)[::-1]))
+    nu = (theta - w + np.pi) % (2 * np.pi) - np.pi
+
+    s, c = np.sin(nu / 2), np.cos(nu / 2)
+    k2 = (1 - e) / (1 + e)
+    dt = np.empty_like(e)
+
+    # elliptic orbits: time since perihelion from the eccentric anomaly
+    ell = e < _ECC_CLASSICAL
+    E = 2 * np.arctan2(np.sqrt(k2[ell]) * s[ell], c[ell])
+    dt[ell] = ((E - e[ell] * np.sin(E)) /
+               np.sqrt(mu * alpha[ell]**3))
+
+    # other orbits: universal anomaly since perihelion from the true
+    # anomaly
+    other = ~ell
+    if other.any():
+        s, c, k2 = s[other], c[other], k2[other]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # elliptic orbits: avoid the singularity of tan(nu / 2) at
+            # aphelion
+            k = np.sqrt(np.abs(k2))
+            ell = np.arctan2(k * s, c) / k
+            tan = s / c
+            gen = tan * _arctanc(k2 * tan**2)
+        D = np.where((k2 > 1e-4), ell, gen)
+        chi = 2 * np.sqrt(q[other] / (1 + e[other])) * D
+        psi = alpha[other] * chi**2
+        c2, c3 = stumpff(psi)
+        dt[other] = (q[other] * chi + e[other] * chi**3 * c3) / np.sqrt(mu)
+
+    return (q, e, incl, Omega % (2 * np.pi), w % (2 * np.pi), dt, alpha)
+
+
+def _conic(p, e, P, Q, nu):
+    """Positions and their first and second derivatives with respect
+    to the true anomaly ``nu`` on conics with semi-latus rectum ``p``,
+    eccentricity ``e``, and perifocal axes ``P`` and ``Q``."""
+    c, s = np.cos(nu), np.sin(nu)
+    k = 1 / (1 + e * c)
+    k1 = p * k
+    k2 = k1 * k
+    k3 = k2 * k
+    x, y = k1 * c, k1 * s
+    x1, y1 = -k2 * s, k2 * (c + e)
+    x2 = -k3 * (c * (1 + e * c) + 2 * e * s**2)
+    y2 = k3 * s * (e * c + 2 * e**2 - 1)
+    return x * P + y * Q, x1 * P + y1 * Q, x2 * P + y2 * Q
+
+
+def _nu_max(e):
+    """Largest true anomaly on conics of eccentricity ``e``."""
+    return np.arccos(-1 / np.maximum(e, 1))
+
+
+def _nu_grid(e, n):
+    """``n`` true anomalies per orbit, uniform in eccentric anomaly
+    for elliptic orbits and in true anomaly otherwise."""
+    t = (np.arange(n) + 0.5) / n
+    E = (t - 0.5) * 2 * np.pi
+    with np.errstate(invalid='ignore'):
+        ell = 2 * np.arctan2(np.sqrt(1 + e) * np.sin(E / 2),
+                             np.sqrt(np.abs(1 - e)) * np.cos(E / 2))
+    return np.where(e < 1, ell, _nu_max(e) * (2 * t - 1))
+
+
+def _advance(nu, step, numax):
+    """True anomalies ``nu`` advanced by ``step``, wrapped on elliptic
+    orbits (``numax`` is infinite) and limited to ``numax`` on other
+    orbits."""
+    nu = nu + step
+    return np.where(np.isinf(numax), (nu + np.pi) % (2 * np.pi) - np.pi,
+                    np.clip(nu, -numax, numax))
+
+
+def _moid_batch(el1, el2, grid, minima, tol, maxiter):
+    """`moid` for one batch of orbit pairs; elements of shape (n, 1)."""
+    p1, e1 = el1[0] * (1 + el1[1]), el1[1]
+    p2, e2 = el2[0] * (1 + el2[1]), el2[1]
+    P1, Q1 = _perifocal_axes(*el1[2:])
+    P2, Q2 = _perifocal_axes(*el2[2:])
+
+    # coarse grid of squared distances, shape (n, grid, grid)
+    nu1, nu2 = _nu_grid(e1, grid), _nu_grid(e2, grid)
+    r1 = _conic(p1, e1, P1, Q1, nu1)[0]
+    r2 = _conic(p2, e2, P2, Q2, nu2)[0]
+    d2 = sum((x1[:, :, None] - x2[:, None, :])**2
+             for x1, x2 in zip(r1, r2))
+
+    # local minima of the grid, the smallest ones are refined
+    local = np.ones(d2.shape, bool)
+    for shift in ((1, 0), (-1, 0), (0, 1), (0, -1),
+                  (1, 1), (1, -1), (-1, 1), (-1, -1)):
+        local &= d2 <= np.roll(d2, shift, axis=(1, 2))
+    d2 = np.where(local, d2, np.inf).reshape(len(d2), -1)
+    minima = min(minima, d2.shape[1])
+    best = np.argpartition(d2, minima - 1, axis=1)[:, :minima]
+    rows = np.arange(len(d2))[:, None]
+    best = np.where(np.isfinite(d2[rows, best]), best, best[:, :1])
+    nu1 = nu1[rows, best // grid].ravel()
+    nu2 = nu2[rows, best % grid].ravel()
+
+    # Newton iterations for the minimum of the squared distance with
+    # safeguarded steps, for all starting points that have not
+    # converged yet
+    pair = np.repeat(np.arange(len(d2)), minima)
+    p1, e1, P1, Q1 = p1[pair, 0], e1[pair, 0], P1[:, pair, 0], Q1[:, pair, 0]
+    p2, e2, P2, Q2 = p2[pair, 0], e2[pair, 0], P2[:, pair, 0], Q2[:, pair, 0]
+    max1, max2 = [np.where(e < 1, np.inf, _nu_max(e) * (1 - 1e-9))
+                  for e in (e1, e2)]
+    step_max = 2 * np.pi / grid
+
+    def dist2(j, nu1, nu2):
+        r1, dr1, ddr1 = _conic(p1[j], e1[j], P1[:, j], Q1[:, j], nu1)
+        r2, dr2, ddr2 = _conic(p2[j], e2[j], P2[:, j], Q2[:, j], nu2)
+        d = r1 - r2
+        return np.sum(d**2, 0), d, dr1, ddr1, dr2, ddr2
+
+    f = np.empty(len(nu1))
+    j = np.arange(len(nu1))
+    f[j], d, dr1, ddr1, dr2, ddr2 = dist2(j, nu1, nu2)
+    for i in range(maxiter):
+        g1 = np.sum(d * dr1, 0)
+        g2 = -np.sum(d * dr2, 0)
+        h11 = np.sum(dr1**2, 0) + np.sum(d * ddr1, 0)
+        h22 = np.sum(dr2**2, 0) - np.sum(d * ddr2, 0)
+        h12 = -np.sum(dr1 * dr2, 0)
+
+        # shift the Hessian to be positive definite
+        lam = (h11 + h22) / 2 - np.hypot((h11 - h22) / 2, h12)
+        lam = np.where(lam > 0, 0,
+                       1e-3 * (np.abs(h11) + np.abs(h22)) - lam + 1e-300)
+        h11, h22 = h11 + lam, h22 + lam
+        det = h11 * h22 - h12**2
+        s1 = np.clip(-(h22 * g1 - h12 * g2) / det, -step_max, step_max)
+        s2 = np.clip(-(h11 * g2 - h12 * g1) / det, -step_max, step_max)
+
+        # halve steps that do not decrease the distance; points that
+        # cannot be improved are converged
+        new1 = _advance(nu1[j], s1, max1[j])
+        new2 = _advance(nu2[j], s2, max2[j])
+        new = list(dist2(j, new1, new2))
+        w = np.flatnonzero(new[0] > f[j])
+        for k in range(10):
+            if len(w) == 0:
+                break
+            s1[w] /= 2
+            s2[w] /= 2
+            new1[w] = _advance(nu1[j[w]], s1[w], max1[j[w]])
+            new2[w] = _advance(nu2[j[w]], s2[w], max2[j[w]])
+            retry = dist2(j[w], new1[w], new2[w])
+            new[0][w] = retry[0]
+            for x, y in zip(new[1:], retry[1:]):
+                x[:, w] = y
+            w = w[retry[0] > f[j[w]]]
+        worse = new[0] > f[j]
+        better = ~worse
+        nu1[j[better]], nu2[j[better]] = new1[better], new2[better]
+        f[j[better]] = new[0][better]
+
+        active = better & (np.abs(s1) + np.abs(s2) > tol)
+        j = j[active]
+        if len(j) == 0:
+            break
+        d, dr1, ddr1, dr2, ddr2 = [x[:, active] for x in new[1:]]
+
+    return np.sqrt(f.reshape(-1, minima).min(1))
+
+
+def moid(elements1, elements2, grid=36, minima=4, batch=2000, tol=1e-12,
+         maxiter=20):
+    """Minimum orbit intersection distance between pairs of orbits.
+
+    The squared distance between the orbits is evaluated on a coarse
+    grid of anomalies for all pairs at once; the smallest local
+    minima of each pair are then refined with Newton iterations,
+    again for all pairs at once.
+
+    Parameters
+    ----------
+    elements1, elements2 : sequence of array-like
+        Cometary elements ``(q, e, incl, Omega, w)`` of the first and
+        second orbits of each pair, broadcast against each other.
+        Elliptic, parabolic, and hyperbolic orbits are supported.
+    grid : int, optional
+        Number of grid points per orbit.
+    minima : int, optional
+        Maximum number of local grid minima refined per pair.
+    batch : int, optional
+        Number of pairs processed at once, limiting memory usage.
+    tol : float, optional
+        Convergence tolerance for the anomalies in radians.
+    maxiter : int, optional
+        Maximum number of Newton iterations.
+
+    Returns
+    -------
+    moid : `~numpy.ndarray`
+        Minimum distances, in units of ``q``.
+    """
+    elements = np.broadcast_arrays(
+        *[np.asarray(x, dtype=float) for x in
+          tuple(elements1) + tuple(elements2)])
+    shape = elements[0].shape
+    elements = [x.ravel()[:, None] for x in elements]
+
+    result = np.empty(len(elements[0]))
+    for i in range(0, len(result), batch):
+        el = [x[i:i + batch] for x in elements]
+        result[i:i + batch] = _moid_batch(el[:5], el[5:], grid, minima,
+                                          tol, maxiter)
+    return result.reshape(shape)